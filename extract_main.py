@@ -6,8 +6,8 @@ Usage:
     python extract_main.py \
         --db ./data/vectors \
         --out ./data/cache/facts.json \
-        --company "Maersk" \
-        --year 2023
+        [--company "Maersk"] [--year 2023] \
+        [--concurrency 4] [--no-cache]
 """
 
 import argparse
@@ -15,6 +15,10 @@ from pathlib import Path
 from dotenv import load_dotenv
 
 from src.extract_facts import extract_facts
+from src.config import (
+    LLM_CONCURRENCY, LLM_CONTEXT_TOKENS, RETRIEVAL_MODE, MMR_TARGET, MMR_DIVERSITY,
+    RERANKER, RERANK_CANDIDATES, RERANK_TOP_K,
+)
 
 DEFAULT_DB_DIR = "./data/vectors"
 DEFAULT_CACHE_PATH = "./data/cache/facts.json"
@@ -30,11 +34,38 @@ def main():
 
     parser = argparse.ArgumentParser(description="Extract structured facts from vector DB")
     parser.add_argument("--db", default=DEFAULT_DB_DIR)
-    parser.add_argument("--query", default=DEFAULT_QUERY)
+    parser.add_argument("--query", action="append",
+                        help="Retrieval query (repeat for several)")
     parser.add_argument("--prompt", default=DEFAULT_PROMPT)
     parser.add_argument("--out", default=DEFAULT_CACHE_PATH)
-    parser.add_argument("--company", required=True)
-    parser.add_argument("--year", type=int, required=True)
+    parser.add_argument("--company",
+                        help="Company label of the output; also selects matching reports from the catalog. "
+                        "Omitted: all reports, label inferred from the catalog (else 'Unknown Co.')")
+    parser.add_argument("--year", type=int,
+                        help="Report year label of the output; also selects matching reports from the catalog. "
+                        "Omitted: all reports, label inferred from the catalog (else 2024)")
+    parser.add_argument("--file", help="Extract from this ingested PDF only (file name)")
+    parser.add_argument("--concurrency", type=int, default=LLM_CONCURRENCY,
+                        help="Parallel LLM extraction calls (match OLLAMA_NUM_PARALLEL)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Ignore the LLM response cache")
+    parser.add_argument("--context-tokens", type=int, default=LLM_CONTEXT_TOKENS,
+                        help="LLM context window filled with packed evidence chunks")
+    parser.add_argument("--retrieval", choices=["hybrid", "vector"], default=RETRIEVAL_MODE,
+                        help="hybrid = BM25 + vector with reciprocal rank fusion")
+    parser.add_argument("--all-chunks", action="store_true",
+                        help="Also send chunks without numbers/units/years to the LLM")
+    parser.add_argument("--mmr-target", type=int, default=MMR_TARGET,
+                        help="Max chunks sent to the LLM after MMR diversification (0 = all)")
+    parser.add_argument("--diversity", type=float, default=MMR_DIVERSITY,
+                        help="MMR weight on novelty vs. relevance (0-1)")
+    parser.add_argument("--rerank", choices=["off", "cross-encoder", "ollama"], default=RERANKER,
+                        help="Re-score retrieved chunks before extraction "
+                        "(local cross-encoder, or an Ollama scorer named by RERANK_MODEL)")
+    parser.add_argument("--rerank-candidates", type=int, default=RERANK_CANDIDATES,
+                        help="Chunks retrieved for the re-ranker")
+    parser.add_argument("--rerank-top-k", type=int, default=RERANK_TOP_K,
+                        help="Best re-ranked chunks forwarded to extraction")
 
     args = parser.parse_args()
 
@@ -43,11 +74,22 @@ def main():
 
     extract_facts(
         db_dir=args.db,
-        query_text=args.query,
+        query_text=args.query or [DEFAULT_QUERY],
         prompt_path=args.prompt,
         out_path=args.out,
         company=args.company,
         year=args.year,
+        concurrency=args.concurrency,
+        use_cache=not args.no_cache,
+        context_tokens=args.context_tokens,
+        retrieval=args.retrieval,
+        quant_only=not args.all_chunks,
+        file_name=args.file,
+        mmr_target=args.mmr_target,
+        diversity=args.diversity,
+        reranker=args.rerank,
+        rerank_candidates=args.rerank_candidates,
+        rerank_top_k=args.rerank_top_k,
     )
 
 
@@ -3,7 +3,7 @@
 Standalone script: PDF ingestion → Chroma DB
 
 Usage:
-    python ingest_main.py --reports ./reports --db ./data/vectors
+    python ingest_main.py --reports ./reports --db ./data/vectors [--workers 4]
 """
 
 import argparse
@@ -11,6 +11,7 @@ from pathlib import Path
 from dotenv import load_dotenv
 
 from src.ingest import ingest_reports
+from src.config import INGEST_WORKERS, INGEST_WRITE_BATCH
 
 DEFAULT_REPORTS_DIR = "./reports"
 DEFAULT_DB_DIR = "./data/vectors"
@@ -22,13 +23,17 @@ def main():
     parser = argparse.ArgumentParser(description="Ingest PDFs into vector DB")
     parser.add_argument("--reports", default=DEFAULT_REPORTS_DIR)
     parser.add_argument("--db", default=DEFAULT_DB_DIR)
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS,
+                        help="Worker processes for PDF parsing/chunking (1 = serial)")
+    parser.add_argument("--write-batch", type=int, default=INGEST_WRITE_BATCH,
+                        help="Chunks embedded and written to Chroma per batch")
 
     args = parser.parse_args()
 
     # Ensure output folder exists
     Path(args.db).mkdir(parents=True, exist_ok=True)
 
-    ingest_reports(args.reports, args.db)
+    ingest_reports(args.reports, args.db, workers=args.workers, write_batch=args.write_batch)
 
 
 if __name__ == "__main__":
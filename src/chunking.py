@@ -6,23 +6,95 @@ Improved ESG-grade chunking for PDF ingestion.
 - Section path generation
 - Paragraph-aware chunking
 - Semantic overlap
-- Stable token estimation
+- Document-level chunking: section path, buffer and page-broken paragraphs
+  carry across pages; chunks record page_start / page_end
+- Pluggable token counting: a local tokenizer.json (HuggingFace
+  `tokenizers`, optional) or the len/4 estimate; counts are LRU-cached and
+  every paragraph is counted once per chunking pass
 """
 
-from typing import List, Dict
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Dict, Tuple
 import re
 
+from .config import EMBEDDING_MODEL, TOKENIZER_PATH, TOKENIZER_DIR
+
+# Bump whenever chunking output changes, so the ingest manifest re-chunks files
+CHUNKER_VERSION = "3"
+
 
 # ----------------------------------------
-# Token estimation (improved heuristic)
+# Token counting (pluggable)
 # ----------------------------------------
-def count_tokens(text: str) -> int:
+def estimate_tokens(text: str) -> int:
     """
     Approximate token count using 1 token ≈ 4 chars for ESG text.
     """
     return max(1, int(len(text) / 4))
 
 
+def tokenizer_file(model: str = EMBEDDING_MODEL, path: str = TOKENIZER_PATH) -> Path | None:
+    """
+    Local tokenizer for `model`: `path` (TOKENIZER_PATH) if set, else
+    TOKENIZER_DIR/<model>.json ("nomic-embed-text" → nomic-embed-text.json,
+    ":" and "/" replaced by "_").
+    """
+    if path:
+        return Path(path)
+    path = Path(TOKENIZER_DIR) / (re.sub(r"[:/]", "_", model) + ".json")
+    return path if path.exists() else None
+
+
+def load_tokenizer_counter(path: Path) -> Callable[[str], int] | None:
+    """Exact counter backed by a tokenizer.json, or None if unavailable."""
+    try:
+        from tokenizers import Tokenizer
+    except ImportError:
+        print(f"[WARN] `tokenizers` not installed — ignoring {path}, using the len/4 estimate.")
+        return None
+    try:
+        tok = Tokenizer.from_file(str(path))
+    except Exception as e:
+        print(f"[WARN] Could not load tokenizer {path}: {e} — using the len/4 estimate.")
+        return None
+
+    def count(text: str) -> int:
+        return max(1, len(tok.encode(text, add_special_tokens=False).ids))
+
+    return count
+
+
+_counter: Tuple[str, Callable[[str], int]] | None = None
+
+
+def _get_counter() -> Tuple[str, Callable[[str], int]]:
+    global _counter
+    if _counter is None:
+        path = tokenizer_file()
+        fn = load_tokenizer_counter(path) if path else None
+        _counter = (f"tokenizer:{path.name}", fn) if fn else ("estimate", estimate_tokens)
+    return _counter
+
+
+def set_token_counter(fn: Callable[[str], int] | None, name: str = "custom"):
+    """Install a token counter (None → reload from config). Clears the count cache."""
+    global _counter
+    _counter = (name, fn) if fn else None
+    count_tokens.cache_clear()
+
+
+def token_counter_name() -> str:
+    """Identifies the active counter (part of the ingest version)."""
+    return _get_counter()[0]
+
+
+@lru_cache(maxsize=65536)
+def count_tokens(text: str) -> int:
+    """Token count of `text` with the active counter (cached per distinct text)."""
+    return _get_counter()[1](text)
+
+
 # ----------------------------------------
 # Heading detection
 # ----------------------------------------
@@ -80,76 +152,126 @@ def split_paragraphs(text: str) -> List[str]:
 # ----------------------------------------
 # Main chunker
 # ----------------------------------------
-def chunk_page(record: Dict, chunk_size: int, overlap_tokens: int) -> List[Dict]:
+class _ChunkBuilder:
     """
-    ESG-optimized chunking:
-    - paragraph-aware
-    - heading detection and section_path tracking
-    - semantic overlap by paragraph, not raw characters
+    Paragraph buffer shared by chunk_page and chunk_document:
+    - flushes when the next paragraph would exceed chunk_size
+    - semantic overlap: the last paragraphs (up to overlap_tokens) open the next chunk
+    - every paragraph is token-counted once; counts travel with the buffer
     """
-    text = record["text"]
-    file_name = record["file_name"]
-    page = record["page"]
-    source_uri = record["source_uri"]
-
-    paras = split_paragraphs(text)
-    chunks = []
 
-    buf: List[str] = []
-    buf_tokens = 0
-    section_path: List[str] = []
+    def __init__(self, chunk_size: int, overlap_tokens: int, file_name: str, source_uri: str):
+        self.chunk_size = chunk_size
+        self.overlap_tokens = overlap_tokens
+        self.file_name = file_name
+        self.source_uri = source_uri
+        self.buf: List[str] = []
+        self.counts: List[int] = []
+        self.pages: List[int] = []
+        self.tokens = 0
+        self.section_path: List[str] = []
 
-    for para in paras:
+    def add(self, para: str, page: int) -> Iterator[Dict]:
         # 1. If the paragraph is a heading, update section path
         heading = detect_heading(para)
         if heading:
-            section_path = update_section_path(section_path, heading)
+            self.section_path = update_section_path(self.section_path, heading)
 
+        # counted once; the overlap below reuses self.counts
         ptoks = count_tokens(para)
 
         # 2. If adding this paragraph exceeds chunk size, flush the chunk
-        if buf and (buf_tokens + ptoks > chunk_size):
-            chunk_text = "\n\n".join(buf)
-            chunks.append({
-                "text": chunk_text,
-                "page": page,
-                "file_name": file_name,
-                "source_uri": source_uri,
-                "section_path": " > ".join(section_path),
-            })
-
-            # ----------------------------------------
+        if self.buf and (self.tokens + ptoks > self.chunk_size):
+            yield self._chunk()
+
             # 3. Semantic overlap: reuse the LAST paragraphs up to overlap_tokens
-            # ----------------------------------------
-            overlap_buf = []
+            keep = 0
             overlap_sum = 0
-
-            # start from end, accumulate until overlap_tokens reached
-            for prev_para in reversed(buf):
-                t = count_tokens(prev_para)
-                if overlap_sum + t > overlap_tokens:
+            for t in reversed(self.counts):
+                if overlap_sum + t > self.overlap_tokens:
                     break
-                overlap_buf.insert(0, prev_para)
+                keep += 1
                 overlap_sum += t
 
-            # new buffer contains overlap + new paragraph
-            buf = overlap_buf + [para]
-            buf_tokens = overlap_sum + ptoks
-
-        else:
-            # Just add paragraph to buffer
-            buf.append(para)
-            buf_tokens += ptoks
-
-    # Flush remaining
-    if buf:
-        chunk_text = "\n\n".join(buf)
-        chunks.append({
-            "text": chunk_text,
-            "page": page,
-            "file_name": file_name,
-            "source_uri": source_uri,
-            "section_path": " > ".join(section_path),
-        })
-
-    return chunks
\ No newline at end of file
+            start = len(self.buf) - keep
+            self.buf = self.buf[start:]
+            self.counts = self.counts[start:]
+            self.pages = self.pages[start:]
+            self.tokens = overlap_sum
+
+        self.buf.append(para)
+        self.counts.append(ptoks)
+        self.pages.append(page)
+        self.tokens += ptoks
+
+    def finish(self) -> Iterator[Dict]:
+        if self.buf:
+            yield self._chunk()
+            self.buf, self.counts, self.pages, self.tokens = [], [], [], 0
+
+    def _chunk(self) -> Dict:
+        return {
+            "text": "\n\n".join(self.buf),
+            "page": self.pages[0],
+            "page_start": self.pages[0],
+            "page_end": self.pages[-1],
+            "file_name": self.file_name,
+            "source_uri": self.source_uri,
+            "section_path": " > ".join(self.section_path),
+        }
+
+
+def chunk_page(record: Dict, chunk_size: int, overlap_tokens: int) -> List[Dict]:
+    """
+    ESG-optimized chunking of a single page:
+    - paragraph-aware
+    - heading detection and section_path tracking
+    - semantic overlap by paragraph, not raw characters
+    """
+    builder = _ChunkBuilder(chunk_size, overlap_tokens, record["file_name"], record["source_uri"])
+    chunks = []
+    for para in split_paragraphs(record["text"]):
+        chunks.extend(builder.add(para, record["page"]))
+    chunks.extend(builder.finish())
+    return chunks
+
+
+def continues_paragraph(prev: str, nxt: str) -> bool:
+    """True if `nxt` (top of a page) finishes `prev` (bottom of the previous page)."""
+    return bool(prev) and bool(nxt) and prev.rstrip()[-1] not in ".!?:;" and nxt.lstrip()[0].islower()
+
+
+def chunk_document(records: Iterable[Dict], chunk_size: int, overlap_tokens: int) -> Iterator[Dict]:
+    """
+    Chunk a whole document streamed page by page (records in page order).
+    Unlike chunk_page, the section path and the paragraph buffer carry over
+    page breaks, a paragraph cut by a page break is re-joined, and chunks
+    carry page_start / page_end ("page" = page_start).
+    """
+    builder = None
+    carry: Tuple[str, int] | None = None   # last paragraph of the previous page
+
+    for record in records:
+        paras = split_paragraphs(record["text"])
+        if not paras:
+            continue
+        if builder is None:
+            builder = _ChunkBuilder(chunk_size, overlap_tokens, record["file_name"], record["source_uri"])
+
+        page = record["page"]
+        items = [(p, page) for p in paras]
+        if carry is not None:
+            if continues_paragraph(carry[0], items[0][0]):
+                items[0] = (carry[0] + " " + items[0][0], carry[1])
+            else:
+                items.insert(0, carry)
+
+        # hold back the page's last paragraph: the next page may continue it
+        for para, p in items[:-1]:
+            yield from builder.add(para, p)
+        carry = items[-1]
+
+    if builder is not None:
+        if carry is not None:
+            yield from builder.add(*carry)
+        yield from builder.finish()
@@ -1,8 +1,13 @@
 import argparse
 from .ingest import ingest_reports
 from .extract_facts import extract_facts
-from .recursive_verify import verifier
-from .vectordb import get_client, get_collection
+from .recursive_verify import verify_facts
+from .shards import open_shards
+from .config import (
+    INGEST_WORKERS, INGEST_WRITE_BATCH, LLM_CONCURRENCY, LLM_CONTEXT_TOKENS, RETRIEVAL_MODE,
+    MMR_TARGET, MMR_DIVERSITY, RERANKER, RERANK_CANDIDATES, RERANK_TOP_K,
+    VERIFY_WORKERS, VERIFY_MAX_DEPTH, VERIFY_MAX_FANOUT,
+)
 
 def main():
     p = argparse.ArgumentParser()
@@ -11,36 +16,78 @@ def main():
     p_ing = sub.add_parser("ingest")
     p_ing.add_argument("--reports", required=True)
     p_ing.add_argument("--db", required=True)
+    p_ing.add_argument("--workers", type=int, default=INGEST_WORKERS,
+                       help="Worker processes for PDF parsing/chunking (1 = serial)")
+    p_ing.add_argument("--write-batch", type=int, default=INGEST_WRITE_BATCH,
+                       help="Chunks embedded and written to Chroma per batch")
 
     p_ext = sub.add_parser("extract-facts")
     p_ext.add_argument("--db", required=True)
-    p_ext.add_argument("--query", default="Extract Scope 1–3 emissions, units, base year, method, assurance level")
+    p_ext.add_argument("--query", action="append",
+                       help="Retrieval query (repeat for several; default: Scope 1–3 emissions query)")
     p_ext.add_argument("--prompt", default="prompts/extract_facts.md")
     p_ext.add_argument("--out", required=True)
-    p_ext.add_argument("--company", default="Unknown Co.")
-    p_ext.add_argument("--year", type=int, default=2024)
+    p_ext.add_argument("--company",
+                       help="Company label of the output; also selects matching reports from the catalog. "
+                       "Omitted: all reports, label inferred from the catalog (else 'Unknown Co.')")
+    p_ext.add_argument("--year", type=int,
+                       help="Report year label of the output; also selects matching reports from the catalog. "
+                       "Omitted: all reports, label inferred from the catalog (else 2024)")
+    p_ext.add_argument("--file", help="Extract from this ingested PDF only (file name)")
+    p_ext.add_argument("--concurrency", type=int, default=LLM_CONCURRENCY,
+                       help="Parallel LLM extraction calls (match OLLAMA_NUM_PARALLEL)")
+    p_ext.add_argument("--no-cache", action="store_true",
+                       help="Ignore the LLM response cache")
+    p_ext.add_argument("--context-tokens", type=int, default=LLM_CONTEXT_TOKENS,
+                       help="LLM context window filled with packed evidence chunks")
+    p_ext.add_argument("--retrieval", choices=["hybrid", "vector"], default=RETRIEVAL_MODE,
+                       help="hybrid = BM25 + vector with reciprocal rank fusion")
+    p_ext.add_argument("--all-chunks", action="store_true",
+                       help="Also send chunks without numbers/units/years to the LLM")
+    p_ext.add_argument("--mmr-target", type=int, default=MMR_TARGET,
+                       help="Max chunks sent to the LLM after MMR diversification (0 = all)")
+    p_ext.add_argument("--diversity", type=float, default=MMR_DIVERSITY,
+                       help="MMR weight on novelty vs. relevance (0-1)")
+    p_ext.add_argument("--rerank", choices=["off", "cross-encoder", "ollama"], default=RERANKER,
+                       help="Re-score retrieved chunks before extraction "
+                       "(local cross-encoder, or an Ollama scorer named by RERANK_MODEL)")
+    p_ext.add_argument("--rerank-candidates", type=int, default=RERANK_CANDIDATES,
+                       help="Chunks retrieved for the re-ranker")
+    p_ext.add_argument("--rerank-top-k", type=int, default=RERANK_TOP_K,
+                       help="Best re-ranked chunks forwarded to extraction")
 
     p_ver = sub.add_parser("verify")
     p_ver.add_argument("--facts", required=True)
     p_ver.add_argument("--db", required=True)
     p_ver.add_argument("--out", required=True)
+    p_ver.add_argument("--workers", type=int, default=VERIFY_WORKERS,
+                       help="Facts verified in parallel")
+    p_ver.add_argument("--max-depth", type=int, default=VERIFY_MAX_DEPTH)
+    p_ver.add_argument("--max-fanout", type=int, default=VERIFY_MAX_FANOUT,
+                       help="Sources followed per node")
 
     args = p.parse_args()
     if args.cmd == "ingest":
-        ingest_reports(args.reports, args.db)
+        ingest_reports(args.reports, args.db, workers=args.workers, write_batch=args.write_batch)
 
     elif args.cmd == "extract-facts":
-        extract_facts(args.db, args.query, args.prompt, args.out, args.company, args.year)
+        queries = args.query or ["Extract Scope 1–3 emissions, units, base year, method, assurance level"]
+        extract_facts(args.db, queries, args.prompt, args.out, args.company, args.year,
+                      concurrency=args.concurrency, use_cache=not args.no_cache,
+                      context_tokens=args.context_tokens, retrieval=args.retrieval,
+                      quant_only=not args.all_chunks, file_name=args.file,
+                      mmr_target=args.mmr_target, diversity=args.diversity,
+                      reranker=args.rerank, rerank_candidates=args.rerank_candidates,
+                      rerank_top_k=args.rerank_top_k)
 
     elif args.cmd == "verify":
         import json
-        client = get_client(args.db)
-        col = get_collection(client)
+        col = open_shards(args.db)
         facts = json.load(open(args.facts))
-        results = []
-        for f in facts.get("facts", []):
-            statement = f.get("claim") or f.get("metric") or str(f)
-            results.append({"statement": statement, "verification": verifier(statement, col)})
+        results = verify_facts(
+            facts.get("facts", []), col,
+            workers=args.workers, max_depth=args.max_depth, max_fanout=args.max_fanout,
+        )
         json.dump(results, open(args.out,"w"), indent=2)
 
 if __name__ == "__main__":
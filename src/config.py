@@ -9,3 +9,84 @@ LLM_MODEL = os.getenv("LLM_MODEL", "mistral:7b-instruct")
 CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1100"))
 CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "150"))
 
+# Exact token counts from a local tokenizer.json (needs `tokenizers`); default is a len/4 estimate.
+# TOKENIZER_PATH wins, else TOKENIZER_DIR/<EMBEDDING_MODEL>.json is used if present.
+TOKENIZER_PATH = os.getenv("TOKENIZER_PATH", "")
+TOKENIZER_DIR = os.getenv("TOKENIZER_DIR", "./data/tokenizers")
+# Evidence packing counts with the LLM's tokenizer: LLM_TOKENIZER_PATH, else TOKENIZER_DIR/<LLM_MODEL>.json.
+LLM_TOKENIZER_PATH = os.getenv("LLM_TOKENIZER_PATH", "")
+
+
+# Ingestion: number of worker processes for PDF parsing + chunking (1 = in-process)
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "1"))
+
+# Streaming ingest: chunks per Chroma write, and messages buffered between pipeline stages
+INGEST_WRITE_BATCH = int(os.getenv("INGEST_WRITE_BATCH", "256"))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "8"))
+
+# Embeddings (Ollama /api/embed): texts per request, max in-flight requests, attempts
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "3"))
+
+# Embedding backend attached to collections: "ollama" (EMBEDDING_MODEL) or "chroma" (built-in MiniLM)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "ollama")
+
+# Persistent embedding cache (empty path disables it); max rows before LRU eviction
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "./data/cache/embeddings.sqlite")
+EMBED_CACHE_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "500000"))
+
+# Parallel LLM extraction calls (set to the server's OLLAMA_NUM_PARALLEL)
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "1"))
+
+# LLM response cache (empty path disables it); TTL in seconds (0 = no expiry), size cap in MB
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "./data/cache/llm_responses.sqlite")
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(30 * 24 * 3600)))
+LLM_CACHE_MAX_MB = int(os.getenv("LLM_CACHE_MAX_MB", "256"))
+
+# Stream LLM output (stops JSON generations as soon as the object is complete)
+LLM_STREAM = os.getenv("LLM_STREAM", "1").lower() not in ("0", "false", "no")
+
+# Send the facts JSON schema as Ollama `format` and validate facts with pydantic
+LLM_STRUCTURED = os.getenv("LLM_STRUCTURED", "1").lower() not in ("0", "false", "no")
+
+# Extraction context window (num_ctx) filled with packed evidence; tokens kept free for the answer:
+# LLM_OUTPUT_PER_CHUNK per evidence chunk of a pack, at least LLM_OUTPUT_RESERVE
+LLM_CONTEXT_TOKENS = int(os.getenv("LLM_CONTEXT_TOKENS", "8192"))
+LLM_OUTPUT_RESERVE = int(os.getenv("LLM_OUTPUT_RESERVE", "2048"))
+LLM_OUTPUT_PER_CHUNK = int(os.getenv("LLM_OUTPUT_PER_CHUNK", "1024"))
+
+# Recursive verification budgets and parallelism
+VERIFY_MAX_DEPTH = int(os.getenv("VERIFY_MAX_DEPTH", "3"))
+VERIFY_MAX_FANOUT = int(os.getenv("VERIFY_MAX_FANOUT", "3"))
+VERIFY_WORKERS = int(os.getenv("VERIFY_WORKERS", "4"))
+
+# Retrieval: "hybrid" (BM25 + vector, reciprocal rank fusion) or "vector"; RRF constant
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# Extraction only sends chunks tagged as quantitative (numbers, %, years, units) to the LLM
+EXTRACT_QUANT_ONLY = os.getenv("EXTRACT_QUANT_ONLY", "1").lower() not in ("0", "false", "no")
+
+# PDF table detection (find_tables): "off", "auto" (only pages that look tabular) or "all"
+PDF_TABLE_MODE = os.getenv("PDF_TABLE_MODE", "off")
+
+# Collection sharding: "none" (one "reports" collection), "company" or "year"
+SHARD_BY = os.getenv("SHARD_BY", "none")
+
+# Near-duplicate chunks (MinHash estimate of Jaccard similarity >= threshold) share one vector; 0 disables
+NEARDUP_THRESHOLD = float(os.getenv("NEARDUP_THRESHOLD", "0.9"))
+
+# Evidence diversification before extraction: keep at most MMR_TARGET chunks (0 = all),
+# MMR_DIVERSITY 0 = pure relevance ... 1 = pure novelty
+MMR_TARGET = int(os.getenv("MMR_TARGET", "16"))
+MMR_DIVERSITY = float(os.getenv("MMR_DIVERSITY", "0.3"))
+
+# Optional re-ranking before extraction: "off", "cross-encoder" (sentence-transformers, CPU) or "ollama";
+# RERANK_MODEL defaults to ms-marco-MiniLM-L-6-v2; "ollama" needs it set to a small model (else skipped).
+# Retrieve RERANK_CANDIDATES, extract from the best RERANK_TOP_K
+RERANKER = os.getenv("RERANKER", "off")
+RERANK_MODEL = os.getenv("RERANK_MODEL", "")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "100"))
+RERANK_TOP_K = int(os.getenv("RERANK_TOP_K", "10"))
+RERANK_CACHE_PATH = os.getenv("RERANK_CACHE_PATH", "./data/cache/rerank_scores.sqlite")
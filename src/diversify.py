@@ -0,0 +1,95 @@
+# src/diversify.py
+
+"""
+Post-retrieval diversification of evidence chunks (before the LLM sees them).
+
+- maximal marginal relevance over the chunk embeddings:
+      score = (1 - diversity) * sim(chunk, queries) - diversity * max sim(chunk, picked)
+  sim(chunk, queries) is the best cosine similarity over all queries
+- overlap suppression: the chunker repeats paragraphs between neighbouring
+  chunks; a chunk whose text is mostly paragraphs of already picked chunks
+  is set aside, and picked at the end only if it still holds a paragraph
+  no picked chunk covers (so no paragraph is lost while the budget allows)
+- keeps at most `target` chunks, most relevant first; once `target` is
+  reached the paragraphs of set-aside chunks can be missing
+"""
+
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+# Set a chunk aside when this share of its characters is already in picked chunks
+PARAGRAPH_OVERLAP_MAX = 0.5
+
+
+def paragraphs(text: str) -> List[str]:
+    """Whitespace-normalized, non-empty paragraphs (the chunker's units)."""
+    return [" ".join(p.split()) for p in text.split("\n\n") if p.strip()]
+
+
+def _unit(vectors) -> np.ndarray:
+    m = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    return m / np.where(norms == 0, 1.0, norms)
+
+
+def diversify(
+    docs: List[str],
+    embeddings: Sequence | None,
+    query_embeddings: Sequence | None,
+    target: int,
+    diversity: float = 0.3,
+    overlap_max: float = PARAGRAPH_OVERLAP_MAX,
+    relevance: Sequence | None = None,
+) -> List[int]:
+    """
+    Indices of the chunks to keep, in selection order.
+    `docs` are in retrieval order; without embeddings that order is the
+    relevance and only overlap suppression applies. `relevance` (e.g.
+    re-ranker scores) replaces the query similarity; it is min-max scaled.
+    target <= 0 keeps every chunk that is not suppressed.
+    """
+    n = len(docs)
+    target = n if target <= 0 else min(target, n)
+    d = None
+    if embeddings is not None and len(embeddings) == n:
+        d = _unit(embeddings)
+    if relevance is not None:
+        relevance = np.asarray(relevance, dtype=np.float32)
+        span = float(relevance.max() - relevance.min()) if n else 0.0
+        relevance = (relevance - relevance.min()) / span if span > 0 else np.ones(n, dtype=np.float32)
+    elif d is not None and query_embeddings is not None and len(query_embeddings):
+        relevance = (d @ _unit(query_embeddings).T).max(axis=1)
+    else:
+        relevance = np.linspace(1.0, 0.0, n) if n else np.zeros(0)
+
+    paras = [paragraphs(t) for t in docs]
+    covered: Dict[str, None] = {}
+    redundancy = np.full(n, -1.0, dtype=np.float32)
+    remaining = list(range(n))
+    picked: List[int] = []
+    deferred: List[int] = []
+
+    while remaining and len(picked) < target:
+        scores = [(1 - diversity) * relevance[i] - diversity * max(redundancy[i], 0.0) for i in remaining]
+        i = remaining.pop(int(np.argmax(scores)))
+
+        total = sum(len(p) for p in paras[i]) or 1
+        shared = sum(len(p) for p in paras[i] if p in covered)
+        if shared / total >= overlap_max:
+            deferred.append(i)
+            continue
+
+        picked.append(i)
+        covered.update(dict.fromkeys(paras[i]))
+        if d is not None:
+            redundancy = np.maximum(redundancy, d @ d[i])
+
+    # set-aside chunks whose new paragraphs no later pick covered
+    for i in deferred:
+        if len(picked) >= target:
+            break
+        if any(p not in covered for p in paras[i]):
+            picked.append(i)
+            covered.update(dict.fromkeys(paras[i]))
+    return picked
@@ -1,7 +1,65 @@
 # src/embedder_ollama.py
-import requests, time
-from typing import List
-from .config import OLLAMA_HOST, EMBEDDING_MODEL
+
+"""
+Ollama embedding client:
+- one pooled requests.Session (keep-alive, shared by all threads)
+- batched /api/embed calls with `input` lists
+- bounded number of in-flight requests (EMBED_CONCURRENCY)
+- jittered exponential backoff, only after a failed attempt
+- falls back to the legacy per-text /api/embeddings endpoint on old servers
+- persistent SQLite embedding cache keyed by (model, sha256(text)),
+  LRU-evicted, so only cache misses hit Ollama
+"""
+
+import hashlib
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+from .config import (
+    OLLAMA_HOST,
+    EMBEDDING_MODEL,
+    EMBED_BATCH_SIZE,
+    EMBED_CONCURRENCY,
+    EMBED_MAX_RETRIES,
+    EMBED_CACHE_PATH,
+    EMBED_CACHE_MAX_ENTRIES,
+)
+
+
+# -----------------------------------------------------
+# Shared HTTP session
+# -----------------------------------------------------
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def _get_session() -> requests.Session:
+    """Lazily build one pooled session sized for the concurrency limit."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            s = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=1,
+                pool_maxsize=max(EMBED_CONCURRENCY, 1),
+            )
+            s.mount("http://", adapter)
+            s.mount("https://", adapter)
+            _session = s
+        return _session
+
+
+class _EndpointMissing(Exception):
+    """Server does not know /api/embed (Ollama < 0.3)."""
 
 
 def _parse_embedding(payload):
@@ -20,47 +78,264 @@ def _parse_embedding(payload):
     return None
 
 
-def embed_texts(texts: List[str]) -> List[List[float]]:
+def _parse_embeddings(payload) -> Optional[List[List[float]]]:
     """
-    Embed a list of texts using Ollama's /api/embeddings.
+    Batched /api/embed response: {"embeddings": [[...], [...]]}
+    """
+    if isinstance(payload, dict):
+        embs = payload.get("embeddings")
+        if isinstance(embs, list) and embs and all(isinstance(e, list) and e for e in embs):
+            return embs
+    return None
+
+
+# -----------------------------------------------------
+# Persistent embedding cache
+# -----------------------------------------------------
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
 
-    NOTE: For models like `nomic-embed-text`, the correct field is `prompt`
-    (NOT `input`), which is why earlier calls were returning empty embeddings.
+class EmbeddingCache:
+    """
+    SQLite store of float32 vectors keyed by (model, sha256(text)).
+    Bounded to `max_entries` rows; least recently used rows are evicted.
+    Safe to share between threads.
+    """
+
+    def __init__(self, path: str, max_entries: int = EMBED_CACHE_MAX_ENTRIES):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model     TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector    BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_lru ON embeddings(last_used)")
+        self._conn.commit()
+
+    def get_many(self, model: str, hashes: List[str]) -> Dict[str, List[float]]:
+        """Return {hash: vector} for the hashes present; refreshes their LRU stamp."""
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            for i in range(0, len(hashes), 500):  # stay under SQLite's variable limit
+                part = hashes[i:i + 500]
+                marks = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({marks})",
+                    [model, *part],
+                ).fetchall()
+                for h, blob in rows:
+                    found[h] = np.frombuffer(blob, dtype=np.float32).tolist()
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                    [(now, model, h) for h in found],
+                )
+                self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(hashes) - len(found)
+        return found
+
+    def put_many(self, model: str, items: Dict[str, List[float]]):
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                [
+                    (model, h, np.asarray(v, dtype=np.float32).tobytes(), now)
+                    for h, v in items.items()
+                ],
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE rowid IN "
+                "(SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> Optional[EmbeddingCache]:
+    """Process-wide cache; None when EMBED_CACHE_PATH is empty."""
+    global _cache
+    with _cache_lock:
+        if _cache is None and EMBED_CACHE_PATH:
+            _cache = EmbeddingCache(EMBED_CACHE_PATH, EMBED_CACHE_MAX_ENTRIES)
+        return _cache
+
+
+def opened_cache() -> Optional[EmbeddingCache]:
+    """The process-wide cache if this run used it (never creates the file)."""
+    with _cache_lock:
+        return _cache
+
+
+# -----------------------------------------------------
+# Retry helper
+# -----------------------------------------------------
+def _backoff(attempt: int, base: float = 0.5, cap: float = 8.0) -> float:
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def _post_json(url: str, payload: dict, parse, what: str, timeout: int = 120):
+    """
+    POST with retries. Sleeps only between failed attempts.
+    `parse` turns the JSON body into a result or None (invalid).
+    """
+    last_err: Exception | None = None
+
+    for attempt in range(EMBED_MAX_RETRIES):
+        try:
+            resp = _get_session().post(url, json=payload, timeout=timeout)
+            if resp.status_code == 404 and url.endswith("/api/embed"):
+                raise _EndpointMissing()
+            if resp.ok:
+                data = resp.json()
+                result = parse(data)
+                if result is not None:
+                    return result
+                last_err = RuntimeError(f"Empty/invalid embedding for {what}: {str(data)[:200]}")
+            else:
+                last_err = RuntimeError(f"HTTP {resp.status_code}: {resp.text[:200]}")
+        except _EndpointMissing:
+            raise
+        except Exception as e:
+            last_err = e
+
+        if attempt + 1 < EMBED_MAX_RETRIES:
+            time.sleep(_backoff(attempt))
+
+    # hard fail so caller can see the last error
+    raise last_err or RuntimeError("Unknown embeddings error")
+
+
+# -----------------------------------------------------
+# Batch embedding
+# -----------------------------------------------------
+def _embed_batch(batch: List[str], model: str) -> List[List[float]]:
+    url = f"{OLLAMA_HOST}/api/embed"
+    try:
+        embs = _post_json(
+            url,
+            {"model": model, "input": batch},
+            _parse_embeddings,
+            what=f"batch of {len(batch)}",
+        )
+    except _EndpointMissing:
+        return _embed_legacy(batch, model)
+
+    if len(embs) != len(batch):
+        raise RuntimeError(f"Ollama returned {len(embs)} embeddings for {len(batch)} inputs")
+    return embs
+
+
+def _embed_legacy(batch: List[str], model: str) -> List[List[float]]:
+    """
+    Old servers only have /api/embeddings, one text per call.
+
+    NOTE: For models like `nomic-embed-text`, the correct field there is
+    `prompt` (NOT `input`), which is why earlier calls were returning
+    empty embeddings.
     """
     url = f"{OLLAMA_HOST}/api/embeddings"
-    out: List[List[float]] = []
+    return [
+        _post_json(url, {"model": model, "prompt": t}, _parse_embedding, what=f"item {i}")
+        for i, t in enumerate(batch)
+    ]
+
 
-    for i, t in enumerate(texts):
-        # Use "prompt" instead of "input" (matches the working curl call)
-        payload = {
-            "model": EMBEDDING_MODEL,
-            "prompt": t,
-        }
-        last_err = None
-
-        for attempt in range(3):
-            try:
-                resp = requests.post(url, json=payload, timeout=60)
-                if resp.ok:
-                    data = resp.json()
-                    emb = _parse_embedding(data)
-                    if emb and isinstance(emb, list) and len(emb) > 0:
-                        out.append(emb)
-                        break
-                    last_err = RuntimeError(
-                        f"Empty/invalid embedding for item {i}: {data}"
-                    )
-                else:
-                    last_err = RuntimeError(
-                        f"HTTP {resp.status_code}: {resp.text[:200]}"
-                    )
-            except Exception as e:
-                last_err = e
-
-            time.sleep(0.6 * (attempt + 1))
-
-        if len(out) < i + 1:
-            # hard fail so caller can see the last error
-            raise last_err or RuntimeError("Unknown embeddings error")
-
-    return out
\ No newline at end of file
+def embed_texts(
+    texts: List[str],
+    model: str = EMBEDDING_MODEL,
+    batch_size: int = EMBED_BATCH_SIZE,
+    concurrency: int = EMBED_CONCURRENCY,
+    use_cache: bool = True,
+) -> List[List[float]]:
+    """
+    Embed a list of texts using Ollama's batched /api/embed.
+
+    Cached texts are served from the embedding cache; only misses (each
+    distinct text once) are sent to Ollama and then stored.
+    Output order matches input order.
+    """
+    if not texts:
+        return []
+
+    cache = get_cache() if use_cache else None
+    if cache is None:
+        return _embed_uncached(texts, model, batch_size, concurrency)
+
+    hashes = [text_hash(t) for t in texts]
+    found = cache.get_many(model, list(dict.fromkeys(hashes)))
+
+    missing: Dict[str, str] = {}
+    for h, t in zip(hashes, texts):
+        if h not in found and h not in missing:
+            missing[h] = t
+
+    if missing:
+        embs = _embed_uncached(list(missing.values()), model, batch_size, concurrency)
+        fresh = dict(zip(missing.keys(), embs))
+        cache.put_many(model, fresh)
+        found.update(fresh)
+
+    return [found[h] for h in hashes]
+
+
+def _embed_uncached(
+    texts: List[str],
+    model: str,
+    batch_size: int,
+    concurrency: int,
+) -> List[List[float]]:
+    """
+    Texts are split into `batch_size` batches; at most `concurrency`
+    batches are in flight at once.
+    """
+    batch_size = max(1, batch_size)
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+
+    if concurrency <= 1 or len(batches) == 1:
+        results = [_embed_batch(b, model) for b in batches]
+    else:
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(batches))) as pool:
+            # map() keeps batch order
+            results = list(pool.map(lambda b: _embed_batch(b, model), batches))
+
+    out: List[List[float]] = []
+    for embs in results:
+        out.extend(embs)
+    return out
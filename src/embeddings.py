@@ -0,0 +1,125 @@
+# src/embeddings.py
+
+"""
+Pluggable embedding backends for the vector DB.
+
+- "ollama": embedder_ollama.embed_texts with EMBEDDING_MODEL (default)
+- "chroma": Chroma's built-in ONNX MiniLM (legacy collections)
+
+vectordb.get_collection attaches a backend to the collection, computes
+embeddings itself (embeddings= / query_embeddings=) and records the model
+name + dimension in the collection metadata so a mismatched model is refused.
+"""
+
+import abc
+from typing import List, Dict, Any
+
+from chromadb.api.types import EmbeddingFunction
+
+from .config import EMBEDDING_BACKEND, EMBEDDING_MODEL
+
+
+# ---------------------------------------------------------
+# Backends
+# ---------------------------------------------------------
+class EmbeddingBackend(abc.ABC):
+    """
+    Base class. `name` is what gets stored in collection metadata.
+    Subclasses implement embed_documents; queries use it unless overridden.
+    """
+
+    kind = "base"
+
+    def __init__(self, model: str):
+        self.model = model
+
+    @property
+    def name(self) -> str:
+        return f"{self.kind}:{self.model}"
+
+    @abc.abstractmethod
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """One embedding per text, in input order."""
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_documents(texts)
+
+
+class OllamaEmbeddingBackend(EmbeddingBackend):
+    kind = "ollama"
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        from .embedder_ollama import embed_texts
+        return embed_texts(texts, model=self.model)
+
+
+class ChromaDefaultBackend(EmbeddingBackend):
+    """
+    Chroma's bundled all-MiniLM-L6-v2 (ONNX). Loaded lazily so the
+    warm-up only happens when this backend actually embeds something.
+    """
+
+    kind = "chroma"
+
+    def __init__(self, model: str = "all-MiniLM-L6-v2"):
+        super().__init__(model)
+        self._ef = None
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self._ef is None:
+            from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+            self._ef = DefaultEmbeddingFunction()
+        return [list(map(float, e)) for e in self._ef(texts)]
+
+
+BACKENDS = {
+    OllamaEmbeddingBackend.kind: OllamaEmbeddingBackend,
+    ChromaDefaultBackend.kind: ChromaDefaultBackend,
+}
+
+
+def get_backend(kind: str = EMBEDDING_BACKEND, model: str | None = None) -> EmbeddingBackend:
+    """Build a backend by kind ("ollama" | "chroma")."""
+    if kind not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{kind}'. Choose one of: {sorted(BACKENDS)}")
+    if kind == ChromaDefaultBackend.kind:
+        return ChromaDefaultBackend() if model is None else ChromaDefaultBackend(model)
+    return BACKENDS[kind](model or EMBEDDING_MODEL)
+
+
+# ---------------------------------------------------------
+# Chroma adapter
+# ---------------------------------------------------------
+class BackendEmbeddingFunction(EmbeddingFunction):
+    """
+    Exposes a backend as a Chroma embedding function, so Chroma never
+    instantiates its own default model for this collection.
+    """
+
+    def __init__(self, backend: EmbeddingBackend):
+        self.backend = backend
+
+    @staticmethod
+    def name() -> str:
+        return "research-rag-backend"
+
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        return self.backend.embed_documents(list(input))
+
+    def embed_query(self, input: List[str]) -> List[List[float]]:
+        return self.backend.embed_queries(list(input))
+
+    def get_config(self) -> Dict[str, Any]:
+        return {"kind": self.backend.kind, "model": self.backend.model}
+
+    @staticmethod
+    def build_from_config(config: Dict[str, Any]) -> "BackendEmbeddingFunction":
+        return BackendEmbeddingFunction(get_backend(config["kind"], config["model"]))
+
+
+try:
+    from chromadb.utils.embedding_functions import register_embedding_function
+    register_embedding_function(BackendEmbeddingFunction)
+except (ImportError, ValueError):
+    # older Chroma: no registry; the adapter is still passed explicitly
+    pass
@@ -3,17 +3,45 @@
 """
 Production-grade fact extraction pipeline using:
 - improved vectordb retrieval
-- per-chunk extraction with JSON guarantee
+- hybrid BM25 + vector retrieval (reciprocal rank fusion) when a lexical index exists
+- document catalog (ingest manifest) resolves --file / --company / --year
+  to a file filter and the shard collections to search; omitted company /
+  year labels are inferred from the selected reports' catalog entries
+- numeric pre-filter: chunks without quantitative content never reach the LLM
+- optional re-ranking (local cross-encoder or Ollama scorer, cached pair
+  scores): retrieve many candidates, extract from the best few
+- MMR diversification + paragraph-overlap suppression of the retrieved chunks
+- near-duplicate chunks stored once (neardup.py) still match per-file filters
+  and are cited from the selected report
+- token-budget packing: several evidence chunks per LLM call, none truncated
+- bounded concurrent LLM calls (keeps Ollama's parallel slots busy)
+- schema-constrained output, validated per fact; only failing facts are repaired
 - deduplication + ESRS-aligned fact IDs
 - stable merged output
 """
 
 import json
 import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from typing import List, Dict, Any
 
-from .vectordb import get_client, get_collection, query
+from .vectordb import query_batch, hybrid_query_batch, and_where, embed_queries, get_by_ids
+from .shards import BASE_COLLECTION, open_shards
+from .lexical import LexicalIndex
+from .manifest import IngestManifest, MANIFEST_NAME
 from .llm_ollama import generate_json
+from .schemas import FACTS_JSON_SCHEMA, check_facts_envelope, split_valid_facts
+from .packing import Evidence, pack_chunks, evidence_for_fact, count_tokens, output_budget
+from .numeric_tags import QUANT_WHERE, is_quantitative
+from .neardup import file_where, localize
+from .diversify import diversify
+from .rerank import get_reranker, rerank
+from .config import (
+    LLM_CONCURRENCY, LLM_STRUCTURED, LLM_CONTEXT_TOKENS, LLM_OUTPUT_RESERVE, LLM_OUTPUT_PER_CHUNK,
+    RETRIEVAL_MODE, RRF_K, EXTRACT_QUANT_ONLY, MMR_TARGET, MMR_DIVERSITY,
+    RERANKER, RERANK_CANDIDATES, RERANK_TOP_K,
+)
 
 
 # --------------------------------------------
@@ -43,23 +71,274 @@ def _merge_facts(all_facts: List[Dict]) -> List[Dict]:
     return list(merged.values())
 
 
+REPAIR_SYSTEM_PROMPT = """You fix extracted fact objects so they match the required JSON schema.
+Keep every "text" value verbatim. Do not invent facts.
+Return ONLY JSON of the form {"facts": [...]}."""
+
+
+def _repair_facts(invalid: List, use_cache: bool = True) -> List[Dict]:
+    """
+    Ask the model to fix only the facts that failed validation
+    (a short call, instead of re-running the whole chunk extraction).
+    """
+    listing = "\n".join(
+        f"- error: {err}\n  fact: {json.dumps(item, ensure_ascii=False)}"
+        for item, err in invalid
+    )
+    try:
+        fixed = generate_json(
+            system_prompt=REPAIR_SYSTEM_PROMPT,
+            user_prompt=f"These facts failed validation:\n{listing}\n",
+            max_retries=1,
+            temperature=0.0,
+            use_cache=use_cache,
+            schema=FACTS_JSON_SCHEMA,
+            validate=check_facts_envelope,
+        )
+        repaired, still_bad = split_valid_facts(fixed)
+    except Exception as e:
+        print(f"[WARN] Could not repair {len(invalid)} invalid fact(s): {e}")
+        return []
+
+    if still_bad:
+        print(f"[WARN] Dropping {len(still_bad)} fact(s) that still fail validation")
+    return repaired
+
+
+def _render_prompt(pack: List[Evidence], company: str | None, year: int | None) -> str:
+    evidence = "\n\n".join(e.render() for e in pack)
+    return f"""
+Company: {company or "unknown"}
+Year: {year if year is not None else "unknown"}
+
+The following is EVIDENCE from the report, split into numbered chunks:
+
+{evidence}
+
+Extract ONLY the facts according to the extraction rules.
+Set "chunk" on every fact to the number of the chunk it was taken from.
+Return ONLY valid JSON.
+"""
+
+
+def _extract_pack(
+    i: int,
+    n_packs: int,
+    pack: List[Evidence],
+    system_prompt: str,
+    company: str | None,
+    year: int | None,
+    use_cache: bool = True,
+    structured: bool = LLM_STRUCTURED,
+    num_ctx: int | None = None,
+) -> List[Dict]:
+    """
+    One LLM call for one pack of evidence chunks → normalized facts (never raises).
+    The answer may use LLM_OUTPUT_PER_CHUNK tokens per chunk (at least
+    LLM_OUTPUT_RESERVE), capped by what the prompt leaves of the context window.
+    """
+    pages = sorted({e.meta.get("page") for e in pack}, key=str)
+    print(f"[DEBUG] Extracting from pack {i}/{n_packs} ({len(pack)} chunks, pages={pages})")
+
+    user_prompt = _render_prompt(pack, company, year)
+    max_tokens = output_budget(len(pack), LLM_OUTPUT_PER_CHUNK, LLM_OUTPUT_RESERVE)
+    context = num_ctx or LLM_CONTEXT_TOKENS
+    max_tokens = max(1, min(max_tokens, context - count_tokens(system_prompt) - count_tokens(user_prompt)))
+
+    try:
+        pack_result = generate_json(
+            system_prompt=system_prompt,
+            user_prompt=user_prompt,
+            max_retries=3,
+            temperature=0.1,
+            use_cache=use_cache,
+            schema=FACTS_JSON_SCHEMA if structured else None,
+            validate=check_facts_envelope if structured else None,
+            num_ctx=num_ctx,
+            max_tokens=max_tokens,
+        )
+    except Exception as e:
+        print(f"[ERROR] JSON extraction failed for pack {i}: {e}")
+        return []
+
+    # Validate structure
+    if structured:
+        pack_facts, invalid = split_valid_facts(pack_result)
+        if invalid:
+            print(f"[WARN] {len(invalid)} invalid fact(s) in pack {i}, repairing only those")
+            pack_facts += _repair_facts(invalid, use_cache)
+    else:
+        pack_facts = pack_result.get("facts", [])
+        if not isinstance(pack_facts, list):
+            pack_facts = []
+
+    # Normalize & attach metadata of the chunk each fact came from
+    out = []
+    for f in pack_facts:
+        if not isinstance(f, dict):
+            continue
+        ev = evidence_for_fact(f, pack)
+        f.pop("chunk", None)
+        f["page"] = ev.meta["page"]
+        f["file_name"] = ev.meta["file_name"]
+        f["section_path"] = ev.meta.get("section_path", "")
+        f.setdefault("id", _fact_id(f.get("text", ""), f["page"]))
+        out.append(f)
+    return out
+
+
+def _retrieve(col, queries: List[str], n: int, where: dict | None, lexical: LexicalIndex | None = None):
+    """
+    One batched round trip for all queries (hybrid if a lexical index is
+    given); hits are merged by chunk ID (best score wins) and the n best kept.
+    Returns (ids, documents, metadatas).
+    """
+    if lexical is not None:
+        hits = hybrid_query_batch(col, lexical, queries, n=n, where=where, rrf_k=RRF_K)
+    else:
+        hits = query_batch(col, queries, n=n, where=where)
+
+    best: Dict[str, tuple] = {}
+    for hit in hits:
+        scores = hit.get("scores") or [-d for d in hit["distances"]]
+        for cid, doc, meta, score in zip(hit["ids"], hit["documents"], hit["metadatas"], scores):
+            if cid not in best or score > best[cid][2]:
+                best[cid] = (doc, meta, score)
+    ranked = sorted(best.items(), key=lambda kv: kv[1][2], reverse=True)[:n]
+    return [cid for cid, _ in ranked], [d for _, (d, _, _) in ranked], [m for _, (_, m, _) in ranked]
+
+
+def _diversify(col, queries: List[str], ids: List[str], docs: List[str], target: int, diversity: float,
+               relevance: List[float] | None = None) -> List[int]:
+    """
+    MMR over the stored embeddings of the retrieved chunks (one extra get;
+    query embeddings come from the in-process cache). Returns kept indices.
+    """
+    got = get_by_ids(col, ids, include=["embeddings"])
+    by_id = dict(zip(got["ids"], got["embeddings"]))
+    embeddings = [by_id.get(cid) for cid in ids]
+    if any(e is None for e in embeddings):
+        embeddings = None
+    q_embs = embed_queries(col[0] if isinstance(col, list) else col, queries)
+    return diversify(docs, embeddings, q_embs, target, diversity, relevance=relevance)
+
+
+def _file_filter(db_dir: str, file_name: str | None, company: str | None, year: int | None):
+    """
+    Pick the report(s) to extract from via the ingest catalog:
+    an explicit file name, else the files matching whichever of company /
+    year were given, else every ingested report (also, with a warning,
+    when company / year match nothing).
+    Returns (where filter, names of the shard collections holding them,
+    selected file names).
+    """
+    if not (Path(db_dir) / MANIFEST_NAME).exists():
+        print("[WARN] No document catalog found (re-run ingest) — searching all chunks.")
+        return None, [BASE_COLLECTION], []
+
+    catalog = IngestManifest(db_dir)
+    try:
+        if file_name:
+            docs = catalog.find(file_name=file_name)
+            if not docs:
+                raise ValueError(f"File {file_name!r} is not in the catalog of {db_dir}")
+        elif company or year is not None:
+            docs = catalog.find(company=company, year=year)
+            if not docs:
+                known = sorted({(d["company"] or "?", d["report_year"] or 0) for d in catalog.documents()})
+                available = ", ".join(f"{c} {y or '?'}" for c, y in known) or "none"
+                print(
+                    f"[WARN] No catalog match for company {company!r}, year {year} "
+                    f"(catalog: {available}) — searching all ingested reports."
+                )
+        else:
+            docs = []
+        registry = catalog.collections()
+    finally:
+        catalog.close()
+
+    names = sorted({d["file_name"] for d in docs})
+    if not names:
+        print("[INFO] Extracting from all ingested reports.")
+        return None, registry or [BASE_COLLECTION], []
+    shards = sorted({d["collection"] for d in docs})
+    print(f"[INFO] Extracting from: {', '.join(names)} (collections: {', '.join(shards)})")
+    return file_where(names), shards, names
+
+
+# Output labels when neither the flags nor the catalog give one
+DEFAULT_COMPANY_LABEL = "Unknown Co."
+DEFAULT_YEAR_LABEL = 2024
+
+
+def _labels(db_dir: str, file_names: List[str], company: str | None, year: int | None):
+    """
+    (company, year) labels of the output. Given values are kept; a missing
+    one is taken from the catalog entries of the selected reports (every
+    ingested report when none were selected) if they all agree, else
+    DEFAULT_COMPANY_LABEL / DEFAULT_YEAR_LABEL. Labels never filter.
+    """
+    if company and year is not None:
+        return company, year
+    docs = []
+    if (Path(db_dir) / MANIFEST_NAME).exists():
+        catalog = IngestManifest(db_dir)
+        try:
+            docs = [d for n in file_names for d in catalog.find(file_name=n)] if file_names else catalog.documents()
+        finally:
+            catalog.close()
+    companies = {d["company"] for d in docs}
+    years = {d["report_year"] for d in docs}
+    if not company:
+        company = companies.pop() if len(companies) == 1 and None not in companies else DEFAULT_COMPANY_LABEL
+    if year is None:
+        year = years.pop() if len(years) == 1 and None not in years else DEFAULT_YEAR_LABEL
+    return company, year
+
+
 # --------------------------------------------
 # Main extraction
 # --------------------------------------------
 def extract_facts(
     db_dir: str,
-    query_text: str,
+    query_text: str | List[str],
     prompt_path: str,
     out_path: str,
-    company: str,
-    year: int
+    company: str | None,
+    year: int | None,
+    concurrency: int = LLM_CONCURRENCY,
+    use_cache: bool = True,
+    context_tokens: int = LLM_CONTEXT_TOKENS,
+    retrieval: str = RETRIEVAL_MODE,
+    quant_only: bool = EXTRACT_QUANT_ONLY,
+    file_name: str | None = None,
+    mmr_target: int = MMR_TARGET,
+    diversity: float = MMR_DIVERSITY,
+    reranker: str = RERANKER,
+    rerank_candidates: int = RERANK_CANDIDATES,
+    rerank_top_k: int = RERANK_TOP_K,
 ):
     """
     Multi-chunk robust extraction pipeline.
+    `query_text` may be a list of queries; they are retrieved in one batch.
+    `concurrency` > 1 runs that many LLM calls in parallel (match it to
+    OLLAMA_NUM_PARALLEL on the server).
+    `use_cache=False` bypasses the LLM response cache.
+    `context_tokens` is the model context window that evidence packs fill
+    (minus the system prompt and the answer: LLM_OUTPUT_PER_CHUNK tokens
+    per packed chunk, at least LLM_OUTPUT_RESERVE).
+    `retrieval` is "hybrid" (BM25 + vector, RRF) or "vector".
+    `quant_only` skips chunks with no numbers, percentages, years or units.
+    `file_name` restricts retrieval to one ingested report; otherwise
+    `company` / `year` (labels of the output) also select reports through
+    the catalog when given; None searches every ingested report and takes
+    the label from the catalog (see _labels).
+    `mmr_target` caps the chunks sent to the LLM (0 = no cap): they are
+    picked by maximal marginal relevance with weight `diversity` on novelty,
+    and chunks mostly repeating picked paragraphs are dropped.
+    `reranker` ("off", "cross-encoder", "ollama") re-scores
+    `rerank_candidates` retrieved chunks and keeps the best `rerank_top_k`.
     """
-    client = get_client(db_dir)
-    col = get_collection(client)
-
     # ------------------------------------------------------------
     # LOAD PROMPT
     # ------------------------------------------------------------
@@ -67,24 +346,42 @@ def extract_facts(
         system_prompt = f.read().strip()
 
     # ------------------------------------------------------------
-    # DYNAMIC FILE FILTER (first .pdf encountered)
+    # FILE FILTER (resolved through the document catalog)
     # ------------------------------------------------------------
-    all_meta = col.get(include=["metadatas"], limit=99999).get("metadatas", [])
-    pdf_names = sorted({m["file_name"] for m in all_meta})
-    fname = pdf_names[0] if pdf_names else None
-    where = {"file_name": {"$eq": fname}} if fname else None
+    where, shard_names, file_names = _file_filter(db_dir, file_name, company, year)
+    given = (company, year)
+    company, year = _labels(db_dir, file_names, company, year)
+    if (company, year) != given:
+        print(f"[INFO] Labeling facts as company {company!r}, year {year}.")
+    col = open_shards(db_dir, shard_names)
 
     # ------------------------------------------------------------
     # RETRIEVE CONTEXT CHUNKS
     # ------------------------------------------------------------
-    hits = query(col, query_text, n=40, where=where)
+    queries = [query_text] if isinstance(query_text, str) else list(query_text)
+    lexical = None
+    if retrieval == "hybrid" and LexicalIndex.exists(db_dir):
+        lexical = LexicalIndex(db_dir)
+    elif retrieval == "hybrid":
+        print("[WARN] No lexical index found (re-run ingest) — using vector retrieval only.")
+    # a re-ranker gets a wider candidate pool to choose from
+    rr = get_reranker(reranker)
+    n_candidates = rerank_candidates if rr is not None else 40
+    if quant_only:
+        ids, docs, metas = _retrieve(col, queries, n=n_candidates, where=and_where(where, QUANT_WHERE), lexical=lexical)
+        if not docs:
+            # Chunks ingested before quantity tagging: filter them locally instead
+            ids, docs, metas = _retrieve(col, queries, n=n_candidates, where=where, lexical=lexical)
+            kept = [k for k, (d, m) in enumerate(zip(docs, metas)) if is_quantitative(d, m)]
+            print(f"[INFO] Untagged chunks: {len(docs) - len(kept)} of {len(docs)} skipped as non-quantitative.")
+            ids, docs, metas = [ids[k] for k in kept], [docs[k] for k in kept], [metas[k] for k in kept]
+    else:
+        ids, docs, metas = _retrieve(col, queries, n=n_candidates, where=where, lexical=lexical)
+    if file_names:
+        # chunks shared with another report: cite the selected report's copy
+        metas = [localize(m, file_names) for m in metas]
 
-    if (
-        not hits or
-        not hits.get("documents") or
-        not hits["documents"] or
-        not hits["documents"][0]
-    ):
+    if not docs:
         print("[WARN] No retrieval hits — saving empty facts.")
         json.dump(
             {"company": company, "year": year, "facts": [], "raw": "no_hits"},
@@ -93,65 +390,62 @@ def extract_facts(
         )
         return
 
-    docs = hits["documents"][0]
-    metas = hits["metadatas"][0]
-
     print(f"[INFO] Retrieved {len(docs)} chunks from vector DB for extraction.")
 
     # ------------------------------------------------------------
-    # PROCESS PER CHUNK
+    # RE-RANK (optional; forward only the best candidates)
     # ------------------------------------------------------------
-    all_facts = []
-
-    for i, (doc, meta) in enumerate(zip(docs, metas), start=1):
-        page = meta["page"]
-        section_path = meta.get("section_path", "")
-        file_name = meta["file_name"]
-
-        # limit chunk length (LLM friendly)
-        snippet = doc[:1800]
-
-        user_prompt = f"""
-Company: {company}
-Year: {year}
+    relevance = None
+    if rr is not None:
+        try:
+            ranked = rerank(rr, queries, ids, docs, use_cache=use_cache)[:rerank_top_k]
+        except Exception as e:
+            print(f"[WARN] Re-ranking with {rr.name} failed ({e}) — keeping retrieval order.")
+        else:
+            print(f"[INFO] Re-ranked {len(docs)} chunks with {rr.name}, keeping the best {len(ranked)}.")
+            ids, docs, metas = ([xs[k] for k, _ in ranked] for xs in (ids, docs, metas))
+            relevance = [score for _, score in ranked]
 
-The following is EVIDENCE from the report:
-[page: {page}, file: {file_name}, section: {section_path}]
+    # ------------------------------------------------------------
+    # DIVERSIFY (fewer, less redundant chunks → fewer LLM calls)
+    # ------------------------------------------------------------
+    kept = _diversify(col, queries, ids, docs, mmr_target, diversity, relevance=relevance)
+    if len(kept) < len(docs):
+        print(f"[INFO] Diversified to {len(kept)} of {len(docs)} chunks (MMR diversity={diversity}).")
+    docs, metas = [docs[k] for k in kept], [metas[k] for k in kept]
 
-EVIDENCE:
-\"\"\"
-{snippet}
-\"\"\"
+    # ------------------------------------------------------------
+    # PACK CHUNKS INTO CONTEXT-SIZED CALLS
+    # ------------------------------------------------------------
+    # the budget covers evidence and answer: denser packs get more output tokens
+    budget = context_tokens - count_tokens(system_prompt) - 200
+    packs = pack_chunks(docs, metas, budget, output_per_piece=LLM_OUTPUT_PER_CHUNK, output_floor=LLM_OUTPUT_RESERVE)
+    print(f"[INFO] Packed {len(docs)} chunks into {len(packs)} LLM call(s) (evidence + answer budget {budget} tokens).")
 
-Extract ONLY the facts according to the extraction rules.
-Return ONLY valid JSON.
-"""
+    # ------------------------------------------------------------
+    # PROCESS PER PACK
+    # ------------------------------------------------------------
+    # Results are collected in pack order (map keeps input order),
+    # so the merge below stays deterministic whatever the concurrency.
+    n_packs = len(packs)
 
-        print(f"[DEBUG] Extracting from chunk {i}/{len(docs)} page={page}")
+    def run(args):
+        i, pack = args
+        return _extract_pack(
+            i, n_packs, pack, system_prompt, company, year,
+            use_cache=use_cache, num_ctx=context_tokens,
+        )
 
-        try:
-            chunk_result = generate_json(
-                system_prompt=system_prompt,
-                user_prompt=user_prompt,
-                max_retries=3,
-                temperature=0.1,
-            )
-        except Exception as e:
-            print(f"[ERROR] JSON extraction failed for chunk {i}: {e}")
-            continue
+    jobs = list(enumerate(packs, start=1))
+    concurrency = max(1, min(concurrency, n_packs))
+    if concurrency == 1:
+        per_pack = [run(j) for j in jobs]
+    else:
+        print(f"[INFO] Extracting with concurrency={concurrency}")
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            per_pack = list(pool.map(run, jobs))
 
-        # Validate structure
-        chunk_facts = chunk_result.get("facts", [])
-        if not isinstance(chunk_facts, list):
-            chunk_facts = []
-
-        # Normalize & attach metadata
-        for f in chunk_facts:
-            f.setdefault("page", page)
-            f.setdefault("id", _fact_id(f.get("text", ""), page))
-            f.setdefault("file_name", file_name)
-            f.setdefault("section_path", section_path)
-            all_facts.append(f)
+    all_facts = [f for facts in per_pack for f in facts]
 
     # ------------------------------------------------------------
     # MERGE & DEDUPLICATE
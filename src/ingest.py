@@ -3,29 +3,664 @@
 """
 Improved ingestion pipeline:
 - Uses advanced utils_pdf.py (headings, tables, cleaned text)
-- Uses improved chunking (section-aware, semantic overlap)
+- Uses improved chunking (section-aware, semantic overlap, across page breaks)
 - Generates high-quality metadata for vectordb
+- Streaming pipeline: parse+chunk → embed → write stages joined by
+  bounded queues (back-pressure), so parsing, embedding and Chroma writes
+  overlap; PDFs can be parsed by a process pool, a single writer in the
+  main process talks to Chroma, in batches of INGEST_WRITE_BATCH
+- Incremental: a content-hash manifest skips unchanged PDFs, re-chunks
+  changed ones, drops removed ones and ignores byte-identical duplicates
+- Keeps the BM25 lexical index (lexical.py) in sync with the collection
+- Routes each PDF to its shard collection (shards.py, SHARD_BY)
+- Tags every chunk with quantity flags (numeric_tags.py) for pre-filtering
+- Collapses near-duplicate chunks onto one stored vector (neardup.py)
 """
 
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from multiprocessing import Manager
 from pathlib import Path
-from typing import List, Dict
+from typing import Iterator, List, Dict, Tuple
 from tqdm import tqdm
 
 from .utils_pdf import extract_pages
-from .chunking import chunk_page
-from .vectordb import get_client, get_collection, upsert_chunks
-from .config import CHUNK_SIZE, CHUNK_OVERLAP
+from .chunking import chunk_document, token_counter_name, CHUNKER_VERSION
+from .numeric_tags import tag_quantities, TAGS_VERSION
+from .vectordb import (
+    get_client, prepare_chunks, existing_chunks, write_chunks, update_metadata, delete_chunks,
+)
+from .manifest import IngestManifest, file_sha256
+from .lexical import LexicalIndex
+from .shards import ShardRouter, BASE_COLLECTION, shard_name
+from .neardup import NearDupIndex, DUP_KEYS, minhash
+from .embedder_ollama import opened_cache
+from .config import (
+    CHUNK_SIZE, CHUNK_OVERLAP, INGEST_WORKERS, PDF_TABLE_MODE,
+    INGEST_WRITE_BATCH, INGEST_QUEUE_SIZE, SHARD_BY, NEARDUP_THRESHOLD,
+)
 
 
-def ingest_reports(reports_dir: str, db_dir: str):
+# ---------------------------------------------------------
+# Stage 1: parse + chunk a single PDF (runs in a worker process)
+# ---------------------------------------------------------
+def _pages(pdf: Path, stats: Dict):
+    """Page records of `pdf`, counting them in stats["pages"]."""
+    for rec in extract_pages(pdf):
+        stats["pages"] += 1
+        if not rec.text.strip():
+            print(f"[WARN] Skipping empty page {rec.page} in {pdf.name}")
+            continue
+        yield rec
+
+
+def iter_chunks(
+    pdf_path: str,
+    chunk_size: int = CHUNK_SIZE,
+    overlap_tokens: int = CHUNK_OVERLAP,
+    stats: Dict | None = None,
+    source_path: str | None = None,
+) -> Iterator[Dict]:
+    """
+    CPU-bound part of ingestion: PyMuPDF parsing + document-level chunking
+    (chunks may span pages), streamed one page at a time.
+    Yields quantity-tagged chunks; the page count ends up in stats["pages"].
+    `source_path` is the manifest key (path relative to the reports
+    directory, default: the file name); it scopes chunk IDs to one file.
+    """
+    pdf = Path(pdf_path)
+    stats = stats if stats is not None else {}
+    stats["pages"] = 0
+
+    n_chunks = 0
+    for ch in chunk_document(_pages(pdf, stats), chunk_size, overlap_tokens):
+        # Quantity tags (flat metadata) so retrieval can skip narrative-only chunks
+        ch.update(tag_quantities(ch["text"]))
+        ch["source_path"] = source_path or pdf.name
+        n_chunks += 1
+        yield ch
+
+    if not n_chunks:
+        print(f"[WARN] No chunks produced for {pdf.name}")
+    print(f"[DEBUG] Extracted {stats['pages']} pages from {pdf.name}")
+
+
+def parse_to_queue(
+    pdf_path: str,
+    out_q,
+    chunk_size: int = CHUNK_SIZE,
+    overlap_tokens: int = CHUNK_OVERLAP,
+    message_size: int = 32,
+    source_path: str | None = None,
+):
+    """
+    Worker entry point (module level so a process pool can pickle it).
+    Streams ("chunks", path, [up to message_size chunks]) messages, then
+    ("done", path, page count) or ("error", path, message).
+    `out_q` is bounded: a worker blocks while downstream stages catch up.
+    """
+    stats: Dict = {}
+    buf: List[Dict] = []
+    try:
+        for ch in iter_chunks(pdf_path, chunk_size, overlap_tokens, stats, source_path):
+            buf.append(ch)
+            if len(buf) >= message_size:
+                out_q.put(("chunks", pdf_path, buf))
+                buf = []
+        if buf:
+            out_q.put(("chunks", pdf_path, buf))
+    except Exception as e:
+        out_q.put(("error", pdf_path, f"{type(e).__name__}: {e}"))
+        return
+    out_q.put(("done", pdf_path, stats["pages"]))
+
+
+class _Parsers:
+    """
+    Stage 1 for every PDF. workers <= 1 keeps everything in-process
+    (one thread, easier to debug); otherwise a process pool. A pool worker
+    that dies (OOM, segfault → BrokenProcessPool) never posts "done" /
+    "error" itself, so its future's callback posts the error instead.
+    """
+
+    def __init__(self, pdfs: List[Tuple[Path, str]], out_q, workers: int):
+        self._stop = threading.Event()
+        self._thread = None
+        self._pool = None
+        self._futures = []
+        self._settled = 0
+        self._lock = threading.Lock()
+
+        if workers <= 1:
+            def run():
+                for pdf, key in pdfs:
+                    if self._stop.is_set():
+                        break
+                    print(f"\n[INFO] Processing {pdf.name}")
+                    parse_to_queue(str(pdf), out_q, source_path=key)
+            self._thread = threading.Thread(target=run, name="ingest-parse", daemon=True)
+            self._thread.start()
+            return
+
+        self._pool = ProcessPoolExecutor(max_workers=workers)
+        for pdf, key in pdfs:
+            fut = self._pool.submit(parse_to_queue, str(pdf), out_q, source_path=key)
+            fut.add_done_callback(partial(self._settle, str(pdf), out_q))
+            self._futures.append(fut)
+
+    def _settle(self, path: str, out_q, fut):
+        try:
+            exc = None if fut.cancelled() else fut.exception()
+            if exc is not None:
+                out_q.put(("error", path, repr(exc)))
+        finally:
+            with self._lock:
+                self._settled += 1
+
+    def alive(self) -> bool:
+        """False once every parser has finished and posted its last message."""
+        if self._thread is not None:
+            return self._thread.is_alive()
+        with self._lock:
+            return self._settled < len(self._futures)
+
+    def cancel(self):
+        """Skip PDFs not started yet (after a writer failure)."""
+        self._stop.set()
+        for fut in self._futures:
+            fut.cancel()
+
+    def wait(self):
+        if self._thread is not None:
+            self._thread.join()
+        else:
+            self._pool.shutdown(wait=True)
+
+
+# ---------------------------------------------------------
+# Stage 2: embed (one thread; the backend parallelizes its HTTP calls)
+# ---------------------------------------------------------
+def _embed_stage(
+    backend,
+    target,
+    neardup: NearDupIndex,
+    parse_q,
+    write_q: "queue.Queue",
+    n_files: int,
+    batch_size: int,
+    abort: threading.Event,
+    parsers_alive=lambda: True,
+):
+    """
+    Group each PDF's chunks into batches of `batch_size`, look their
+    content IDs up in the PDF's collection (`target(path)`), embed only
+    the ones not stored yet and not near-duplicates of a stored chunk,
+    and hand ("write", path, batch) to the writer:
+        batch = {"ids": every ID of the batch,
+                 "new": (ids, docs, metas, embeddings),
+                 "changed": (ids, metas),   # same text, new metadata
+                 "aliases": [(id, canonical id, doc, meta)]}
+    ("done" | "error", path, ...) messages are forwarded after the PDF's
+    last batch. Always drains `parse_q` so parser processes never block,
+    and stops once the parsers are gone (`parsers_alive`) even if some
+    file was never reported.
+    """
+    pending: Dict[str, List[Dict]] = {}
+    seen: Dict[str, Dict[str, int]] = {}
+    finished = 0
+    failed = False
+
+    def put(msg):
+        # Bounded put that gives up once the writer has aborted
+        while not abort.is_set():
+            try:
+                write_q.put(msg, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def flush(path: str, n: int | None = None):
+        buf = pending.get(path, [])
+        chunks, pending[path] = buf[:n] if n else buf, buf[n:] if n else []
+        ids, docs, metas = prepare_chunks(chunks, seen=seen.setdefault(path, {}))
+        if not ids:
+            return
+        col = target(path)
+        stored = existing_chunks(col, ids)
+        new, changed, aliases = [], [], []
+        for k, cid in enumerate(ids):
+            if cid in stored:
+                # dup keys are the writer's business (see _refresh)
+                if {key: v for key, v in stored[cid].items() if key not in DUP_KEYS} != metas[k]:
+                    changed.append(k)
+                if neardup.enabled and not neardup.is_canonical(cid):
+                    neardup.add_canonical(col.name, cid, minhash(docs[k]))
+                continue
+            if neardup.enabled:
+                sig = minhash(docs[k])
+                canon = neardup.match(col.name, sig)
+                if canon and canon != cid:
+                    aliases.append((cid, canon, docs[k], metas[k]))
+                    continue
+                # registered now so later chunks of this run can match it
+                neardup.add_canonical(col.name, cid, sig)
+            new.append(k)
+        new_docs = [docs[k] for k in new]
+        put(("write", path, {
+            "ids": ids,
+            "new": ([ids[k] for k in new], new_docs, [metas[k] for k in new],
+                    backend.embed_documents(new_docs) if new else []),
+            "changed": ([ids[k] for k in changed], [metas[k] for k in changed]),
+            "aliases": aliases,
+        }))
+
+    def next_message():
+        while True:
+            try:
+                return parse_q.get(timeout=0.5)
+            except queue.Empty:
+                if not parsers_alive():
+                    try:
+                        return parse_q.get_nowait()   # posted just before they exited
+                    except queue.Empty:
+                        return None
+
+    while finished < n_files:
+        msg = next_message()
+        if msg is None:
+            if not failed and not abort.is_set():
+                put(("fatal", None, RuntimeError(
+                    f"PDF parsers exited after reporting {finished} of {n_files} files")))
+            break
+        kind, path, payload = msg
+        if kind != "chunks":
+            finished += 1
+        if failed or abort.is_set():
+            continue
+        try:
+            if kind == "chunks":
+                pending.setdefault(path, []).extend(payload)
+                while len(pending[path]) >= batch_size:
+                    flush(path, batch_size)
+            elif kind == "done":
+                flush(path)
+                pending.pop(path, None)
+                put((kind, path, payload))
+            else:
+                pending.pop(path, None)
+                put((kind, path, payload))
+        except Exception as e:
+            failed = True
+            put(("fatal", path, e))
+
+    put(None)
+
+
+def ingest_version(chunk_size: int = CHUNK_SIZE, overlap_tokens: int = CHUNK_OVERLAP) -> str:
+    """Chunker + chunking/parsing config fingerprint stored in the manifest."""
+    return (
+        f"chunker={CHUNKER_VERSION};size={chunk_size};overlap={overlap_tokens};"
+        f"tables={PDF_TABLE_MODE};tokens={token_counter_name()};shards={SHARD_BY};"
+        f"neardup={NEARDUP_THRESHOLD};tags={TAGS_VERSION}"
+    )
+
+
+def _plan(pdfs: List[Path], reports_path: Path, manifest: IngestManifest, version: str):
+    """
+    Compare the PDFs on disk with the manifest.
+
+    Returns:
+        to_parse   – [(key, pdf, sha, stat)] new or changed files
+        duplicates – [(key, pdf, sha, stat, canonical_key)] byte-identical copies
+        removed    – [manifest row] files no longer on disk
+        unchanged  – number of files skipped
+    """
+    known = {row["path"]: row for row in manifest.all()}
+    current = {}
+
+    for pdf in pdfs:
+        key = pdf.relative_to(reports_path).as_posix()
+        st = pdf.stat()
+        row = known.get(key)
+        # Fast path: same size + mtime → trust the recorded hash
+        if row and row["size"] == st.st_size and row["mtime"] == st.st_mtime:
+            sha = row["sha256"]
+        else:
+            sha = file_sha256(pdf)
+        current[key] = (pdf, sha, st)
+
+    # Canonical file per hash: keep an already-ingested one if still present
+    canonical: Dict[str, str] = {}
+    for key, row in known.items():
+        if key in current and not row["duplicate_of"] and current[key][1] == row["sha256"]:
+            canonical.setdefault(row["sha256"], key)
+    for key, (_, sha, _) in current.items():
+        canonical.setdefault(sha, key)
+
+    to_parse, duplicates, unchanged = [], [], 0
+    for key, (pdf, sha, st) in current.items():
+        row = known.get(key)
+        canon = canonical[sha]
+
+        if canon != key:
+            if row and row["duplicate_of"] == canon and row["sha256"] == sha:
+                unchanged += 1
+            else:
+                duplicates.append((key, pdf, sha, st, canon))
+            continue
+
+        if row and not row["duplicate_of"] and row["sha256"] == sha and row["version"] == version:
+            if row["mtime"] != st.st_mtime:
+                manifest.touch(key, st.st_mtime)
+            unchanged += 1
+            continue
+
+        to_parse.append((key, pdf, sha, st))
+
+    removed = [row for key, row in known.items() if key not in current]
+    return to_parse, duplicates, removed, unchanged
+
+
+def _refresh(col, lexical: LexicalIndex, neardup: NearDupIndex, ids: List[str]):
+    """Rewrite the dup keys of canonical chunks whose aliases changed."""
+    if not ids:
+        return
+    stored = existing_chunks(col, ids)
+    metas = [neardup.decorate(cid, m, clear=True) for cid, m in stored.items()]
+    update_metadata(col, list(stored), metas)
+    lexical.update_metadata(list(stored), metas)
+
+
+def _promote(router: ShardRouter, lexical: LexicalIndex, neardup: NearDupIndex, orphans: List[Tuple]) -> int:
+    """
+    Aliases whose canonical chunk is gone: re-attach each to another stored
+    near-duplicate, else embed and store it under its own ID.
+    Returns the number of vectors written.
+    """
+    by_col: Dict[str, List[Tuple]] = {}
+    for alias_id, name, text, meta in orphans:
+        by_col.setdefault(name, []).append((alias_id, text, meta))
+
+    written = 0
+    for name, rows in by_col.items():
+        col = router.collection(name)
+        keep, touched = [], set()
+        for alias_id, text, meta in rows:
+            sig = minhash(text)
+            canon = neardup.match(name, sig) if neardup.enabled else None
+            if canon:
+                neardup.add_alias(alias_id, canon, name, text, meta)
+                touched.add(canon)
+            else:
+                neardup.add_canonical(name, alias_id, sig)
+                keep.append((alias_id, text, meta))
+        if keep:
+            ids, docs, metas = (list(x) for x in zip(*keep))
+            write_chunks(col, ids, docs, metas, router.backend.embed_documents(docs))
+            lexical.add(ids, docs, metas)
+            print(f"[INFO] Stored {len(keep)} near-duplicate chunk(s) of {name} whose original was removed")
+            written += len(keep)
+        _refresh(col, lexical, neardup, sorted(touched))
+    return written
+
+
+def _forget(router: ShardRouter, lexical: LexicalIndex, neardup: NearDupIndex, col, ids: List[str]) -> int:
+    """Near-duplicate bookkeeping for chunk IDs that no longer exist."""
+    touched, orphans = neardup.remove(ids)
+    _refresh(col, lexical, neardup, touched)
+    return _promote(router, lexical, neardup, orphans)
+
+
+def _remove_ids(router: ShardRouter, lexical: LexicalIndex, neardup: NearDupIndex, col, ids: List[str]) -> int:
+    """Delete chunks (vectors, lexical postings, near-dup entries) of one collection."""
+    delete_chunks(col, ids=ids)
+    lexical.remove(ids)
+    return _forget(router, lexical, neardup, col, ids)
+
+
+def _unclaimed(col, file_name: str, claimed) -> List[str]:
+    """
+    Legacy lookup: IDs stored under `file_name` without a `source_path`
+    (chunks written before IDs were scoped to a file's relative path) that
+    no manifest row owns. Chunks that carry a `source_path` belong to that
+    path only: a same-named file in another folder may still be mid-ingest,
+    with no manifest row yet.
+    """
+    got = col.get(where={"file_name": {"$eq": file_name}}, include=["metadatas"])
+    return [
+        i for i, m in zip(got["ids"], got["metadatas"])
+        if not (m or {}).get("source_path") and i not in claimed
+    ]
+
+
+def _drop_previous(router: ShardRouter, lexical: LexicalIndex, neardup: NearDupIndex,
+                   row: Dict | None, key: str, file_name: str, claimed=frozenset()) -> int:
+    """
+    Delete the chunks a file produced last time: the IDs its manifest row
+    recorded, from the shard it recorded (or, for legacy DBs, the unclaimed
+    chunks with its file name in its shard and the base collection).
+    Returns vectors written for near-duplicates that lost their original.
+    """
+    if row is not None:
+        targets = [(router.collection(row["collection"]), row["chunk_ids"])]
+    else:
+        present = set(router.names())
+        names = dict.fromkeys([shard_name(file_name, router.shard_by), BASE_COLLECTION])
+        targets = []
+        for name in (n for n in names if n in present):
+            col = router.collection(name)
+            targets.append((col, _unclaimed(col, file_name, claimed) + neardup.alias_ids(key, name)))
+    written = 0
+    for col, ids in targets:
+        if ids:
+            written += _remove_ids(router, lexical, neardup, col, ids)
+    return written
+
+
+def _backfill_lexical(router: ShardRouter, lexical: LexicalIndex, page_size: int = 1000):
+    """
+    Index chunks that were stored before the lexical index existed, or
+    record the metadata of chunks indexed before it kept any (one pass).
+    """
+    empty = lexical.conn.execute("SELECT 1 FROM docs LIMIT 1").fetchone() is None
+    if not empty and not lexical.missing_metadata():
+        return
+    for collection in router.existing():
+        total = collection.count()
+        if total == 0:
+            continue
+        if empty:
+            print(f"[INFO] Building lexical index for {total} existing chunks of {collection.name}")
+        else:
+            print(f"[INFO] Recording filter metadata of {total} chunks of {collection.name} in the lexical index")
+        for offset in range(0, total, page_size):
+            if empty:
+                got = collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+                lexical.add(got["ids"], got["documents"], got["metadatas"])
+            else:
+                got = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+                lexical.update_metadata(got["ids"], got["metadatas"])
+
+
+# ---------------------------------------------------------
+# Stage 3: write (main process, the only Chroma writer)
+# ---------------------------------------------------------
+def _run_pipeline(
+    router: ShardRouter,
+    lexical: LexicalIndex,
+    neardup: NearDupIndex,
+    manifest: IngestManifest,
+    to_parse: List[Tuple],
+    version: str,
+    workers: int,
+    batch_size: int,
+    queue_size: int,
+) -> int:
+    """
+    Run parse → embed → write for the new/changed PDFs as a diff against
+    what the collection already holds: new content IDs are upserted,
+    unchanged ones kept, vanished ones deleted; near-duplicates of stored
+    chunks are recorded as aliases instead of vectors. Returns vectors written.
+    """
+    workers = max(1, min(workers, len(to_parse)))
+    pending = {str(pdf): (key, pdf, sha, st) for key, pdf, sha, st in to_parse}
+    state: Dict[str, Dict] = {}
+    total = 0
+
+    # open every target shard up front: both threads then only read the cache
+    targets = {path: router.for_file(pdf.name) for path, (_, pdf, _, _) in pending.items()}
+
+    # Files moving to another shard (SHARD_BY changed): drop the old shard's
+    # copy now, before the embed stage registers near-dup signatures for the
+    # same content IDs in the new shard (removal would take those along)
+    for path, (key, pdf, _, _) in pending.items():
+        row = manifest.get(key)
+        if row is not None and row["collection"] != targets[path].name:
+            total += _drop_previous(router, lexical, neardup, row, key, pdf.name)
+            manifest.record(
+                key, row["file_name"], row["sha256"], row["size"], row["mtime"], row["version"], [],
+                pages=row["pages"], collection=targets[path].name,
+            )
+
+    manager = Manager() if workers > 1 else None
+    parse_q = manager.Queue(maxsize=queue_size) if manager else queue.Queue(maxsize=queue_size)
+    write_q: "queue.Queue" = queue.Queue(maxsize=queue_size)
+    abort = threading.Event()
+
+    parsers = _Parsers([(pdf, key) for key, pdf, _, _ in to_parse], parse_q, workers)
+    embedder = threading.Thread(
+        target=_embed_stage,
+        args=(router.backend, targets.get, neardup, parse_q, write_q, len(to_parse), max(1, batch_size), abort,
+              parsers.alive),
+        name="ingest-embed",
+        daemon=True,
+    )
+    embedder.start()
+
+    def begin(path: str):
+        # First message of a PDF: the "before" side of the diff is what its
+        # manifest row recorded plus what its shard holds under its relative
+        # path (chunks of an interrupted run)
+        key, pdf, _, _ = pending[path]
+        row = manifest.get(key)
+        col = targets[path]
+        old = set()
+        if row is None:
+            claimed = {cid for r in manifest.all() for cid in r["chunk_ids"]}
+            old.update(_unclaimed(col, pdf.name, claimed))
+        else:
+            old.update(row["chunk_ids"])
+        old.update(col.get(where={"source_path": {"$eq": key}}, include=[])["ids"])
+        old.update(neardup.alias_ids(key, col.name))
+        state[path] = {"old": old, "ids": [], "added": [], "aliases": set()}
+
+    progress = tqdm(total=len(to_parse), desc=f"Ingesting PDFs (parse workers={workers})")
+    try:
+        while True:
+            try:
+                msg = write_q.get(timeout=0.5)
+            except queue.Empty:
+                if embedder.is_alive():
+                    continue
+                try:
+                    msg = write_q.get_nowait()
+                except queue.Empty:
+                    raise RuntimeError("Embed stage stopped without finishing the run")
+            if msg is None:
+                break
+            kind, path = msg[0], msg[1]
+            if kind == "fatal":
+                raise msg[2]
+            key, pdf, sha, st = pending[path]
+            if path not in state:
+                begin(path)
+            col, file_state = targets[path], state[path]
+
+            if kind == "write":
+                batch = msg[2]
+                ids, docs, metas, embeddings = batch["new"]
+                write_chunks(col, ids, docs, metas, embeddings)
+                changed_ids, changed_metas = batch["changed"]
+                changed_metas = [neardup.decorate(cid, m, clear=True) for cid, m in zip(changed_ids, changed_metas)]
+                update_metadata(col, changed_ids, changed_metas)
+                lexical.add(ids, docs, metas)
+                lexical.update_metadata(changed_ids, changed_metas)
+
+                # ex-aliases now stored as chunks; new aliases of stored chunks
+                touched, orphans = set(neardup.forget_aliases(ids)), []
+                for alias_id, canon, doc, meta in batch["aliases"]:
+                    if neardup.is_canonical(canon):
+                        neardup.add_alias(alias_id, canon, col.name, doc, meta)
+                        touched.add(canon)
+                    else:
+                        orphans.append((alias_id, col.name, doc, meta))
+                _refresh(col, lexical, neardup, sorted(touched))
+                total += len(ids) + _promote(router, lexical, neardup, orphans)
+
+                alias_ids = [a[0] for a in batch["aliases"]]
+                file_state["ids"].extend(batch["ids"])
+                file_state["added"].extend(i for i in ids + alias_ids if i not in file_state["old"])
+                file_state["aliases"].update(alias_ids)
+            elif kind == "done":
+                state.pop(path)
+                ids = file_state["ids"]
+                vanished = list(file_state["old"] - set(ids))
+                if vanished:
+                    total += _remove_ids(router, lexical, neardup, col, vanished)
+                aliases = file_state["aliases"]
+                n_new = len([i for i in file_state["added"] if i not in aliases])
+                collapsed = f", {len(aliases)} near-duplicate" if aliases else ""
+                print(
+                    f"[INFO] → {pdf.name}: {len(ids)} chunks "
+                    f"({n_new} new{collapsed}, {len(vanished)} removed)"
+                )
+                manifest.record(
+                    key, pdf.name, sha, st.st_size, st.st_mtime, version, ids,
+                    pages=msg[2], collection=col.name,
+                )
+                progress.update(1)
+            else:
+                print(f"[ERROR] Failed to parse {pdf.name}: {msg[2]}")
+                # roll back to the previous version of the file
+                state.pop(path)
+                added = file_state["added"]
+                if added:
+                    _remove_ids(router, lexical, neardup, col, added)
+                    total -= len([i for i in added if i not in file_state["aliases"]])
+                progress.update(1)
+    finally:
+        abort.set()
+        parsers.cancel()
+        embedder.join()
+        parsers.wait()
+        progress.close()
+        if manager:
+            manager.shutdown()
+    return total
+
+
+def ingest_reports(
+    reports_dir: str,
+    db_dir: str,
+    workers: int = INGEST_WORKERS,
+    write_batch: int = INGEST_WRITE_BATCH,
+    queue_size: int = INGEST_QUEUE_SIZE,
+):
     """
     Parse all PDFs, chunk them, and upsert into vector DB (Chroma).
 
     Now supports:
         - table-aware page extraction
         - heading-aware chunking
-        - stable chunk IDs (from vectordb)
+        - stable, content-derived chunk IDs (from vectordb): re-ingesting a
+          changed PDF only embeds/writes chunks whose content changed
         - deterministic re-ingestion
+        - parallel parsing (workers > 1) with a single Chroma writer
+        - streaming parse → embed → write stages with bounded queues
+          (`queue_size` messages each) and `write_batch` chunks per write
+        - incremental re-ingestion via the manifest (hash + chunker version)
     """
 
     reports_path = Path(reports_dir)
@@ -37,40 +672,58 @@ def ingest_reports(reports_dir: str, db_dir: str):
 
     print(f"[INFO] Found {len(pdfs)} PDF reports.")
     client = get_client(db_dir)
-    collection = get_collection(client)
-
-    total_chunks = 0
-
-    for pdf in tqdm(pdfs, desc="Parsing & chunking PDFs"):
-        print(f"\n[INFO] Processing {pdf.name}")
+    router = ShardRouter(client)
+    manifest = IngestManifest(db_dir)
+    lexical = LexicalIndex(db_dir)
+    neardup = NearDupIndex(db_dir)
+    _backfill_lexical(router, lexical)
+    version = ingest_version()
 
-        pages = extract_pages(pdf)
-        print(f"[DEBUG] Extracted {len(pages)} pages from {pdf.name}")
+    # Near-dup entries of chunks no manifest row knows (an interrupted run)
+    known = {cid for row in manifest.all() for cid in row["chunk_ids"]}
+    for name, ids in neardup.stale(known).items():
+        _forget(router, lexical, neardup, router.collection(name), ids)
 
-        pdf_chunks: List[Dict] = []
+    to_parse, duplicates, removed, unchanged = _plan(pdfs, reports_path, manifest, version)
+    print(
+        f"[INFO] Manifest: {len(to_parse)} new/changed, {unchanged} unchanged, "
+        f"{len(duplicates)} duplicate, {len(removed)} removed."
+    )
 
-        for rec in pages:
-            if not rec["text"].strip():
-                print(f"[WARN] Skipping empty page {rec['page']} in {pdf.name}")
-                continue
-
-            page_chunks = chunk_page(
-                record=rec,
-                chunk_size=CHUNK_SIZE,
-                overlap_tokens=CHUNK_OVERLAP
-            )
-
-            if not page_chunks:
-                print(f"[WARN] No chunks produced for page {rec['page']} in {pdf.name}")
+    total_chunks = 0
 
-            pdf_chunks.extend(page_chunks)
+    # Removed files → drop their chunks
+    for row in removed:
+        print(f"[INFO] Removing chunks of deleted file {row['path']}")
+        total_chunks += _drop_previous(router, lexical, neardup, row, row["path"], row["file_name"])
+        manifest.remove(row["path"])
 
-        print(f"[INFO] → {len(pdf_chunks)} chunks produced for {pdf.name}")
+    # Byte-identical copies → no chunks of their own
+    for key, pdf, sha, st, canon in duplicates:
+        print(f"[INFO] {pdf.name} is identical to {canon} — skipping")
+        total_chunks += _drop_previous(router, lexical, neardup, manifest.get(key), key, pdf.name, claimed=known)
+        manifest.record(key, pdf.name, sha, st.st_size, st.st_mtime, version, [], duplicate_of=canon)
 
-        # Upsert into Chroma using OLLAMA embeddings (vectordb handles embed)
-        upsert_chunks(collection, pdf_chunks)
+    if to_parse:
+        total_chunks += _run_pipeline(
+            router, lexical, neardup, manifest, to_parse, version,
+            workers=workers, batch_size=write_batch, queue_size=queue_size,
+        )
 
-        total_chunks += len(pdf_chunks)
+    # Shards left without files (e.g. after changing SHARD_BY) are dropped
+    registry = set(manifest.collections())
+    for col in router.existing():
+        if col.name not in registry and col.count() == 0:
+            print(f"[INFO] Dropping empty shard {col.name}")
+            client.delete_collection(col.name)
 
+    manifest.close()
+    lexical.close()
+    neardup.close()
     print(f"\n[INFO] Ingestion complete.")
-    print(f"[INFO] Total chunks stored: {total_chunks}")
+    print(f"[INFO] Total chunks embedded & written this run: {total_chunks}")
+
+    # only when an Ollama backend opened it (EMBEDDING_BACKEND=chroma never does)
+    cache = opened_cache()
+    if cache is not None:
+        print(f"[INFO] Embedding cache: {cache.stats()}")
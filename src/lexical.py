@@ -0,0 +1,271 @@
+# src/lexical.py
+
+"""
+On-disk BM25 inverted index (SQLite file next to the Chroma directory).
+
+- tokenizer keeps ESG tokens intact: "tco2e", "2030", "e1-4", "co2-eq"
+- postings are (term, doc, tf) rows in a clustered WITHOUT ROWID table
+- incremental: chunks are added / removed by chunk ID during ingest
+- search returns (chunk_id, bm25 score) for fusion with vector hits,
+  optionally restricted by a Chroma-style `where` on the filterable
+  metadata kept next to each doc (file_name, source_path, has_quant,
+  source_files), applied inside the BM25 SQL, or to a set of chunk IDs
+"""
+
+import math
+import re
+import sqlite3
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Collection, Dict, List, Optional, Tuple
+
+INDEX_NAME = "lexical_index.sqlite"
+
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-.][a-z0-9]+)*")
+
+# Metadata columns of `docs` that `where` filters can use
+FILTER_COLUMNS = ("file_name", "source_path", "has_quant")
+# List-valued metadata (near-dup canonical chunks), one row per value
+LIST_FIELDS = ("source_files",)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased alphanumeric tokens; inner '-' / '.' are kept ("e1-4", "2.5")."""
+    return TOKEN_RE.findall(text.lower())
+
+
+class LexicalIndex:
+    """BM25 index keyed by Chroma chunk IDs."""
+
+    def __init__(self, db_dir: str, k1: float = 1.2, b: float = 0.75):
+        Path(db_dir).mkdir(parents=True, exist_ok=True)
+        self.path = Path(db_dir) / INDEX_NAME
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS docs (
+                doc      INTEGER PRIMARY KEY,
+                chunk_id TEXT UNIQUE NOT NULL,
+                length   INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                doc  INTEGER NOT NULL,
+                tf   INTEGER NOT NULL,
+                PRIMARY KEY (term, doc)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS postings_doc ON postings(doc);
+            CREATE TABLE IF NOT EXISTS doc_files (
+                file_name TEXT NOT NULL,
+                doc       INTEGER NOT NULL,
+                PRIMARY KEY (file_name, doc)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS doc_files_doc ON doc_files(doc);
+            """
+        )
+        # Filter columns added after the first index version (migrated in place;
+        # NULL file_name marks a doc whose metadata was never recorded)
+        have = {r[1] for r in self.conn.execute("PRAGMA table_info(docs)")}
+        for col in FILTER_COLUMNS:
+            if col not in have:
+                self.conn.execute(f"ALTER TABLE docs ADD COLUMN {col} {'INTEGER' if col == 'has_quant' else 'TEXT'}")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS docs_file ON docs(file_name)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS docs_source ON docs(source_path)")
+        self.conn.commit()
+
+    @staticmethod
+    def exists(db_dir: str) -> bool:
+        return (Path(db_dir) / INDEX_NAME).exists()
+
+    # -----------------------------------------
+    # Incremental updates
+    # -----------------------------------------
+    def add(self, chunk_ids: List[str], texts: List[str], metas: Optional[List[Dict]] = None):
+        """Index (or re-index) chunks, with their filterable metadata."""
+        metas = metas or [{}] * len(chunk_ids)
+        with self._lock:
+            self._remove(chunk_ids)
+            for cid, text, meta in zip(chunk_ids, texts, metas):
+                tf = Counter(tokenize(text))
+                cur = self.conn.execute(
+                    "INSERT INTO docs (chunk_id, length) VALUES (?, ?)",
+                    (cid, sum(tf.values())),
+                )
+                doc = cur.lastrowid
+                self.conn.executemany(
+                    "INSERT INTO postings (term, doc, tf) VALUES (?, ?, ?)",
+                    [(term, doc, n) for term, n in tf.items()],
+                )
+                self._set_meta(doc, meta)
+            self.conn.commit()
+
+    def update_metadata(self, chunk_ids: List[str], metas: List[Dict]):
+        """
+        Record new metadata of indexed chunks. Like Chroma, keys absent
+        from a dict are kept and keys set to None are cleared.
+        """
+        with self._lock:
+            for cid, meta in zip(chunk_ids, metas):
+                row = self.conn.execute("SELECT doc FROM docs WHERE chunk_id = ?", (cid,)).fetchone()
+                if row:
+                    self._set_meta(row[0], meta)
+            self.conn.commit()
+
+    def _set_meta(self, doc: int, meta: Dict):
+        cols = [c for c in FILTER_COLUMNS if c in meta]
+        if cols:
+            self.conn.execute(
+                f"UPDATE docs SET {', '.join(f'{c} = ?' for c in cols)} WHERE doc = ?",
+                [meta[c] for c in cols] + [doc],
+            )
+        for field in LIST_FIELDS:
+            if field in meta:
+                self.conn.execute("DELETE FROM doc_files WHERE doc = ?", (doc,))
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO doc_files (file_name, doc) VALUES (?, ?)",
+                    [(v, doc) for v in meta[field] or []],
+                )
+
+    def missing_metadata(self) -> bool:
+        """True if some indexed chunk has no recorded metadata (index predates the filter columns)."""
+        with self._lock:
+            return self.conn.execute("SELECT 1 FROM docs WHERE file_name IS NULL LIMIT 1").fetchone() is not None
+
+    def remove(self, chunk_ids: List[str]):
+        with self._lock:
+            self._remove(chunk_ids)
+            self.conn.commit()
+
+    def _remove(self, chunk_ids: List[str]):
+        for i in range(0, len(chunk_ids), 500):
+            part = chunk_ids[i:i + 500]
+            marks = ",".join("?" * len(part))
+            docs = [r[0] for r in self.conn.execute(
+                f"SELECT doc FROM docs WHERE chunk_id IN ({marks})", part
+            )]
+            if not docs:
+                continue
+            dmarks = ",".join("?" * len(docs))
+            self.conn.execute(f"DELETE FROM postings WHERE doc IN ({dmarks})", docs)
+            self.conn.execute(f"DELETE FROM doc_files WHERE doc IN ({dmarks})", docs)
+            self.conn.execute(f"DELETE FROM docs WHERE doc IN ({dmarks})", docs)
+
+    # -----------------------------------------
+    # Search
+    # -----------------------------------------
+    def supports(self, where: Optional[dict]) -> bool:
+        """Can search() apply `where` itself (known fields, every doc's metadata recorded)?"""
+        return where is None or (_where_sql(where) is not None and not self.missing_metadata())
+
+    def search(
+        self,
+        q: str,
+        k: int = 40,
+        allowed: Optional[Collection[str]] = None,
+        where: Optional[dict] = None,
+    ) -> List[Tuple[str, float]]:
+        """
+        Top-k (chunk_id, BM25 score) for a free-text query. `where` (a
+        Chroma filter on FILTER_COLUMNS / LIST_FIELDS, see supports) and
+        `allowed` (chunk IDs) restrict the ranking; collection statistics
+        still cover the whole index.
+        """
+        terms = list(dict.fromkeys(tokenize(q)))
+        if not terms or (allowed is not None and not allowed):
+            return []
+        cond, params = "1", []
+        if where is not None:
+            clause = _where_sql(where)
+            if clause is None:
+                raise ValueError(f"Filter not supported by the lexical index: {where}")
+            cond, params = clause
+
+        with self._lock:
+            n_docs, total_len = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs"
+            ).fetchone()
+            if n_docs == 0:
+                return []
+            avg_len = total_len / n_docs
+            keep = None if allowed is None else self._docs(list(allowed))
+
+            scores: Dict[int, float] = {}
+            for term in terms:
+                (df,) = self.conn.execute("SELECT COUNT(*) FROM postings WHERE term = ?", (term,)).fetchone()
+                if not df:
+                    continue
+                rows = self.conn.execute(
+                    "SELECT p.doc, p.tf, d.length FROM postings p JOIN docs d ON d.doc = p.doc "
+                    f"WHERE p.term = ? AND ({cond})",
+                    [term, *params],
+                ).fetchall()
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                for doc, tf, length in rows:
+                    if keep is not None and doc not in keep:
+                        continue
+                    norm = tf + self.k1 * (1 - self.b + self.b * length / avg_len)
+                    scores[doc] = scores.get(doc, 0.0) + idf * tf * (self.k1 + 1) / norm
+
+            top = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:k]
+            if not top:
+                return []
+            marks = ",".join("?" * len(top))
+            names = dict(self.conn.execute(
+                f"SELECT doc, chunk_id FROM docs WHERE doc IN ({marks})", [d for d, _ in top]
+            ).fetchall())
+        return [(names[d], s) for d, s in top]
+
+    def _docs(self, chunk_ids: List[str]) -> set:
+        """Internal doc numbers of the indexed chunk IDs."""
+        docs = set()
+        for i in range(0, len(chunk_ids), 500):
+            part = chunk_ids[i:i + 500]
+            marks = ",".join("?" * len(part))
+            docs.update(r[0] for r in self.conn.execute(
+                f"SELECT doc FROM docs WHERE chunk_id IN ({marks})", part
+            ))
+        return docs
+
+    def close(self):
+        self.conn.close()
+
+
+def _where_sql(where: dict) -> Optional[Tuple[str, list]]:
+    """
+    SQL condition on `docs d` for a Chroma `where` filter, or None if it
+    uses fields or operators the index does not keep ($eq / $in on
+    FILTER_COLUMNS, $contains on LIST_FIELDS, $and / $or).
+    """
+    if not isinstance(where, dict) or not where:
+        return None
+    parts: List[str] = []
+    params: list = []
+    for key, value in where.items():
+        if key in ("$and", "$or"):
+            if not isinstance(value, list) or not value:
+                return None
+            subs = [_where_sql(c) for c in value]
+            if any(sub is None for sub in subs):
+                return None
+            parts.append("(" + f" {key[1:].upper()} ".join(sql for sql, _ in subs) + ")")
+            params.extend(p for _, ps in subs for p in ps)
+            continue
+        op, operand = next(iter(value.items())) if isinstance(value, dict) and len(value) == 1 else ("$eq", value)
+        if isinstance(operand, dict):
+            return None
+        if key in FILTER_COLUMNS and op == "$eq":
+            parts.append(f"d.{key} = ?")
+            params.append(operand)
+        elif key in FILTER_COLUMNS and op == "$in" and isinstance(operand, list) and operand:
+            parts.append(f"d.{key} IN ({','.join('?' * len(operand))})")
+            params.extend(operand)
+        elif key in LIST_FIELDS and op == "$contains":
+            parts.append("EXISTS (SELECT 1 FROM doc_files f WHERE f.file_name = ? AND f.doc = d.doc)")
+            params.append(operand)
+        else:
+            return None
+    return " AND ".join(parts), params
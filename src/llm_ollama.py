@@ -7,36 +7,179 @@ Robust Ollama LLM client with:
 - configurable temperature/max_tokens
 - support for system + user prompts
 - stable for fact extraction pipelines
+- persistent response cache keyed by (model, system, prompt, temperature)
+- streaming generation that stops once the JSON object is complete
+- optional JSON-schema constrained output (Ollama `format`)
 """
 
+import hashlib
 import json
+import re
+import sqlite3
+import threading
 import requests
 import time
-from typing import Dict, Any, Optional, List
-from .config import OLLAMA_HOST, LLM_MODEL
+from pathlib import Path
+from typing import Dict, Any, Optional, List, Callable
+from .config import (
+    OLLAMA_HOST,
+    LLM_MODEL,
+    LLM_CACHE_PATH,
+    LLM_CACHE_TTL,
+    LLM_CACHE_MAX_MB,
+    LLM_STREAM,
+)
+
+
+# -----------------------------------------------------
+# Response cache
+# -----------------------------------------------------
+class ResponseCache:
+    """
+    Content-addressed SQLite cache of LLM outputs.
+    - key: sha256 of (kind, model, system, prompt, temperature, max_tokens)
+    - entries older than `ttl` seconds are ignored and purged (0 = never expire)
+    - total payload is kept under `max_bytes` by evicting least recently used rows
+    """
+
+    def __init__(self, path: str, ttl: float = LLM_CACHE_TTL, max_bytes: int = LLM_CACHE_MAX_MB << 20):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key       TEXT PRIMARY KEY,
+                value     TEXT NOT NULL,
+                size      INTEGER NOT NULL,
+                created   REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses(last_used)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(kind: str, model: str, system: str, prompt: str, temperature: float, **extra) -> str:
+        raw = json.dumps(
+            [kind, model, system, prompt, float(temperature), sorted(extra.items())],
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row and self.ttl and now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, value: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value.encode("utf-8")), now, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float):
+        if self.ttl:
+            self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+        (total,) = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if total <= self.max_bytes:
+            return
+        freed = 0
+        stale = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_used"):
+            stale.append((key,))
+            freed += size
+            if total - freed <= self.max_bytes:
+                break
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> Optional[ResponseCache]:
+    """Process-wide response cache; None when LLM_CACHE_PATH is empty."""
+    global _cache
+    with _cache_lock:
+        if _cache is None and LLM_CACHE_PATH:
+            _cache = ResponseCache(LLM_CACHE_PATH)
+        return _cache
 
 
 # -----------------------------------------------------
 # Low-level API call
 # -----------------------------------------------------
+def _payload(
+    system: str,
+    prompt: str,
+    temperature: float,
+    max_tokens: int,
+    stream: bool,
+    fmt: Optional[Dict] = None,
+    num_ctx: Optional[int] = None,
+    model: Optional[str] = None,
+) -> Dict:
+    payload = {
+        "model": model or LLM_MODEL,
+        "system": system,
+        "prompt": prompt,
+        "options": {
+            "temperature": temperature,
+            "num_predict": max_tokens,
+        },
+        "stream": stream,
+    }
+    if fmt is not None:
+        # JSON schema → Ollama constrains decoding to it
+        payload["format"] = fmt
+    if num_ctx:
+        # Ollama's default window is small; packed prompts need the full one
+        payload["options"]["num_ctx"] = num_ctx
+    return payload
+
+
 def _ollama_generate(
     system: str,
     prompt: str,
     temperature: float = 0.1,
     max_tokens: int = 2048,
+    fmt: Optional[Dict] = None,
+    num_ctx: Optional[int] = None,
+    model: Optional[str] = None,
 ) -> str:
     """
-    Raw call to Ollama generate API with system + user messages.
+    Raw call to Ollama generate API with system + user messages
+    (`model` overrides LLM_MODEL, e.g. for a small scoring model).
     """
     url = f"{OLLAMA_HOST}/api/generate"
-    payload = {
-        "model": LLM_MODEL,
-        "system": system,
-        "prompt": prompt,
-        "temperature": temperature,
-        "num_predict": max_tokens,
-        "stream": False,
-    }
+    payload = _payload(system, prompt, temperature, max_tokens, stream=False, fmt=fmt, num_ctx=num_ctx, model=model)
 
     resp = requests.post(url, json=payload, timeout=180)
 
@@ -47,6 +190,121 @@ def _ollama_generate(
     return data.get("response", "")
 
 
+# -----------------------------------------------------
+# Streaming API call with early JSON termination
+# -----------------------------------------------------
+class _JsonObjectScanner:
+    """
+    Incremental scanner over streamed text. Tracks string/escape state and
+    brace depth, and reports where the first top-level JSON object closes.
+    Anything before the first '{' (e.g. a ```json fence) is skipped.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.started = False
+        self.consumed = 0
+
+    def feed(self, chunk: str) -> int:
+        """Returns the absolute end offset of the object once closed, else -1."""
+        for i, ch in enumerate(chunk):
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                continue
+
+            if ch == '"' and self.started:
+                self.in_string = True
+            elif ch == "{":
+                self.started = True
+                self.depth += 1
+            elif ch == "}" and self.started:
+                self.depth -= 1
+                if self.depth == 0:
+                    return self.consumed + i + 1
+        self.consumed += len(chunk)
+        return -1
+
+
+def _ollama_generate_stream(
+    system: str,
+    prompt: str,
+    temperature: float = 0.1,
+    max_tokens: int = 2048,
+    stop_on_json: bool = True,
+    fmt: Optional[Dict] = None,
+    num_ctx: Optional[int] = None,
+) -> str:
+    """
+    Streaming call to Ollama generate API (NDJSON token stream).
+
+    With stop_on_json, the connection is closed as soon as the first
+    top-level JSON object is complete — Ollama stops decoding when the
+    client goes away, so trailing chatter is never generated.
+    Logs time-to-first-token and tokens/sec.
+    """
+    url = f"{OLLAMA_HOST}/api/generate"
+    payload = _payload(system, prompt, temperature, max_tokens, stream=True, fmt=fmt, num_ctx=num_ctx)
+
+    t0 = time.perf_counter()
+    t_first = None
+    n_tokens = 0
+    parts: List[str] = []
+    scanner = _JsonObjectScanner() if stop_on_json else None
+    stopped_early = False
+    final: Dict[str, Any] = {}
+
+    with requests.post(url, json=payload, timeout=180, stream=True) as resp:
+        if not resp.ok:
+            raise RuntimeError(f"Ollama error {resp.status_code}: {resp.text[:200]}")
+
+        for line in resp.iter_lines():
+            if not line:
+                continue
+            msg = json.loads(line)
+            if msg.get("error"):
+                raise RuntimeError(f"Ollama error: {msg['error'][:200]}")
+
+            token = msg.get("response", "")
+            if token:
+                if t_first is None:
+                    t_first = time.perf_counter()
+                n_tokens += 1
+
+                if scanner is not None:
+                    end = scanner.feed(token)
+                    if end != -1:
+                        parts.append(token[:end - scanner.consumed])
+                        stopped_early = not msg.get("done", False)
+                        break
+                parts.append(token)
+
+            if msg.get("done"):
+                final = msg
+                break
+
+    elapsed = time.perf_counter() - t0
+    ttft = (t_first - t0) if t_first else elapsed
+    if final.get("eval_count") and final.get("eval_duration"):
+        n_tokens = final["eval_count"]
+        tps = n_tokens / (final["eval_duration"] / 1e9)
+    else:
+        decode = elapsed - ttft
+        tps = n_tokens / decode if decode > 0 else 0.0
+
+    print(
+        f"[DEBUG] LLM stream: ttft={ttft:.2f}s, {tps:.1f} tok/s, {n_tokens} tokens"
+        + (" (stopped at end of JSON)" if stopped_early else "")
+    )
+    return "".join(parts)
+
+
 # -----------------------------------------------------
 # JSON fixing logic
 # -----------------------------------------------------
@@ -74,17 +332,46 @@ def _extract_json_from_text(text: str) -> Optional[Dict]:
     return None
 
 
+def _escape_controls_in_strings(text: str) -> str:
+    """
+    Raw newlines/tabs are invalid inside JSON strings. Escape them there
+    (keeping verbatim quotes intact) and leave whitespace between tokens alone.
+    """
+    out = []
+    in_string = False
+    escape = False
+    for ch in text:
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            elif ch == "\n":
+                ch = "\\n"
+            elif ch == "\t":
+                ch = "\\t"
+            elif ch == "\r":
+                ch = "\\r"
+        elif ch == '"':
+            in_string = True
+        out.append(ch)
+    return "".join(out)
+
+
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+
+
 def _repair_json(output: str) -> Optional[Dict]:
     """
     Attempts to clean common JSON issues.
     """
-    repaired = output
-    repaired = repaired.replace("\n", " ")
-    repaired = repaired.replace("\t", " ")
-    repaired = repaired.replace("```json", "").replace("```", "")
+    repaired = output.replace("```json", "").replace("```", "")
+    repaired = _escape_controls_in_strings(repaired)
 
     # Remove trailing commas
-    repaired = repaired.replace(", }", " }").replace(",]", "]")
+    repaired = _TRAILING_COMMA_RE.sub(r"\1", repaired)
 
     return _extract_json_from_text(repaired)
 
@@ -97,41 +384,73 @@ def generate_json(
     user_prompt: str,
     max_retries: int = 4,
     temperature: float = 0.1,
+    use_cache: bool = True,
+    stream: bool = LLM_STREAM,
+    schema: Optional[Dict] = None,
+    validate: Optional[Callable[[Dict], None]] = None,
+    num_ctx: Optional[int] = None,
+    max_tokens: int = 4096,
 ) -> Dict[str, Any]:
     """
     Sends prompt → ensures valid JSON → repairs automatically → retries if needed.
     Used by extract_facts.py and recursive verification.
+    Parsed results are served from / stored in the response cache.
+    With `stream`, generation is cut off when the JSON object closes.
+    With `schema`, Ollama constrains the output to that JSON schema.
+    `validate` may raise ValueError for a real schema violation; only then
+    (or on unparsable output) is the model asked again, without back-off.
+    Only transport errors back off.
     """
+    cache = get_cache() if use_cache else None
+    key = None
+    if cache is not None:
+        extra = {"schema": json.dumps(schema, sort_keys=True)} if schema is not None else {}
+        if num_ctx:
+            extra["num_ctx"] = num_ctx
+        if max_tokens != 4096:
+            extra["max_tokens"] = max_tokens
+        key = ResponseCache.make_key("json", LLM_MODEL, system_prompt, user_prompt, temperature, **extra)
+        hit = cache.get(key)
+        if hit is not None:
+            return json.loads(hit)
+
     last_err = None
 
     for attempt in range(1, max_retries + 1):
 
         try:
-            raw = _ollama_generate(
+            generate = _ollama_generate_stream if stream else _ollama_generate
+            raw = generate(
                 system=system_prompt,
                 prompt=user_prompt,
                 temperature=temperature,
-                max_tokens=4096,
+                max_tokens=max_tokens,
+                fmt=schema,
+                num_ctx=num_ctx,
             )
 
-            # Try direct JSON parse
-            parsed = _extract_json_from_text(raw)
+            # Try direct JSON parse, then repair
+            parsed = _extract_json_from_text(raw) or _repair_json(raw)
+            if parsed and validate is not None:
+                try:
+                    validate(parsed)
+                except ValueError as e:
+                    last_err = e
+                    print(f"[WARN] Schema violation on attempt {attempt}: {str(e)[:200]}")
+                    continue
             if parsed:
+                if cache is not None:
+                    cache.put(key, json.dumps(parsed, ensure_ascii=False))
                 return parsed
 
-            # Try repair
-            repaired = _repair_json(raw)
-            if repaired:
-                return repaired
-
             last_err = ValueError("Model returned invalid JSON.")
             print(f"[WARN] Invalid JSON on attempt {attempt}: {raw[:200]}")
 
         except Exception as e:
             last_err = e
             print(f"[ERROR] Ollama failure on attempt {attempt}: {str(e)[:200]}")
-
-        time.sleep(1.2 * attempt)  # exponential backoff
+            if attempt < max_retries:
+                time.sleep(1.2 * attempt)  # back off only when the server failed
 
     # If all fails, raise error (extraction pipeline will handle)
     raise last_err or RuntimeError("Unknown LLM JSON error")
@@ -145,11 +464,25 @@ def generate_text(
     user_prompt: str,
     temperature: float = 0.2,
     max_tokens: int = 1024,
+    use_cache: bool = True,
 ) -> str:
     """Plain text mode."""
-    return _ollama_generate(
+    cache = get_cache() if use_cache else None
+    key = None
+    if cache is not None:
+        key = ResponseCache.make_key(
+            "text", LLM_MODEL, system_prompt, user_prompt, temperature, max_tokens=max_tokens
+        )
+        hit = cache.get(key)
+        if hit is not None:
+            return hit
+
+    text = _ollama_generate(
         system=system_prompt,
         prompt=user_prompt,
         temperature=temperature,
         max_tokens=max_tokens,
-    )
\ No newline at end of file
+    )
+    if cache is not None:
+        cache.put(key, text)
+    return text
\ No newline at end of file
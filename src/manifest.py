@@ -0,0 +1,256 @@
+# src/manifest.py
+
+"""
+Ingestion manifest (SQLite file next to the Chroma directory).
+
+Tracks, per PDF:
+- content hash (sha256), size and mtime
+- chunker/config version used to produce its chunks
+- the chunk IDs written to the vector DB
+- byte-identical duplicates (pointing at the canonical file)
+- catalog fields: page count, chunk count, company and report year
+  (inferred from the file name), indexed for extract-time file selection
+- the collection (shard) holding each file's chunks: the shard registry
+
+Lets ingest skip unchanged files, re-chunk only changed ones and
+delete the chunks of files that disappeared.
+"""
+
+import hashlib
+import json
+import re
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+MANIFEST_NAME = "ingest_manifest.sqlite"
+
+# File-name prefixes (one or more leading words) that are another name
+# for the same company; matched on their alphanumerics, longest first
+COMPANY_ALIASES = {
+    "apmm": "maersk",
+    "apm": "maersk",
+    "apm-maersk": "maersk",
+    "ap-moller-maersk": "maersk",
+}
+# Leading words tried against COMPANY_ALIASES
+ALIAS_MAX_WORDS = 3
+
+# Catalog columns added after the first manifest version (migrated in place)
+CATALOG_COLUMNS = {
+    "pages": "INTEGER",
+    "n_chunks": "INTEGER",
+    "company": "TEXT",
+    "company_key": "TEXT",
+    "report_year": "INTEGER",
+    "collection": "TEXT",
+}
+
+# Collection of rows written before sharding existed
+DEFAULT_COLLECTION = "reports"
+
+
+def file_sha256(path: Path, block_size: int = 1 << 20) -> str:
+    """Streamed sha256 of a file (does not load the whole PDF in memory)."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def infer_company_year(file_name: str):
+    """
+    (company, report year) from a report file name, e.g.
+    "maersk-crp-2025-1.pdf" → ("maersk", 2025),
+    "apmm-esg-data-table_2020.pdf" → ("maersk", 2020),
+    "APM-Maersk_SIZ-2023-Report-Card.pdf" → ("maersk", 2023).
+    """
+    stem = Path(file_name).stem.lower()
+    words = re.findall(r"[a-z]+", stem)
+    company = words[0] if words else None
+    for n in range(min(ALIAS_MAX_WORDS, len(words)), 0, -1):
+        prefix = "".join(words[:n])
+        if prefix in _ALIAS_KEYS:
+            company = _ALIAS_KEYS[prefix]
+            break
+    years = re.findall(r"(?<!\d)(?:19|20)\d{2}(?!\d)", stem)
+    return company, int(years[-1]) if years else None
+
+
+def normalize_company(name: str) -> str:
+    """Lowercase alphanumerics only ("A.P. Moller - Maersk" → "apmollermaersk")."""
+    return re.sub(r"[^a-z0-9]", "", (name or "").lower())
+
+
+_ALIAS_KEYS = {normalize_company(k): v for k, v in COMPANY_ALIASES.items()}
+
+
+def canonical_company(name: str) -> str:
+    """Normalized name with aliases resolved ("A.P. Moller - Maersk" → "maersk")."""
+    key = normalize_company(name)
+    return _ALIAS_KEYS.get(key, key)
+
+
+class IngestManifest:
+    """
+    Thin wrapper around a single SQLite table keyed by the PDF path
+    (relative to the reports directory).
+    """
+
+    def __init__(self, db_dir: str):
+        Path(db_dir).mkdir(parents=True, exist_ok=True)
+        self.path = Path(db_dir) / MANIFEST_NAME
+        self.conn = sqlite3.connect(self.path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS files (
+                path         TEXT PRIMARY KEY,
+                file_name    TEXT NOT NULL,
+                sha256       TEXT NOT NULL,
+                size         INTEGER NOT NULL,
+                mtime        REAL NOT NULL,
+                version      TEXT NOT NULL,
+                chunk_ids    TEXT NOT NULL DEFAULT '[]',
+                duplicate_of TEXT,
+                ingested_at  REAL NOT NULL
+            )
+            """
+        )
+        self._migrate()
+        self.conn.execute("CREATE INDEX IF NOT EXISTS files_sha ON files(sha256)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS files_name ON files(file_name)")
+        self.conn.execute("DROP INDEX IF EXISTS files_company_year")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS files_company_key_year ON files(company_key, report_year)")
+        self.conn.commit()
+
+    def _migrate(self):
+        """
+        Add catalog columns to manifests written before they existed, and
+        re-infer company / year where COMPANY_ALIASES changed the answer
+        (company_key: canonical_company(company), the indexed lookup key).
+        """
+        have = {r["name"] for r in self.conn.execute("PRAGMA table_info(files)")}
+        for col, kind in CATALOG_COLUMNS.items():
+            if col not in have:
+                self.conn.execute(f"ALTER TABLE files ADD COLUMN {col} {kind}")
+        for row in self.conn.execute(
+            "SELECT path, file_name, chunk_ids, company, company_key, report_year FROM files"
+        ).fetchall():
+            company, year = infer_company_year(row["file_name"])
+            key = canonical_company(company) if company else None
+            if row["company"] is None:
+                self.conn.execute(
+                    "UPDATE files SET company = ?, company_key = ?, report_year = ?, n_chunks = ? WHERE path = ?",
+                    (company, key, year, len(json.loads(row["chunk_ids"] or "[]")), row["path"]),
+                )
+            elif (row["company"], row["company_key"], row["report_year"]) != (company, key, year):
+                self.conn.execute(
+                    "UPDATE files SET company = ?, company_key = ?, report_year = ? WHERE path = ?",
+                    (company, key, year, row["path"]),
+                )
+
+    # -----------------------------------------
+    # Reads
+    # -----------------------------------------
+    def get(self, path: str) -> Optional[Dict]:
+        row = self.conn.execute("SELECT * FROM files WHERE path = ?", (path,)).fetchone()
+        return self._row(row) if row else None
+
+    def all(self) -> List[Dict]:
+        rows = self.conn.execute("SELECT * FROM files ORDER BY path").fetchall()
+        return [self._row(r) for r in rows]
+
+    # -----------------------------------------
+    # Catalog lookups (indexed, no scan of the vector DB)
+    # -----------------------------------------
+    def documents(self) -> List[Dict]:
+        """Ingested files with chunks of their own (duplicates excluded)."""
+        rows = self.conn.execute(
+            "SELECT * FROM files WHERE duplicate_of IS NULL ORDER BY file_name"
+        ).fetchall()
+        return [self._row(r) for r in rows]
+
+    def find(
+        self,
+        file_name: Optional[str] = None,
+        company: Optional[str] = None,
+        year: Optional[int] = None,
+    ) -> List[Dict]:
+        """
+        Catalog entries matching every given criterion
+        (a duplicate's file name resolves to its canonical file).
+        """
+        sql, args = ["SELECT * FROM files WHERE duplicate_of IS NULL"], []
+        if file_name:
+            sql = ["SELECT * FROM files WHERE file_name = ?"]
+            args.append(Path(file_name).name)
+        if company:
+            # "Maersk", "A.P. Moller - Maersk" and "maersk" all match company "maersk"
+            sql.append("AND company_key = ?")
+            args.append(canonical_company(company))
+        if year is not None:
+            sql.append("AND report_year = ?")
+            args.append(int(year))
+        rows = [self._row(r) for r in self.conn.execute(" ".join(sql) + " ORDER BY file_name", args)]
+        rows = [self.get(r["duplicate_of"]) if r["duplicate_of"] else r for r in rows]
+        return [r for r in rows if r is not None]
+
+    def collections(self) -> List[str]:
+        """Shard registry: collections that hold chunks of at least one file."""
+        rows = self.conn.execute(
+            "SELECT DISTINCT COALESCE(collection, ?) FROM files WHERE duplicate_of IS NULL ORDER BY 1",
+            (DEFAULT_COLLECTION,),
+        ).fetchall()
+        return [r[0] for r in rows]
+
+    @staticmethod
+    def _row(row: sqlite3.Row) -> Dict:
+        d = dict(row)
+        d["chunk_ids"] = json.loads(d["chunk_ids"] or "[]")
+        d["collection"] = d.get("collection") or DEFAULT_COLLECTION
+        return d
+
+    # -----------------------------------------
+    # Writes (committed per file so a crash keeps finished work)
+    # -----------------------------------------
+    def record(
+        self,
+        path: str,
+        file_name: str,
+        sha256: str,
+        size: int,
+        mtime: float,
+        version: str,
+        chunk_ids: List[str],
+        duplicate_of: Optional[str] = None,
+        pages: Optional[int] = None,
+        collection: str = DEFAULT_COLLECTION,
+    ):
+        company, year = infer_company_year(file_name)
+        self.conn.execute(
+            """
+            INSERT OR REPLACE INTO files
+                (path, file_name, sha256, size, mtime, version, chunk_ids, duplicate_of, ingested_at,
+                 pages, n_chunks, company, company_key, report_year, collection)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (path, file_name, sha256, size, mtime, version,
+             json.dumps(chunk_ids), duplicate_of, time.time(),
+             pages, len(chunk_ids), company, canonical_company(company) if company else None, year, collection),
+        )
+        self.conn.commit()
+
+    def touch(self, path: str, mtime: float):
+        """Content unchanged but mtime moved (e.g. copied file)."""
+        self.conn.execute("UPDATE files SET mtime = ? WHERE path = ?", (mtime, path))
+        self.conn.commit()
+
+    def remove(self, path: str):
+        self.conn.execute("DELETE FROM files WHERE path = ?", (path,))
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
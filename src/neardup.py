@@ -0,0 +1,305 @@
+# src/neardup.py
+
+"""
+Near-duplicate chunk detection at ingest (MinHash + LSH, SQLite file next
+to the Chroma directory).
+
+- signature: NUM_PERM minhashes over word 5-gram shingles of the
+  normalized text; LSH buckets of BANDS x ROWS find candidates
+- a chunk whose estimated Jaccard similarity with a stored chunk of the
+  same collection is >= threshold, and whose numbers are exactly the same,
+  becomes an *alias*: it gets no vector, the canonical chunk lists it in
+  metadata instead (chunks that differ in a figure are never collapsed)
+      source_files: [file names]      (filterable with $contains)
+      dup_sources:  ["file.pdf#12-13"] (where each copy lives)
+      dup_count:    number of copies
+- aliases keep their text + metadata, so they are promoted back to real
+  chunks if their canonical chunk is deleted
+"""
+
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .config import NEARDUP_THRESHOLD
+
+INDEX_NAME = "neardup_index.sqlite"
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE = 5
+# Shorter chunks are never collapsed (too few shingles for a reliable estimate)
+MIN_WORDS = 12
+
+# Metadata keys written on canonical chunks
+DUP_KEYS = ("source_files", "dup_sources", "dup_count")
+
+_PRIME = np.uint64((1 << 61) - 1)
+_rng = np.random.RandomState(1)
+_A = _rng.randint(1, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.randint(0, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+
+_WORD_RE = re.compile(r"\w+")
+_NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)*")
+
+# (minhash, numbers key)
+Signature = Tuple[np.ndarray, str]
+
+
+def minhash(text: str) -> Optional[Signature]:
+    """
+    MinHash of the text's word shingles plus a key of its numbers
+    (None if the text is too short to compare).
+    """
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < MIN_WORDS:
+        return None
+    shingles = {" ".join(words[i:i + SHINGLE]) for i in range(len(words) - SHINGLE + 1)}
+    x = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+    # (a*x + b) mod p per permutation; uint64 wrap-around is deterministic
+    sig = ((_A[:, None] * x[None, :] + _B[:, None]) % _PRIME).min(axis=1)
+    numbers = hashlib.blake2b(" ".join(_NUMBER_RE.findall(text)).encode("utf-8"), digest_size=8).hexdigest()
+    return sig, numbers
+
+
+def band_keys(sig: np.ndarray) -> List[str]:
+    return [
+        f"{b}:{hashlib.blake2b(sig[b * ROWS:(b + 1) * ROWS].tobytes(), digest_size=8).hexdigest()}"
+        for b in range(BANDS)
+    ]
+
+
+def source_ref(meta: Dict) -> str:
+    """"file.pdf#12-13": a copy's file and page span."""
+    start = meta.get("page_start", meta.get("page"))
+    return f"{meta.get('file_name')}#{start}-{meta.get('page_end', start)}"
+
+
+def file_where(names: List[str]) -> dict:
+    """
+    Metadata filter for chunks of the given files, including canonical
+    chunks that stand in for collapsed copies in those files.
+    """
+    own = {"file_name": {"$eq": names[0]}} if len(names) == 1 else {"file_name": {"$in": names}}
+    return {"$or": [own] + [{"source_files": {"$contains": n}} for n in names]}
+
+
+def localize(meta: Dict, names: List[str]) -> Dict:
+    """
+    A canonical chunk retrieved for another file: its metadata re-pointed at
+    the copy in `names` (file name and page), so facts cite the right report.
+    """
+    if meta.get("file_name") in names or not meta.get("dup_sources"):
+        return meta
+    for ref in meta["dup_sources"]:
+        file_name, _, span = ref.rpartition("#")
+        if file_name in names:
+            start, _, end = span.partition("-")
+            out = dict(meta, file_name=file_name)
+            if start.isdigit() and end.isdigit():
+                out["page"] = out["page_start"] = int(start)
+                out["page_end"] = int(end)
+            return out
+    return meta
+
+
+class NearDupIndex:
+    """Canonical chunk signatures + alias table, shared by the ingest threads."""
+
+    def __init__(self, db_dir: str, threshold: float = NEARDUP_THRESHOLD):
+        Path(db_dir).mkdir(parents=True, exist_ok=True)
+        self.path = Path(db_dir) / INDEX_NAME
+        self.threshold = threshold
+        # threshold <= 0: nothing is collapsed, existing aliases are still maintained
+        self.enabled = threshold > 0
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS sigs (
+                chunk_id   TEXT PRIMARY KEY,
+                collection TEXT NOT NULL,
+                sig        BLOB NOT NULL,
+                numbers    TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS bands (
+                band     TEXT NOT NULL,
+                chunk_id TEXT NOT NULL,
+                PRIMARY KEY (band, chunk_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS bands_chunk ON bands(chunk_id);
+            CREATE TABLE IF NOT EXISTS aliases (
+                alias_id     TEXT PRIMARY KEY,
+                canonical_id TEXT NOT NULL,
+                collection   TEXT NOT NULL,
+                file_name    TEXT NOT NULL,
+                source_path  TEXT,
+                text         TEXT NOT NULL,
+                meta         TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS aliases_canonical ON aliases(canonical_id);
+            """
+        )
+        self._migrate()
+        self.conn.execute("CREATE INDEX IF NOT EXISTS aliases_source ON aliases(source_path, collection)")
+        self.conn.commit()
+
+    def _migrate(self):
+        """Aliases are looked up by source path (manifest key); older indexes only had the file name."""
+        have = {r[1] for r in self.conn.execute("PRAGMA table_info(aliases)")}
+        if "source_path" not in have:
+            self.conn.execute("ALTER TABLE aliases ADD COLUMN source_path TEXT")
+            self.conn.execute("UPDATE aliases SET source_path = file_name")
+
+    # -----------------------------------------
+    # Lookup / registration (embed stage)
+    # -----------------------------------------
+    def match(self, collection: str, signature: Optional[Signature]) -> Optional[str]:
+        """Canonical chunk of `collection` near-identical to `signature`, if any."""
+        if signature is None:
+            return None
+        sig, numbers = signature
+        keys = band_keys(sig)
+        marks = ",".join("?" * len(keys))
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT DISTINCT s.chunk_id, s.sig FROM bands b JOIN sigs s ON s.chunk_id = b.chunk_id "
+                f"WHERE b.band IN ({marks}) AND s.collection = ? AND s.numbers = ?",
+                (*keys, collection, numbers),
+            ).fetchall()
+        best, best_sim = None, self.threshold
+        for cid, blob in rows:
+            sim = float(np.mean(np.frombuffer(blob, dtype=np.uint64) == sig))
+            if sim >= best_sim:
+                best, best_sim = cid, sim
+        return best
+
+    def add_canonical(self, collection: str, chunk_id: str, signature: Optional[Signature]):
+        if signature is None:
+            return
+        sig, numbers = signature
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sigs (chunk_id, collection, sig, numbers) VALUES (?, ?, ?, ?)",
+                (chunk_id, collection, sig.tobytes(), numbers),
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO bands (band, chunk_id) VALUES (?, ?)",
+                [(k, chunk_id) for k in band_keys(sig)],
+            )
+            self.conn.commit()
+
+    def add_alias(self, alias_id: str, canonical_id: str, collection: str, text: str, meta: Dict):
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO aliases "
+                "(alias_id, canonical_id, collection, file_name, source_path, text, meta) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (alias_id, canonical_id, collection, meta.get("file_name", ""),
+                 meta.get("source_path") or meta.get("file_name", ""), text, json.dumps(meta)),
+            )
+            self.conn.commit()
+
+    def is_canonical(self, chunk_id: str) -> bool:
+        with self._lock:
+            return self.conn.execute(
+                "SELECT 1 FROM sigs WHERE chunk_id = ?", (chunk_id,)
+            ).fetchone() is not None
+
+    # -----------------------------------------
+    # Canonical metadata
+    # -----------------------------------------
+    def decorate(self, chunk_id: str, meta: Dict, clear: bool = False) -> Dict:
+        """
+        `meta` with the dup keys for this chunk's aliases. clear=True sets
+        them to None when there are none (Chroma merges metadata on update,
+        so stale keys must be removed explicitly).
+        """
+        meta = {k: v for k, v in meta.items() if k not in DUP_KEYS}
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT meta FROM aliases WHERE canonical_id = ? ORDER BY alias_id", (chunk_id,)
+            ).fetchall()
+        if not rows:
+            return dict(meta, **dict.fromkeys(DUP_KEYS)) if clear else meta
+        alias_metas = [json.loads(r[0]) for r in rows]
+        meta["source_files"] = list(dict.fromkeys(
+            [meta.get("file_name", "")] + [m.get("file_name", "") for m in alias_metas]
+        ))
+        meta["dup_sources"] = [source_ref(meta)] + [source_ref(m) for m in alias_metas]
+        meta["dup_count"] = len(alias_metas) + 1
+        return meta
+
+    def stale(self, known: set) -> Dict[str, List[str]]:
+        """{collection: [IDs]} of signatures / aliases not in `known`."""
+        out: Dict[str, List[str]] = {}
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT chunk_id, collection FROM sigs UNION SELECT alias_id, collection FROM aliases"
+            ).fetchall()
+        for cid, name in rows:
+            if cid not in known:
+                out.setdefault(name, []).append(cid)
+        return out
+
+    def alias_ids(self, source_path: str, collection: str) -> List[str]:
+        """Aliases of one file (by manifest key) in `collection`."""
+        with self._lock:
+            return [r[0] for r in self.conn.execute(
+                "SELECT alias_id FROM aliases WHERE source_path = ? AND collection = ?", (source_path, collection)
+            )]
+
+    # -----------------------------------------
+    # Removal
+    # -----------------------------------------
+    def forget_aliases(self, ids: List[str]) -> List[str]:
+        """Drop alias rows for `ids`; returns the canonical IDs that lost one."""
+        touched = set()
+        with self._lock:
+            for i in range(0, len(ids), 500):
+                part = ids[i:i + 500]
+                marks = ",".join("?" * len(part))
+                touched.update(r[0] for r in self.conn.execute(
+                    f"SELECT canonical_id FROM aliases WHERE alias_id IN ({marks})", part
+                ))
+                self.conn.execute(f"DELETE FROM aliases WHERE alias_id IN ({marks})", part)
+            self.conn.commit()
+        return sorted(touched.difference(ids))
+
+    def remove(self, ids: List[str]) -> Tuple[List[str], List[Tuple[str, str, str, Dict]]]:
+        """
+        Forget chunk IDs (aliases or canonicals).
+
+        Returns:
+            touched – canonical IDs that lost an alias (metadata to refresh)
+            orphans – [(alias_id, collection, text, meta)] whose canonical went
+                      away; the caller stores them as real chunks again
+        """
+        touched = self.forget_aliases(ids)
+        orphans = []
+        with self._lock:
+            for i in range(0, len(ids), 500):
+                part = ids[i:i + 500]
+                marks = ",".join("?" * len(part))
+                orphans.extend(
+                    (aid, col, text, json.loads(meta)) for aid, col, text, meta in self.conn.execute(
+                        f"SELECT alias_id, collection, text, meta FROM aliases "
+                        f"WHERE canonical_id IN ({marks}) ORDER BY alias_id", part
+                    )
+                )
+                self.conn.execute(f"DELETE FROM aliases WHERE canonical_id IN ({marks})", part)
+                self.conn.execute(f"DELETE FROM bands WHERE chunk_id IN ({marks})", part)
+                self.conn.execute(f"DELETE FROM sigs WHERE chunk_id IN ({marks})", part)
+            self.conn.commit()
+        return touched, orphans
+
+    def close(self):
+        self.conn.close()
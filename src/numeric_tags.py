@@ -0,0 +1,69 @@
+# src/numeric_tags.py
+
+"""
+Ingest-time quantity tags for chunks.
+
+Adds flat (Chroma-filterable) metadata describing what a chunk could
+contain a quantitative fact about:
+- has_percent / has_year / has_unit / has_scope / has_value
+- years, units, scopes as comma-separated strings
+- has_quant: a percentage, unit or value → worth an extraction LLM call
+  (a bare year is not: nearly every annual-report chunk mentions one)
+"""
+
+import re
+from typing import Dict
+
+PERCENT_RE = re.compile(r"\d(?:[\d.,]*\d)?\s?%|\b(?:per\s?cent|percent)\b", re.I)
+YEAR_RE = re.compile(r"\b(19[5-9]\d|20[0-9]\d)\b")
+SCOPE_RE = re.compile(r"\bscope\s*([123])\b", re.I)
+# Numbers that are values rather than list/section markers:
+# decimals, thousands separators or 2+ digits (years are removed first)
+VALUE_RE = re.compile(r"(?<![\w.])\d{1,3}(?:[,\s]\d{3})+(?:\.\d+)?(?![\w])|(?<![\w.])\d+\.\d+|(?<![\w.])\d{2,}(?![\w.])")
+
+UNIT_PATTERNS = {
+    "tco2e": r"\b[gkmt]?t\s?co2[\s-]?(?:e|eq)\b|\bco2[\s-]?(?:e|eq)\b",
+    "tco2": r"\b[gkmt]?t\s?co2\b",
+    "tonnes": r"\b(?:tonnes?|tons?|kt|mt|gt)\b",
+    "energy": r"\b(?:[kmgt]wh|[gtp]j)\b",
+    "intensity": r"\bg\s?co2(?:e)?\s?/\s?\w+|\b(?:eeoi|aer)\b",
+    "temperature": r"°\s?c\b",
+    "ppm": r"\bppm\b",
+    "volume": r"\b(?:m3|litres?|liters?)\b",
+    "currency": r"(?:\busd|\beur|\bdkk|\$|€)\s?\d",
+}
+UNIT_RES = {name: re.compile(p, re.I) for name, p in UNIT_PATTERNS.items()}
+
+# Bumped when the tags change meaning (part of the ingest version: re-tags stored chunks)
+TAGS_VERSION = "2"
+
+# Chroma `where` clause selecting chunks tagged at ingest
+QUANT_WHERE = {"has_quant": {"$eq": True}}
+
+
+def tag_quantities(text: str) -> Dict:
+    """Flat metadata dict describing the quantitative content of `text`."""
+    years = sorted(set(YEAR_RE.findall(text)))
+    units = sorted(name for name, rx in UNIT_RES.items() if rx.search(text))
+    scopes = sorted(set(SCOPE_RE.findall(text)))
+    has_percent = bool(PERCENT_RE.search(text))
+    has_value = bool(VALUE_RE.search(YEAR_RE.sub(" ", text)))
+
+    return {
+        "has_percent": has_percent,
+        "has_year": bool(years),
+        "has_unit": bool(units),
+        "has_scope": bool(scopes),
+        "has_value": has_value,
+        "has_quant": has_percent or bool(units) or has_value,
+        "years": ",".join(years),
+        "units": ",".join(units),
+        "scopes": ",".join(scopes),
+    }
+
+
+def is_quantitative(text: str, meta: Dict | None = None) -> bool:
+    """Use the stored tag when present (tagged at ingest), else tag on the fly."""
+    if meta and "has_quant" in meta:
+        return bool(meta["has_quant"])
+    return tag_quantities(text)["has_quant"]
@@ -0,0 +1,172 @@
+# src/packing.py
+
+"""
+Evidence packer for LLM extraction.
+
+- fills a token budget with several retrieved chunks per call
+- every chunk keeps a numbered header (chunk / page / file / section)
+- chunks larger than the budget are split on paragraph boundaries
+  instead of being truncated, so no evidence is dropped
+- tokens are counted with LLM_MODEL's tokenizer (not the embedding
+  model's, whose vocabulary can differ); without one, the len/4 estimate
+  is padded by ESTIMATE_MARGIN so packs stay inside num_ctx
+"""
+
+import math
+from functools import lru_cache
+from typing import Callable, Dict, List
+
+from .chunking import estimate_tokens, load_tokenizer_counter, split_paragraphs, tokenizer_file
+from .config import LLM_MODEL, LLM_TOKENIZER_PATH
+
+
+# Tokens added around each chunk (header line + quotes)
+HEADER_OVERHEAD = 40
+
+# Padding on estimated counts: len/4 undercounts digit-heavy ESG tables
+ESTIMATE_MARGIN = 1.3
+
+
+# ----------------------------------------
+# Token counting (the LLM's context, not the embedder's)
+# ----------------------------------------
+_counter: Callable[[str], int] | None = None
+
+
+def _padded_estimate(text: str) -> int:
+    return math.ceil(estimate_tokens(text) * ESTIMATE_MARGIN)
+
+
+def _get_counter() -> Callable[[str], int]:
+    global _counter
+    if _counter is None:
+        path = tokenizer_file(LLM_MODEL, path=LLM_TOKENIZER_PATH)
+        _counter = (load_tokenizer_counter(path) if path else None) or _padded_estimate
+    return _counter
+
+
+def set_token_counter(fn: Callable[[str], int] | None):
+    """Install the packing token counter (None → reload from config). Clears the count cache."""
+    global _counter
+    _counter = fn
+    count_tokens.cache_clear()
+
+
+@lru_cache(maxsize=16384)
+def count_tokens(text: str) -> int:
+    """LLM token count of `text` (cached per distinct text)."""
+    return _get_counter()(text)
+
+
+class Evidence:
+    """One numbered piece of evidence inside a pack."""
+
+    __slots__ = ("number", "text", "meta", "part")
+
+    def __init__(self, number: int, text: str, meta: Dict, part: str = ""):
+        self.number = number
+        self.text = text
+        self.meta = meta
+        self.part = part
+
+    def header(self) -> str:
+        part = f" | part: {self.part}" if self.part else ""
+        page, end = self.meta.get("page"), self.meta.get("page_end")
+        pages = f"{page}-{end}" if end is not None and end != page else f"{page}"
+        return (
+            f"[chunk: {self.number} | page: {pages} | "
+            f"file: {self.meta.get('file_name')} | section: {self.meta.get('section_path', '')}{part}]"
+        )
+
+    def render(self) -> str:
+        return f'{self.header()}\n"""\n{self.text}\n"""'
+
+
+def _split_to_budget(text: str, budget: int) -> List[str]:
+    """Split an oversized chunk into paragraph groups that each fit `budget`."""
+    pieces: List[str] = []
+    buf: List[str] = []
+    buf_tokens = 0
+    for para in split_paragraphs(text) or [text]:
+        ptoks = count_tokens(para)
+        if ptoks > budget:
+            # a single giant paragraph: fall back to a hard split on characters
+            if buf:
+                pieces.append("\n\n".join(buf))
+                buf, buf_tokens = [], 0
+            step = max(1, int(len(para) * budget / ptoks))
+            pieces.extend(para[i:i + step] for i in range(0, len(para), step))
+            continue
+        if buf and buf_tokens + ptoks > budget:
+            pieces.append("\n\n".join(buf))
+            buf, buf_tokens = [], 0
+        buf.append(para)
+        buf_tokens += ptoks
+    if buf:
+        pieces.append("\n\n".join(buf))
+    return pieces
+
+
+def output_budget(n_pieces: int, per_piece: int, floor: int = 0) -> int:
+    """Answer tokens kept free for a pack of `n_pieces` evidence pieces."""
+    return max(floor, per_piece * n_pieces)
+
+
+def pack_chunks(
+    docs: List[str],
+    metas: List[Dict],
+    budget_tokens: int,
+    output_per_piece: int = 0,
+    output_floor: int = 0,
+) -> List[List[Evidence]]:
+    """
+    Greedily fill packs of at most `budget_tokens` tokens, keeping
+    retrieval order. Evidence numbers are unique across packs.
+    With `output_per_piece` / `output_floor` the budget also covers the
+    answer: a pack's evidence plus its output_budget fit in it.
+    """
+    budget_tokens = max(budget_tokens, HEADER_OVERHEAD * 2 + output_budget(1, output_per_piece, output_floor))
+    piece_budget = budget_tokens - HEADER_OVERHEAD - output_budget(1, output_per_piece, output_floor)
+
+    packs: List[List[Evidence]] = []
+    current: List[Evidence] = []
+    used = 0
+    number = 0
+
+    for doc, meta in zip(docs, metas):
+        parts = [doc] if count_tokens(doc) <= piece_budget else _split_to_budget(doc, piece_budget)
+        for k, text in enumerate(parts, start=1):
+            cost = count_tokens(text) + HEADER_OVERHEAD
+            answer = output_budget(len(current) + 1, output_per_piece, output_floor)
+            if current and used + cost + answer > budget_tokens:
+                packs.append(current)
+                current, used = [], 0
+            number += 1
+            part = f"{k}/{len(parts)}" if len(parts) > 1 else ""
+            current.append(Evidence(number, text, meta, part))
+            used += cost
+
+    if current:
+        packs.append(current)
+    return packs
+
+
+def evidence_for_fact(fact: Dict, pack: List[Evidence]) -> Evidence:
+    """
+    Resolve which evidence a fact came from: the model's "chunk" tag,
+    else the piece containing the fact text, else the first piece.
+    """
+    by_number = {e.number: e for e in pack}
+    tag = fact.get("chunk")
+    try:
+        if tag is not None and int(tag) in by_number:
+            return by_number[int(tag)]
+    except (TypeError, ValueError):
+        pass
+
+    text = (fact.get("text") or "").strip()
+    if text:
+        for e in pack:
+            if text in e.text:
+                return e
+    return pack[0]
@@ -1,6 +1,18 @@
 # Minimal drop-in of your Recursive Verification Framework with RAG hooks
-from typing import Dict, Any, List
-from .vectordb import get_client, get_collection, query
+#
+# VerificationEngine adds, per run:
+# - a memo of statement -> retrieved sources, and of statement -> result for
+#   subtrees that hit no depth / cycle cutoff (reused only where the same
+#   cutoffs cannot occur, so results do not depend on visiting order)
+# - max depth and max fan-out budgets (no combinatorial explosion)
+# - one batched retrieval call for all siblings of a node
+# - parallel verification of many facts sharing the same memo
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, FrozenSet, List, Optional, Tuple
+
+from .vectordb import get_client, get_collection, query, query_batch
+from .config import VERIFY_MAX_DEPTH, VERIFY_MAX_FANOUT, VERIFY_WORKERS
 
 def is_axiom(statement: str) -> bool:
     axioms = ["1 liter of diesel", "GHG Protocol Scope 2 Guidance 2015"]  # extend with a data table
@@ -10,33 +22,148 @@ def has_source(statement: str) -> bool:
     keys = ["according to", "per ", "in accordance with", "verified by", "as defined in"]
     return any(k in statement.lower() for k in keys)
 
+def _to_sources(documents: List[str], metadatas: List[Dict]) -> List[Dict]:
+    return [{"quote": d[:1200], "meta": m} for d, m in zip(documents, metadatas)]
+
 def get_sources_from_rag(collection, statement: str) -> List[Dict]:
     res = query(collection, statement, n=5)
-    out = []
-    for d, m in zip(res["documents"][0], res["metadatas"][0]):
-        out.append({"quote": d[:1200], "meta": m})
-    return out
+    return _to_sources(res["documents"][0], res["metadatas"][0])
+
+
+class VerificationEngine:
+    """Shared state for one verification run over a collection."""
+
+    def __init__(
+        self,
+        collection,
+        max_depth: int = VERIFY_MAX_DEPTH,
+        max_fanout: int = VERIFY_MAX_FANOUT,
+        n_sources: int = 5,
+    ):
+        self.collection = collection
+        self.max_depth = max_depth
+        self.max_fanout = max_fanout
+        self.n_sources = n_sources
+        self._sources: Dict[str, List[Dict]] = {}
+        # statement -> (result, statements in its proof tree, levels it needs below it)
+        self._results: Dict[str, Tuple[Dict[str, Any], FrozenSet[str], int]] = {}
+        self._lock = threading.Lock()
+
+    # -----------------------------------------
+    # Retrieval (memoized, batched)
+    # -----------------------------------------
+    def prefetch(self, statements: List[str]):
+        """Retrieve sources for every statement not seen yet, in one query."""
+        with self._lock:
+            todo = list(dict.fromkeys(
+                s for s in statements
+                if s not in self._sources and s not in self._results and not is_axiom(s)
+            ))
+        if not todo:
+            return
+        hits = query_batch(self.collection, todo, n=self.n_sources, include=["documents", "metadatas"])
+        with self._lock:
+            for s, hit in zip(todo, hits):
+                self._sources[s] = _to_sources(hit["documents"], hit["metadatas"])
+
+    def sources(self, statement: str) -> List[Dict]:
+        with self._lock:
+            hit = self._sources.get(statement)
+        if hit is None:
+            self.prefetch([statement])
+            with self._lock:
+                hit = self._sources.get(statement, [])
+        return hit
+
+    # -----------------------------------------
+    # Recursion
+    # -----------------------------------------
+    def verify(self, statement: str, depth: int = 0, path: Tuple[str, ...] = ()) -> Dict[str, Any]:
+        return self._verify(statement, depth, path)[0]
+
+    def _verify(self, statement: str, depth: int, path: Tuple[str, ...]):
+        """
+        Returns (result, memo info). Info is None when the subtree hit a
+        depth or cycle cutoff: such a result holds only for this depth and path.
+        """
+        if statement in path:
+            return {"credibility": "circular_reference", "proof": None}, None
+
+        with self._lock:
+            memo = self._results.get(statement)
+        if memo is not None:
+            result, nodes, height = memo
+            # same outcome as recomputing: no cutoff can occur here either
+            if depth + height < self.max_depth and nodes.isdisjoint(path):
+                return result, (nodes, height)
+
+        if is_axiom(statement):
+            # checked before the depth limit: valid at any depth (height -1)
+            return self._remember(statement, {"credibility": "axiom", "proof": statement}, [], height=-1)
+
+        if depth >= self.max_depth:
+            return {"credibility": "max_depth_reached", "proof": None}, None
+
+        path = path + (statement,)
+        sources = self.sources(statement)
+
+        if has_source(statement):
+            children = [s["quote"] for s in sources[:self.max_fanout]]
+            self.prefetch(children)
+            subs = [self._verify(c, depth + 1, path) for c in children]
+            return self._remember(
+                statement,
+                {"credibility": "verified_from_source", "proof": [r for r, _ in subs]},
+                [info for _, info in subs],
+            )
+
+        # Try cross verification (reuses the same retrieval)
+        infos = []
+        if sources:
+            sub, info = self._verify(sources[0]["quote"], depth + 1, path)
+            if sub["credibility"] in ["verified_from_source", "derived", "axiom"]:
+                return self._remember(statement, {"credibility": "cross_verified", "proof": sub}, [info])
+            infos.append(info)
+
+        # Derivation gate (placeholder)
+        return self._remember(statement, {"credibility": "unsupported", "proof": None}, infos)
+
+    def _remember(self, statement: str, result: Dict[str, Any], child_infos: List[Optional[Tuple]],
+                  height: int | None = None):
+        """Memoize `result` unless a child subtree was cut off."""
+        if any(info is None for info in child_infos):
+            return result, None
+        nodes = frozenset([statement]).union(*(n for n, _ in child_infos))
+        if height is None:
+            height = max([0] + [h + 1 for _, h in child_infos])
+        with self._lock:
+            self._results.setdefault(statement, (result, nodes, height))
+        return result, (nodes, height)
+
+    def verify_many(self, statements: List[str], workers: int = VERIFY_WORKERS) -> List[Dict[str, Any]]:
+        """Verify statements in parallel; output order matches input order."""
+        self.prefetch(statements)
+        workers = max(1, min(workers, len(statements) or 1))
+        if workers == 1:
+            return [self.verify(s) for s in statements]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(self.verify, statements))
+
 
 def verifier(statement: str, collection, depth=0, visited=None) -> Dict[str, Any]:
-    if visited is None: visited = set()
-    if statement in visited:
-        return {"credibility": "circular_reference", "proof": None}
-    visited.add(statement)
-
-    if is_axiom(statement):
-        return {"credibility": "axiom", "proof": statement}
-
-    if has_source(statement):
-        sources = get_sources_from_rag(collection, statement)
-        results = [verifier(s["quote"], collection, depth+1, visited) for s in sources]
-        return {"credibility":"verified_from_source","proof": results}
-
-    # Try cross verification
-    cross = get_sources_from_rag(collection, statement)
-    if cross:
-        sub = verifier(cross[0]["quote"], collection, depth+1, visited)
-        if sub["credibility"] in ["verified_from_source","derived","axiom"]:
-            return {"credibility":"cross_verified","proof": sub}
-
-    # Derivation gate (placeholder)
-    return {"credibility":"unsupported","proof": None}
+    """Single-statement entry point (fresh engine, same result shape as before)."""
+    return VerificationEngine(collection).verify(statement, depth, tuple(visited or ()))
+
+
+def verify_facts(
+    facts: List[Dict],
+    collection,
+    workers: int = VERIFY_WORKERS,
+    max_depth: int = VERIFY_MAX_DEPTH,
+    max_fanout: int = VERIFY_MAX_FANOUT,
+) -> List[Dict[str, Any]]:
+    """Verify every fact of a facts file with one shared engine."""
+    statements = [f.get("claim") or f.get("metric") or str(f) for f in facts]
+    engine = VerificationEngine(collection, max_depth=max_depth, max_fanout=max_fanout)
+    results = engine.verify_many(statements, workers=workers)
+    return [{"statement": s, "verification": r} for s, r in zip(statements, results)]
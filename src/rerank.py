@@ -0,0 +1,231 @@
+# src/rerank.py
+
+"""
+Optional re-ranking of retrieved chunks before extraction (CPU / local).
+
+- RERANKER = "off" (default), "cross-encoder" or "ollama"
+- "cross-encoder": a small sentence-transformers CrossEncoder on CPU
+  (RERANK_MODEL, default ms-marco-MiniLM-L-6-v2; `sentence-transformers`
+  is optional — without it re-ranking is skipped with a warning)
+- "ollama": a small Ollama model in scoring mode, one short schema-
+  constrained answer {"score": 0-10} per chunk. RERANK_MODEL must name it
+  (the extraction model would cost more LLM time than re-ranking saves);
+  without it re-ranking is skipped with a warning
+- cross-encoder: a chunk's score is its best score over all queries;
+  ollama: each chunk is scored once against all queries joined
+- pair scores are cached in SQLite by (reranker, query hash, chunk ID);
+  chunk IDs are content-derived, so an edited chunk is scored again
+"""
+
+import abc
+import hashlib
+import json
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .config import RERANKER, RERANK_MODEL, RERANK_CACHE_PATH, LLM_CONCURRENCY
+
+RERANKERS = ("off", "cross-encoder", "ollama")
+DEFAULT_CROSS_ENCODER = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+
+def query_hash(query: str) -> str:
+    return hashlib.sha256(query.encode("utf-8")).hexdigest()[:32]
+
+
+# ---------------------------------------------------------
+# Score cache
+# ---------------------------------------------------------
+class ScoreCache:
+    """SQLite cache of pair scores: (reranker name, query hash, chunk ID) -> score."""
+
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS scores (
+                reranker   TEXT NOT NULL,
+                query_hash TEXT NOT NULL,
+                chunk_id   TEXT NOT NULL,
+                score      REAL NOT NULL,
+                PRIMARY KEY (reranker, query_hash, chunk_id)
+            ) WITHOUT ROWID
+            """
+        )
+        self._conn.commit()
+
+    def get_many(self, reranker: str, qhash: str, chunk_ids: List[str]) -> Dict[str, float]:
+        found: Dict[str, float] = {}
+        with self._lock:
+            for i in range(0, len(chunk_ids), 500):
+                part = chunk_ids[i:i + 500]
+                marks = ",".join("?" * len(part))
+                found.update(self._conn.execute(
+                    f"SELECT chunk_id, score FROM scores WHERE reranker = ? AND query_hash = ? "
+                    f"AND chunk_id IN ({marks})",
+                    (reranker, qhash, *part),
+                ).fetchall())
+            self.hits += len(found)
+            self.misses += len(set(chunk_ids)) - len(found)
+        return found
+
+    def put_many(self, reranker: str, qhash: str, scores: Dict[str, float]):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO scores (reranker, query_hash, chunk_id, score) VALUES (?, ?, ?, ?)",
+                [(reranker, qhash, cid, float(s)) for cid, s in scores.items()],
+            )
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+_cache: Optional[ScoreCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> Optional[ScoreCache]:
+    """Process-wide score cache; None when RERANK_CACHE_PATH is empty."""
+    global _cache
+    with _cache_lock:
+        if _cache is None and RERANK_CACHE_PATH:
+            _cache = ScoreCache(RERANK_CACHE_PATH)
+        return _cache
+
+
+# ---------------------------------------------------------
+# Rerankers
+# ---------------------------------------------------------
+class Reranker(abc.ABC):
+    """
+    Base class. `name` keys the score cache. `joint_queries`: score each
+    chunk once against all queries joined, instead of once per query.
+    """
+
+    kind = "base"
+    joint_queries = False
+
+    def __init__(self, model: str):
+        self.model = model
+
+    @property
+    def name(self) -> str:
+        return f"{self.kind}:{self.model}"
+
+    @abc.abstractmethod
+    def score(self, query: str, docs: List[str]) -> List[float]:
+        """Relevance of each doc to the query (higher is better)."""
+
+
+class CrossEncoderReranker(Reranker):
+    """sentence-transformers CrossEncoder on CPU (optional dependency)."""
+
+    kind = "cross-encoder"
+
+    def __init__(self, model: str, encoder):
+        super().__init__(model)
+        self._encoder = encoder
+
+    @classmethod
+    def load(cls, model: str) -> Optional["CrossEncoderReranker"]:
+        try:
+            from sentence_transformers import CrossEncoder
+        except ImportError:
+            print("[WARN] `sentence-transformers` not installed — skipping cross-encoder re-ranking.")
+            return None
+        try:
+            return cls(model, CrossEncoder(model, device="cpu"))
+        except Exception as e:
+            print(f"[WARN] Could not load cross-encoder {model}: {e} — skipping re-ranking.")
+            return None
+
+    def score(self, query: str, docs: List[str]) -> List[float]:
+        return [float(s) for s in self._encoder.predict([(query, d) for d in docs], batch_size=32)]
+
+
+SCORE_SCHEMA = {
+    "type": "object",
+    "properties": {"score": {"type": "integer", "minimum": 0, "maximum": 10}},
+    "required": ["score"],
+}
+
+SCORE_SYSTEM = (
+    "You rate how useful a report excerpt is for answering a question. "
+    'Answer only with JSON {"score": N}, N from 0 (irrelevant) to 10 (directly answers it).'
+)
+
+
+class OllamaReranker(Reranker):
+    """Pointwise scoring with a small Ollama model, LLM_CONCURRENCY calls at a time."""
+
+    kind = "ollama"
+    joint_queries = True
+
+    def _score_one(self, query: str, doc: str) -> float:
+        from .llm_ollama import _ollama_generate
+        prompt = f'QUESTION:\n{query}\n\nEXCERPT:\n"""\n{doc}\n"""\n\nRELEVANCE SCORE (JSON):'
+        raw = _ollama_generate(SCORE_SYSTEM, prompt, temperature=0.0, max_tokens=16,
+                               fmt=SCORE_SCHEMA, model=self.model)
+        return float(json.loads(raw)["score"])
+
+    def score(self, query: str, docs: List[str]) -> List[float]:
+        with ThreadPoolExecutor(max_workers=max(1, LLM_CONCURRENCY)) as pool:
+            return list(pool.map(lambda d: self._score_one(query, d), docs))
+
+
+def get_reranker(kind: str = RERANKER, model: str = RERANK_MODEL) -> Optional[Reranker]:
+    """
+    Build a reranker by kind; None for "off", a cross-encoder that cannot
+    load, or "ollama" without an explicit model.
+    """
+    if kind not in RERANKERS:
+        raise ValueError(f"Unknown reranker '{kind}'. Choose one of: {list(RERANKERS)}")
+    if kind == "off":
+        return None
+    if kind == CrossEncoderReranker.kind:
+        return CrossEncoderReranker.load(model or DEFAULT_CROSS_ENCODER)
+    if not model:
+        print("[WARN] RERANKER=ollama needs RERANK_MODEL (a small scoring model) — skipping re-ranking.")
+        return None
+    return OllamaReranker(model)
+
+
+# ---------------------------------------------------------
+# Re-ranking
+# ---------------------------------------------------------
+def rerank(
+    reranker: Reranker,
+    queries: List[str],
+    ids: List[str],
+    docs: List[str],
+    use_cache: bool = True,
+) -> List[Tuple[int, float]]:
+    """
+    (index, score) of every candidate, best first; a chunk's score is its
+    best over the queries (or its one score against the joined queries,
+    see Reranker.joint_queries). Only pairs missing from the cache are scored.
+    """
+    cache = get_cache() if use_cache else None
+    if reranker.joint_queries and len(queries) > 1:
+        queries = ["\n".join(queries)]
+    best = [float("-inf")] * len(ids)
+    for q in queries:
+        qh = query_hash(q)
+        scores = cache.get_many(reranker.name, qh, ids) if cache else {}
+        todo = [k for k, cid in enumerate(ids) if cid not in scores]
+        if todo:
+            fresh = dict(zip((ids[k] for k in todo), reranker.score(q, [docs[k] for k in todo])))
+            if cache:
+                cache.put_many(reranker.name, qh, fresh)
+            scores.update(fresh)
+        best = [max(b, scores[cid]) for b, cid in zip(best, ids)]
+    return sorted(enumerate(best), key=lambda kv: kv[1], reverse=True)
@@ -0,0 +1,101 @@
+# src/schemas.py
+
+"""
+Pydantic models mirroring the output schema in prompts/extract_facts.md.
+
+- FACTS_JSON_SCHEMA is sent as Ollama's `format` (constrained decoding)
+- split_valid_facts validates facts one by one, so a single bad fact can
+  be repaired on its own instead of re-generating the whole answer
+"""
+
+from typing import Any, Dict, List, Literal, Optional, Tuple, Union
+
+from pydantic import BaseModel, Field, ValidationError, field_validator
+
+
+class EsrsTarget(BaseModel):
+    target_type: Optional[str] = None
+    scope: List[str] = Field(default_factory=list)
+    base_year: Optional[Union[int, str]] = None
+    target_year: Optional[Union[int, str]] = None
+    reduction_percent: Optional[Union[float, str]] = None
+    absolute_or_intensity: Optional[Literal["absolute", "intensity"]] = None
+
+    @field_validator("absolute_or_intensity", mode="before")
+    @classmethod
+    def _lower(cls, v):
+        return v.strip().lower() if isinstance(v, str) else v
+
+    @field_validator("scope", mode="before")
+    @classmethod
+    def _scope_list(cls, v):
+        if v is None:
+            return []
+        return [v] if isinstance(v, str) else v
+
+
+class Fact(BaseModel):
+    id: Optional[str] = None
+    chunk: Optional[int] = None
+    page: Optional[int] = None
+    text: str = Field(min_length=1)
+    confidence: Literal["low", "medium", "high"]
+    fact_type: Literal["axiom", "claim", "formula", "definition"]
+    citations: List[str] = Field(default_factory=list)
+    esrs_target: Optional[EsrsTarget] = None
+    components: List[str] = Field(default_factory=list)
+
+    @field_validator("confidence", "fact_type", mode="before")
+    @classmethod
+    def _lower(cls, v):
+        return v.strip().lower() if isinstance(v, str) else v
+
+    @field_validator("citations", "components", mode="before")
+    @classmethod
+    def _none_to_list(cls, v):
+        return [] if v is None else v
+
+
+class FactsResponse(BaseModel):
+    company: Optional[str] = None
+    year: Optional[Union[int, str]] = None
+    facts: List[Fact] = Field(default_factory=list)
+
+
+FACTS_JSON_SCHEMA: Dict[str, Any] = FactsResponse.model_json_schema()
+
+
+def _short_error(e: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(p) for p in err['loc']) or '<root>'}: {err['msg']}"
+        for err in e.errors()
+    )
+
+
+def check_facts_envelope(payload: Any):
+    """
+    Raise ValueError if the answer is not a {"facts": [...]} object —
+    the only violation worth a full re-generation.
+    """
+    if not isinstance(payload, dict) or not isinstance(payload.get("facts", []), list):
+        raise ValueError(f"Response is not a facts object: {str(payload)[:200]}")
+
+
+def split_valid_facts(payload: Any) -> Tuple[List[Dict], List[Tuple[Any, str]]]:
+    """
+    Validate a model answer fact by fact.
+
+    Returns (valid facts as plain dicts, [(invalid fact, error message)]).
+    """
+    check_facts_envelope(payload)
+
+    valid, invalid = [], []
+    for item in payload.get("facts", []):
+        try:
+            fact = Fact.model_validate(item).model_dump()
+        except ValidationError as e:
+            invalid.append((item, _short_error(e)))
+            continue
+        # unset optional top-level fields are filled in by the caller
+        valid.append({k: v for k, v in fact.items() if v is not None})
+    return valid, invalid
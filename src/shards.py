@@ -0,0 +1,83 @@
+# src/shards.py
+
+"""
+Sharded collections (one Chroma collection per company or report year).
+
+- SHARD_BY = "none" (single "reports" collection), "company" or "year"
+- a PDF's shard comes from its file name (same inference as the catalog)
+- the ingest manifest records each file's shard: that is the shard
+  registry, and company / year lookups in it pick the shards to query
+- queries fan out over a list of collections (vectordb.query_batch)
+"""
+
+import re
+from pathlib import Path
+from typing import Dict, List
+
+from .embeddings import EmbeddingBackend, get_backend
+from .manifest import IngestManifest, MANIFEST_NAME, infer_company_year
+from .vectordb import get_client, get_collection
+from .config import SHARD_BY
+
+BASE_COLLECTION = "reports"
+SHARD_MODES = ("none", "company", "year")
+
+
+def shard_name(file_name: str, shard_by: str = SHARD_BY) -> str:
+    """Collection holding the chunks of `file_name` ("reports-maersk", "reports-2020")."""
+    if shard_by not in SHARD_MODES:
+        raise ValueError(f"SHARD_BY must be one of {SHARD_MODES}, got {shard_by!r}")
+    if shard_by == "none":
+        return BASE_COLLECTION
+    company, year = infer_company_year(file_name)
+    key = company if shard_by == "company" else year
+    # Chroma names: 3-63 chars of [a-zA-Z0-9._-]
+    key = re.sub(r"[^a-z0-9]+", "-", str(key or "unknown").lower()).strip("-") or "unknown"
+    return f"{BASE_COLLECTION}-{key}"[:63]
+
+
+def is_shard(name: str) -> bool:
+    return name == BASE_COLLECTION or name.startswith(BASE_COLLECTION + "-")
+
+
+class ShardRouter:
+    """Opens (and caches) shard collections, all with the same embedding backend."""
+
+    def __init__(self, client, shard_by: str = SHARD_BY, backend: EmbeddingBackend | None = None):
+        self.client = client
+        self.shard_by = shard_by
+        self.backend = backend or get_backend()
+        self._open: Dict[str, object] = {}
+
+    def collection(self, name: str):
+        if name not in self._open:
+            self._open[name] = get_collection(self.client, name, backend=self.backend)
+        return self._open[name]
+
+    def for_file(self, file_name: str):
+        return self.collection(shard_name(file_name, self.shard_by))
+
+    def names(self) -> List[str]:
+        """Shard collections present in the DB (registered or legacy)."""
+        names = [getattr(c, "name", c) for c in self.client.list_collections()]
+        return sorted(n for n in names if is_shard(n))
+
+    def existing(self) -> List:
+        return [self.collection(n) for n in self.names()]
+
+
+def registered_shards(db_dir: str) -> List[str]:
+    """Shard names recorded in the ingest manifest ([BASE] if there is none)."""
+    if not (Path(db_dir) / MANIFEST_NAME).exists():
+        return [BASE_COLLECTION]
+    manifest = IngestManifest(db_dir)
+    try:
+        return manifest.collections() or [BASE_COLLECTION]
+    finally:
+        manifest.close()
+
+
+def open_shards(db_dir: str, names: List[str] | None = None, client=None) -> List:
+    """Collections to fan a query out to (default: every registered shard)."""
+    client = client or get_client(db_dir)
+    return [get_collection(client, n) for n in (names or registered_shards(db_dir))]
@@ -3,15 +3,79 @@
 """
 Advanced PDF extraction optimized for ESG / Climate reports.
 - Detects headings using font size / bold weight
-- Extracts tables separately
+- Extracts tables separately (opt-in: one find_tables() per page, only on
+  pages a cheap text-layout heuristic flags as tabular)
 - Cleans footers / page numbers
 - Normalizes multi-column layout into natural reading order
-- Returns structured blocks for chunker
+- Returns structured blocks for chunker: compact __slots__ records
+  (spans are dropped once a block is classified), yielded page by page
 """
 
 from pathlib import Path
+import re
 import fitz  # pymupdf
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Tuple
+
+from .config import PDF_TABLE_MODE
+
+TABLE_MODES = ("off", "auto", "all")
+
+# A line is "numeric" if it is mostly digits / separators / units (e.g. "1,234", "12.5%"),
+# or a table placeholder ("-", "—", "n/a", "NA")
+NUMERIC_LINE_RE = re.compile(r"^[\s\d.,%()+\-–—/]*\d[\s\d.,%()+\-–—/]*$|^(?:[-–—]+|n/?a)$", re.I)
+
+# Minimum share of a block's area inside a table bbox for the block to belong to it
+TABLE_OVERLAP = 0.5
+
+
+# ---------------------------------------------------------
+# Compact records (dict-style access kept for callers)
+# ---------------------------------------------------------
+class _Record:
+    __slots__ = ()
+
+    def __getitem__(self, key: str):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key: str, default=None):
+        return getattr(self, key, default)
+
+    def keys(self):
+        return self.__slots__
+
+    def __repr__(self):
+        fields = ", ".join(f"{k}={getattr(self, k)!r:.40}" for k in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class Block(_Record):
+    """One text block after classification (no spans / font info retained)."""
+
+    __slots__ = ("text", "block_type", "bbox", "table_id", "table_text")
+
+    def __init__(self, text: str, block_type: str, bbox: Tuple, table_id: int | None = None,
+                 table_text: str = ""):
+        self.text = text
+        self.block_type = block_type
+        self.bbox = bbox
+        self.table_id = table_id
+        self.table_text = table_text
+
+
+class PageRecord(_Record):
+    """One page: reading-order text plus its blocks."""
+
+    __slots__ = ("page", "text", "blocks", "file_name", "source_uri")
+
+    def __init__(self, page: int, text: str, blocks: List[Block], file_name: str, source_uri: str):
+        self.page = page
+        self.text = text
+        self.blocks = blocks
+        self.file_name = file_name
+        self.source_uri = source_uri
 
 
 # ---------------------------------------------------------
@@ -41,24 +105,63 @@ def classify_block(block: Dict[str, Any]) -> str:
 
 
 # ---------------------------------------------------------
-# Utility: extract table as MarkDown-ish text
+# Tables: cheap detection heuristic + one find_tables() per page
 # ---------------------------------------------------------
-def extract_table(page, b):
+def likely_has_tables(blocks_raw: List[Dict], min_numeric: int = 8, min_rows: int = 3) -> bool:
     """
-    Extracts simple tables via PyMuPDF.  
-    Returns a text version (pipe tables).
+    Cheap pre-check on the text layout already extracted by get_text("dict"):
+    many numeric-only lines, or several rows of 3+ lines aligned on one baseline.
     """
+    numeric = 0
+    rows: Dict[int, int] = {}
+    for b in blocks_raw:
+        for l in b.get("lines", []):
+            text = "".join(s.get("text", "") for s in l["spans"]).strip()
+            if not text:
+                continue
+            if NUMERIC_LINE_RE.match(text):
+                numeric += 1
+            y = round(l["bbox"][1])
+            rows[y] = rows.get(y, 0) + 1
+    aligned_rows = sum(1 for n in rows.values() if n >= 3)
+    return numeric >= min_numeric or aligned_rows >= min_rows
+
+
+def table_to_text(table) -> str:
+    """Pipe-table text of a PyMuPDF Table."""
+    out = []
+    for row in table.extract():
+        out.append(" | ".join((cell or "").strip() for cell in row))
+    return "\n".join(out)
+
+
+def find_page_tables(page) -> List[Tuple[Tuple[float, float, float, float], str]]:
+    """All tables of a page as (bbox, pipe text) — a single find_tables() call."""
     try:
-        table = page.find_tables()
-        out = []
-        for t in table:
-            if t.bbox == b["bbox"]:
-                for row in t.extract():
-                    out.append(" | ".join(cell.strip() for cell in row))
-                return "\n".join(out)
-    except Exception:
-        pass
-    return ""
+        return [(tuple(t.bbox), table_to_text(t)) for t in page.find_tables()]
+    except Exception as e:
+        print(f"[WARN] Table detection failed on page {page.number + 1}: {e}")
+        return []
+
+
+def _overlap_ratio(bbox, table_bbox) -> float:
+    """Share of `bbox`'s area that lies inside `table_bbox`."""
+    x0, y0 = max(bbox[0], table_bbox[0]), max(bbox[1], table_bbox[1])
+    x1, y1 = min(bbox[2], table_bbox[2]), min(bbox[3], table_bbox[3])
+    if x1 <= x0 or y1 <= y0:
+        return 0.0
+    area = (bbox[2] - bbox[0]) * (bbox[3] - bbox[1])
+    return (x1 - x0) * (y1 - y0) / area if area > 0 else 0.0
+
+
+def match_table(bbox, tables: List[Tuple[Tuple, str]]) -> int | None:
+    """Index of the table that (mostly) contains the block, if any."""
+    best, best_ratio = None, TABLE_OVERLAP
+    for i, (tb, _) in enumerate(tables):
+        r = _overlap_ratio(bbox, tb)
+        if r >= best_ratio:
+            best, best_ratio = i, r
+    return best
 
 
 # ---------------------------------------------------------
@@ -80,80 +183,96 @@ def remove_footer_and_pagenum(text: str) -> str:
 # ---------------------------------------------------------
 # Main page extractor
 # ---------------------------------------------------------
-def extract_pages(pdf_path: Path) -> List[Dict]:
+def extract_pages(pdf_path: Path, table_mode: str = PDF_TABLE_MODE) -> Iterator[PageRecord]:
     """
-    Extracts structured information from each page:
+    Yields structured information for each page:
         - clean text (footer removed)
         - table text
         - block reading order
         - font-size aware headings
+
+    Pages are produced one at a time, so callers never hold a whole
+    document's blocks in memory.
+
+    table_mode:
+        "off"  – no table detection (fastest)
+        "auto" – find_tables() only on pages that look tabular
+        "all"  – find_tables() on every page
     """
+    if table_mode not in TABLE_MODES:
+        raise ValueError(f"table_mode must be one of {TABLE_MODES}, got {table_mode!r}")
+
+    file_name = pdf_path.name
+    source_uri = str(pdf_path.resolve())
     doc = fitz.open(pdf_path)
-    pages_out = []
+    try:
+        for page_index, page in enumerate(doc):
+            yield _extract_page(page, page_index, table_mode, file_name, source_uri)
+    finally:
+        doc.close()
 
-    for page_index, page in enumerate(doc):
-        blocks_raw = page.get_text("dict")["blocks"]
-        blocks_processed = []
 
-        for b in blocks_raw:
-            if "lines" not in b:
-                continue
+def _extract_page(page, page_index: int, table_mode: str, file_name: str, source_uri: str) -> PageRecord:
+    blocks_raw = page.get_text("dict")["blocks"]
+    blocks_processed: List[Block] = []
 
-            # Extract spans with font info
-            spans = []
-            txt = []
-            for l in b["lines"]:
-                for s in l["spans"]:
-                    spans.append(s)
-                    txt.append(s.get("text", ""))
+    # At most one find_tables() per page, reused for every block
+    tables: List[Tuple[Tuple, str]] = []
+    if table_mode == "all" or (table_mode == "auto" and likely_has_tables(blocks_raw)):
+        tables = find_page_tables(page)
 
-            text = "\n".join(txt).strip()
-            if not text:
-                continue
+    for b in blocks_raw:
+        if "lines" not in b:
+            continue
+
+        # Extract spans with font info (only needed to classify the block)
+        spans = []
+        txt = []
+        for l in b["lines"]:
+            for s in l["spans"]:
+                spans.append(s)
+                txt.append(s.get("text", ""))
 
-            # Clean text (remove page numbers)
-            clean_text = remove_footer_and_pagenum(text)
-
-            # Table extraction attempt
-            is_table = False
-            table_text = ""
-            try:
-                if b.get("type", 0) == 5:  # PyMuPDF table type
-                    is_table = True
-                    table_text = extract_table(page, b)
-            except Exception:
-                pass
-
-            block_type = classify_block({
-                "spans": spans,
-                "bbox": b.get("bbox")
-            })
-
-            blocks_processed.append({
-                "text": clean_text,
-                "raw_text": text,
-                "block_type": "table" if is_table else block_type,
-                "bbox": b.get("bbox"),
-                "font_sizes": [s.get("size", 0) for s in spans],
-                "spans": spans,
-                "table_text": table_text,
-            })
-
-        # Combine block texts in reading order
-        full_text = []
-        for b in blocks_processed:
-            if b["block_type"] == "table" and b["table_text"]:
-                full_text.append(b["table_text"])
-            else:
-                full_text.append(b["text"])
-
-        pages_out.append({
-            "page": page_index + 1,
-            "text": "\n\n".join(t for t in full_text if t.strip()),
-            "blocks": blocks_processed,
-            "file_name": pdf_path.name,
-            "source_uri": str(pdf_path.resolve())
+        text = "\n".join(txt).strip()
+        if not text:
+            continue
+
+        # Clean text (remove page numbers)
+        clean_text = remove_footer_and_pagenum(text)
+
+        # Block inside a detected table (bbox overlap, not equality)
+        table_id = match_table(b["bbox"], tables) if tables else None
+
+        block_type = classify_block({
+            "spans": spans,
+            "bbox": b.get("bbox"),
+            "table": table_id is not None,
         })
 
-    doc.close()
-    return pages_out
\ No newline at end of file
+        blocks_processed.append(Block(
+            clean_text,
+            block_type,
+            tuple(b["bbox"]),
+            table_id,
+            tables[table_id][1] if table_id is not None else "",
+        ))
+
+    # Combine block texts in reading order; a table is emitted once,
+    # at its first block, and replaces the text of all its blocks
+    full_text = []
+    emitted = set()
+    for b in blocks_processed:
+        if b.table_id is not None and b.table_text:
+            if b.table_id not in emitted:
+                emitted.add(b.table_id)
+                full_text.append(b.table_text)
+        else:
+            full_text.append(b.text)
+
+    return PageRecord(
+        page=page_index + 1,
+        text="\n\n".join(t for t in full_text if t.strip()),
+        blocks=blocks_processed,
+        file_name=file_name,
+        source_uri=source_uri,
+    )
@@ -1,7 +1,46 @@
 # src/vectordb.py
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
 import chromadb
 from chromadb.config import Settings
-from typing import List, Dict
+from typing import List, Dict, Tuple
+
+from .embeddings import (
+    EmbeddingBackend,
+    ChromaDefaultBackend,
+    BackendEmbeddingFunction,
+    get_backend,
+)
+
+# Collection metadata keys guarding against mixing embedding models
+MODEL_KEY = "embedding_model"
+DIM_KEY = "embedding_dim"
+
+# collection id -> backend attached by get_collection
+_BACKENDS: Dict[str, EmbeddingBackend] = {}
+
+# collection id -> client.get_max_batch_size() (records per add/upsert/delete)
+_BATCH_LIMITS: Dict[str, int] = {}
+DEFAULT_BATCH_LIMIT = 5000
+
+# Parallel shard queries when a list of collections is searched
+SHARD_QUERY_WORKERS = 8
+
+# In-process LRU of query embeddings: (backend name, query) -> vector
+QUERY_CACHE_SIZE = 4096
+QUERY_BATCH_SIZE = 256
+_query_cache: "OrderedDict[tuple, List[float]]" = OrderedDict()
+_query_cache_lock = threading.Lock()
+
+# IDs matching a metadata filter (BM25 side of hybrid retrieval):
+# (collection id, count, where) -> IDs. Dropped on every write through this
+# module; the count catches adds / deletes made by another process.
+_matching_cache: Dict[Tuple[str, int, str], frozenset] = {}
+_matching_lock = threading.Lock()
 
 
 def get_client(persist_dir: str):
@@ -17,47 +56,416 @@ def get_client(persist_dir: str):
         )
 
 
-def get_collection(client, name: str = "reports"):
-    """Create or get a collection using cosine similarity."""
-    return client.get_or_create_collection(
-        name=name,
-        metadata={"hnsw:space": "cosine"},
-    )
+def get_collection(client, name: str = "reports", backend: EmbeddingBackend | None = None):
+    """
+    Create or get a collection using cosine similarity, with an embedding
+    backend attached (EMBEDDING_BACKEND by default).
+    Refuses collections built with a different embedding model.
+    """
+    backend = backend or get_backend()
+    kwargs = {}
+    if not isinstance(backend, ChromaDefaultBackend):
+        kwargs["embedding_function"] = BackendEmbeddingFunction(backend)
+
+    try:
+        col = client.get_or_create_collection(
+            name=name,
+            metadata={"hnsw:space": "cosine", MODEL_KEY: backend.name},
+            **kwargs,
+        )
+    except ValueError as e:
+        raise ValueError(
+            f"Collection '{name}' was built with another embedding function ({e}). "
+            f"Re-ingest into a fresh --db or set EMBEDDING_BACKEND to match."
+        ) from e
+
+    recorded = (col.metadata or {}).get(MODEL_KEY)
+    if recorded is None and col.count() > 0 and not isinstance(backend, ChromaDefaultBackend):
+        raise ValueError(
+            f"Collection '{name}' predates embedding-model tracking and was built with "
+            f"Chroma's default MiniLM. Use EMBEDDING_BACKEND=chroma or re-ingest."
+        )
+    if recorded is not None and recorded != backend.name:
+        raise ValueError(
+            f"Collection '{name}' was embedded with '{recorded}', not '{backend.name}'. "
+            f"Re-ingest or switch EMBEDDING_BACKEND/EMBEDDING_MODEL back."
+        )
+
+    _BACKENDS[str(col.id)] = backend
+    try:
+        _BATCH_LIMITS[str(col.id)] = int(client.get_max_batch_size())
+    except Exception:
+        _BATCH_LIMITS[str(col.id)] = DEFAULT_BATCH_LIMIT
+    return col
+
+
+def backend_for(collection) -> EmbeddingBackend:
+    """Backend attached to this collection by get_collection."""
+    backend = _BACKENDS.get(str(collection.id))
+    if backend is None:
+        backend = get_backend()
+        _BACKENDS[str(collection.id)] = backend
+    return backend
+
+
+def _modify_metadata(collection, updates: Dict):
+    # hnsw:* keys are immutable after creation and must not be resent
+    meta = {k: v for k, v in (collection.metadata or {}).items() if not k.startswith("hnsw:")}
+    meta.update(updates)
+    collection.modify(metadata=meta)
+
+
+def _check_dimension(collection, backend: EmbeddingBackend, dim: int):
+    """Record the embedding dimension on first write, refuse a different one later."""
+    meta = collection.metadata or {}
+    recorded = meta.get(DIM_KEY)
+    if recorded is None:
+        _modify_metadata(collection, {MODEL_KEY: backend.name, DIM_KEY: dim})
+    elif int(recorded) != dim:
+        raise ValueError(
+            f"Embedding dimension {dim} from '{backend.name}' does not match the "
+            f"collection's recorded dimension {recorded}."
+        )
+
+
+def _batches(n: int, collection):
+    """Slices of at most the client's max batch size."""
+    step = _BATCH_LIMITS.get(str(collection.id), DEFAULT_BATCH_LIMIT)
+    return (slice(i, i + step) for i in range(0, n, step))
 
 
-def upsert_chunks(collection, chunks: List[Dict]):
+def chunk_id(chunk: Dict, seen: Dict[str, int] | None = None) -> str:
     """
-    Upsert chunk documents into Chroma and let Chroma handle embeddings
-    with its built-in MiniLM model.
+    Content-derived ID: source path (relative to the reports directory,
+    the file name for top-level files) + page span + hash of the whitespace-
+    normalized text. Unchanged chunks keep their ID when anything else in
+    the document moves. `seen` (one dict per file) numbers repeated
+    identical chunks on the same pages: "<id>", "<id>#2", ...
     """
+    start = chunk.get("page_start", chunk["page"])
+    end = chunk.get("page_end", start)
+    source = chunk.get("source_path") or chunk["file_name"]
+    norm = " ".join(chunk["text"].split())
+    digest = hashlib.sha256(f"{source}\x1f{start}-{end}\x1f{norm}".encode("utf-8")).hexdigest()[:20]
+    cid = f"{source}::{start}-{end}::{digest}"
+    if seen is not None:
+        n = seen.get(cid, 0)
+        seen[cid] = n + 1
+        if n:
+            cid = f"{cid}#{n + 1}"
+    return cid
+
+
+def prepare_chunks(chunks: List[Dict], seen: Dict[str, int] | None = None) -> Tuple[List[str], List[str], List[Dict]]:
+    """
+    (ids, documents, metadatas) for the non-empty chunks. Pass the same
+    `seen` dict for every batch of one PDF (see chunk_id).
+    """
+    seen = {} if seen is None else seen
     ids, docs, metas = [], [], []
-    for i, ch in enumerate(chunks):
+    for ch in chunks:
         text = ch["text"]
         if not text.strip():
             # skip empty chunks
             print(f"[WARN] Skipping empty chunk for file {ch['file_name']} page {ch['page']}")
             continue
 
-        ids.append(f"{ch['file_name']}::{ch['page']}::{i}")
+        ids.append(chunk_id(ch, seen))
         docs.append(text)
         metas.append({k: v for k, v in ch.items() if k != "text"})
+    return ids, docs, metas
+
+
+def existing_chunks(collection, ids: List[str]) -> Dict[str, Dict]:
+    """{id: metadata} for the given IDs already stored in the collection."""
+    found: Dict[str, Dict] = {}
+    for part in _batches(len(ids), collection):
+        got = collection.get(ids=ids[part], include=["metadatas"])
+        found.update(zip(got["ids"], got["metadatas"]))
+    return found
+
+
+def write_chunks(collection, ids: List[str], docs: List[str], metas: List[Dict], embeddings: List[List[float]]):
+    """Upsert already-embedded chunks (the single-writer end of ingest), batched."""
+    if not ids:
+        return
+    _check_dimension(collection, backend_for(collection), len(embeddings[0]))
+    _forget_matching(collection)
+    for part in _batches(len(ids), collection):
+        collection.upsert(
+            ids=ids[part],
+            documents=docs[part],
+            metadatas=metas[part],
+            embeddings=embeddings[part],
+        )
+
+
+def update_metadata(collection, ids: List[str], metas: List[Dict]):
+    """Rewrite metadata only (text and vector unchanged), batched."""
+    _forget_matching(collection)
+    for part in _batches(len(ids), collection):
+        collection.update(ids=ids[part], metadatas=metas[part])
+
+
+def upsert_chunks(collection, chunks: List[Dict]) -> List[str]:
+    """
+    Upsert chunk documents into Chroma with embeddings precomputed by the
+    collection's embedding backend. Chunks already stored under the same
+    content ID are not re-embedded.
+    Returns the IDs of all given chunks (recorded by the ingest manifest).
+    """
+    ids, docs, metas = prepare_chunks(chunks)
 
     if not docs:
         print("[WARN] No non-empty chunks to upsert.")
-        return
+        return []
 
-    collection.add(
-        ids=ids,
-        documents=docs,
-        metadatas=metas,
-    )
+    stored = existing_chunks(collection, ids)
+    new = [k for k, cid in enumerate(ids) if cid not in stored]
+    if new:
+        embeddings = backend_for(collection).embed_documents([docs[k] for k in new])
+        write_chunks(collection, [ids[k] for k in new], [docs[k] for k in new],
+                     [metas[k] for k in new], embeddings)
+    changed = [k for k, cid in enumerate(ids) if cid in stored and stored[cid] != metas[k]]
+    if changed:
+        update_metadata(collection, [ids[k] for k in changed], [metas[k] for k in changed])
+    return ids
+
+
+def delete_chunks(collection, ids: List[str] | None = None, where: dict | None = None):
+    """Delete chunks by ID list (batched) and/or metadata filter."""
+    _forget_matching(collection)
+    if ids:
+        for part in _batches(len(ids), collection):
+            collection.delete(ids=ids[part])
+    if where:
+        collection.delete(where=where)
+
+
+def and_where(*clauses: dict | None) -> dict | None:
+    """Combine metadata filters with $and (None clauses are ignored)."""
+    clauses = [c for c in clauses if c]
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def embed_queries(collection, queries: List[str]) -> List[List[float]]:
+    """
+    Query embeddings via the collection's backend, reusing ones computed
+    earlier in this process (the backend may also hit its on-disk cache).
+    """
+    backend = backend_for(collection)
+    found: Dict[str, List[float]] = {}
+    with _query_cache_lock:
+        for q in queries:
+            key = (backend.name, q)
+            if key in _query_cache:
+                _query_cache.move_to_end(key)
+                found[q] = _query_cache[key]
+
+    missing = list(dict.fromkeys(q for q in queries if q not in found))
+    if missing:
+        fresh = dict(zip(missing, backend.embed_queries(missing)))
+        found.update(fresh)
+        with _query_cache_lock:
+            for q, emb in fresh.items():
+                _query_cache[(backend.name, q)] = emb
+            while len(_query_cache) > QUERY_CACHE_SIZE:
+                _query_cache.popitem(last=False)
+
+    return [found[q] for q in queries]
+
+
+def _shards(collection) -> List:
+    """A collection or a list of shard collections → list of collections."""
+    return list(collection) if isinstance(collection, (list, tuple)) else [collection]
+
+
+def query_batch(
+    collection,
+    queries: List[str] | None = None,
+    n: int = 8,
+    where: dict | None = None,
+    embeddings: List[List[float]] | None = None,
+    include: List[str] | None = None,
+) -> List[Dict]:
+    """
+    Retrieve top-n hits for many queries (texts or precomputed embeddings)
+    in as few Chroma round trips as possible. `collection` may be a list
+    of shards: every shard is searched and the n closest hits are kept.
+
+    Returns one dict per query: {"ids", "documents", "metadatas", "distances"}
+    (flat lists, same order as the input queries).
+    """
+    shards = _shards(collection)
+    if not shards:
+        return []
+    if embeddings is None:
+        embeddings = embed_queries(shards[0], queries or [])
+    if not embeddings:
+        return []
+
+    include = include or ["documents", "metadatas", "distances"]
+    if len(shards) > 1:
+        return _fanout_query(shards, embeddings, n, where, include)
+
+    out: List[Dict] = []
+    for start in range(0, len(embeddings), QUERY_BATCH_SIZE):
+        res = shards[0].query(
+            query_embeddings=embeddings[start:start + QUERY_BATCH_SIZE],
+            n_results=n,
+            where=where,
+            include=include,
+        )
+        for j in range(len(res["ids"])):
+            hit = {"ids": res["ids"][j]}
+            for key in include:
+                values = res.get(key)
+                hit[key] = values[j] if values is not None else []
+            out.append(hit)
+    return out
+
+
+def _fanout_query(shards: List, embeddings: List[List[float]], n: int, where: dict | None,
+                  include: List[str]) -> List[Dict]:
+    """Query every shard in parallel and merge per query by distance (top-n)."""
+    keys = list(dict.fromkeys(list(include) + ["distances"]))
+
+    def one(col):
+        return query_batch(col, n=n, where=where, embeddings=embeddings, include=keys)
+
+    with ThreadPoolExecutor(max_workers=min(len(shards), SHARD_QUERY_WORKERS)) as pool:
+        per_shard = list(pool.map(one, shards))
+
+    out: List[Dict] = []
+    for j in range(len(embeddings)):
+        rows = []
+        for hits in per_shard:
+            hit = hits[j]
+            for k, cid in enumerate(hit["ids"]):
+                rows.append((hit["distances"][k], cid, {key: hit[key][k] for key in include}))
+        rows.sort(key=lambda r: r[0])
+        rows = rows[:n]
+        merged = {"ids": [cid for _, cid, _ in rows]}
+        for key in include:
+            merged[key] = [r[key] for _, _, r in rows]
+        out.append(merged)
+    return out
 
 
 def query(collection, q: str, n: int = 8, where: dict | None = None):
     """Query the vector DB using a text query and optional filters."""
-    return collection.query(
-        query_texts=[q],
-        n_results=n,
-        where=where,
-        include=["documents", "metadatas", "distances"],
-    )
\ No newline at end of file
+    if len(_shards(collection)) == 1:
+        col = _shards(collection)[0]
+        return col.query(
+            query_embeddings=embed_queries(col, [q]),
+            n_results=n,
+            where=where,
+            include=["documents", "metadatas", "distances"],
+        )
+    # shard fan-out, returned in Chroma's nested (per-query) layout
+    hit = query_batch(collection, [q], n=n, where=where)[0]
+    return {key: [hit[key]] for key in ("ids", "documents", "metadatas", "distances")}
+
+
+def get_by_ids(collection, ids: List[str], where: dict | None = None,
+               include: List[str] | None = None) -> Dict:
+    """collection.get(ids=...) over one collection or a list of shards."""
+    include = include or ["documents", "metadatas"]
+    out: Dict[str, List] = {"ids": [], **{key: [] for key in include}}
+    for col in _shards(collection):
+        got = col.get(ids=ids, where=where, include=include)
+        out["ids"].extend(got["ids"])
+        for key in include:
+            values = got.get(key)   # embeddings come back as a numpy array
+            if values is not None:
+                out[key].extend(values)
+    return out
+
+
+def _forget_matching(collection):
+    cid = str(collection.id)
+    with _matching_lock:
+        for key in [k for k in _matching_cache if k[0] == cid]:
+            del _matching_cache[key]
+
+
+def matching_ids(collection, where: dict) -> set:
+    """
+    IDs of every chunk matching `where`, over one collection or a list of
+    shards. Cached per (collection, where) until the collection is written.
+    """
+    ids = set()
+    clause = json.dumps(where, sort_keys=True)
+    for col in _shards(collection):
+        key = (str(col.id), col.count(), clause)
+        with _matching_lock:
+            hit = _matching_cache.get(key)
+        if hit is None:
+            hit = frozenset(col.get(where=where, include=[])["ids"])
+            with _matching_lock:
+                _matching_cache[key] = hit
+        ids.update(hit)
+    return ids
+
+
+def hybrid_query_batch(
+    collection,
+    lexical,
+    queries: List[str],
+    n: int = 8,
+    where: dict | None = None,
+    rrf_k: int = 60,
+) -> List[Dict]:
+    """
+    Hybrid retrieval: vector hits and BM25 hits (lexical.LexicalIndex)
+    fused with reciprocal rank fusion, score = sum 1 / (rrf_k + rank).
+
+    `collection` may be a list of shards (see query_batch). With a
+    `where` filter, BM25 only ranks the chunks matching it, so the lexical
+    side is not spent on hits the filter would discard. The lexical index
+    applies filters on the metadata it keeps itself (file, quantity tag);
+    only other filters, or an index built before it kept metadata, fall
+    back to the IDs matching `where` in Chroma (cached per (collection,
+    where) until the collection is written).
+
+    Returns one dict per query like query_batch, ordered by fused score,
+    with an extra "scores" list (higher is better). Lexical-only hits
+    have distance None.
+    """
+    vec_hits = query_batch(collection, queries, n=n * 2, where=where)
+    lex_where, allowed = None, None
+    if where and lexical.supports(where):
+        lex_where = where
+    elif where:
+        allowed = matching_ids(collection, where)
+    out: List[Dict] = []
+
+    for q, vh in zip(queries, vec_hits):
+        docs = {cid: (d, m, dist) for cid, d, m, dist in
+                zip(vh["ids"], vh["documents"], vh["metadatas"], vh["distances"])}
+
+        lex = [cid for cid, _ in lexical.search(q, k=n * 4, allowed=allowed, where=lex_where)]
+        extra = [cid for cid in lex if cid not in docs]
+        if extra:
+            # fetch lexical-only chunks; `where` filters them like the vector side
+            got = get_by_ids(collection, extra, where=where)
+            for cid, d, m in zip(got["ids"], got["documents"], got["metadatas"]):
+                docs[cid] = (d, m, None)
+        lex = [cid for cid in lex if cid in docs]
+
+        fused: Dict[str, float] = {}
+        for ranking in (vh["ids"], lex):
+            for rank, cid in enumerate(ranking, start=1):
+                fused[cid] = fused.get(cid, 0.0) + 1.0 / (rrf_k + rank)
+
+        top = sorted(fused.items(), key=lambda kv: kv[1], reverse=True)[:n]
+        out.append({
+            "ids": [cid for cid, _ in top],
+            "documents": [docs[cid][0] for cid, _ in top],
+            "metadatas": [docs[cid][1] for cid, _ in top],
+            "distances": [docs[cid][2] for cid, _ in top],
+            "scores": [score for _, score in top],
+        })
+    return out
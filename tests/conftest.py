@@ -0,0 +1,28 @@
+import hashlib
+
+import pytest
+
+from src import shards
+from src.embeddings import EmbeddingBackend
+
+
+class FakeBackend(EmbeddingBackend):
+    """Deterministic hash embeddings (no Ollama); records what it embedded."""
+
+    kind = "fake"
+
+    def __init__(self):
+        super().__init__("hash")
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [[b / 255 for b in hashlib.sha256(t.encode()).digest()[:16]] for t in texts]
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    """A FakeBackend that ShardRouter (and so ingest) also picks up."""
+    fake = FakeBackend()
+    monkeypatch.setattr(shards, "get_backend", lambda: fake)
+    return fake
@@ -0,0 +1,98 @@
+from collections import Counter
+
+import pytest
+
+from src import chunking
+from src.chunking import chunk_page, count_tokens, estimate_tokens, set_token_counter
+
+
+def _record(text, page=1):
+    return {"text": text, "page": page, "file_name": "r.pdf", "source_uri": "/r.pdf"}
+
+
+@pytest.fixture(autouse=True)
+def _reset_counter():
+    set_token_counter(estimate_tokens, "estimate")
+    yield
+    set_token_counter(None)
+
+
+def test_estimate_is_default_shape():
+    assert count_tokens("a" * 40) == 10
+    assert count_tokens("") == 1
+
+
+def test_chunks_respect_budget_and_overlap():
+    paras = [f"Paragraph {i} " + "x" * 80 for i in range(10)]   # ~23 tokens each
+    chunks = chunk_page(_record("\n\n".join(paras)), chunk_size=60, overlap_tokens=25)
+
+    assert len(chunks) > 1
+    for ch in chunks:
+        assert sum(count_tokens(p) for p in ch["text"].split("\n\n")) <= 60
+    # the last paragraph of a chunk opens the next one
+    for a, b in zip(chunks, chunks[1:]):
+        assert b["text"].split("\n\n")[0] == a["text"].split("\n\n")[-1]
+
+
+def test_each_paragraph_counted_once(monkeypatch):
+    # count calls to count_tokens itself: its lru_cache would hide repeats
+    calls = Counter()
+    uncached = chunking.count_tokens.__wrapped__
+
+    def counting(text):
+        calls[text] += 1
+        return uncached(text)
+
+    monkeypatch.setattr(chunking, "count_tokens", counting)
+    paras = [f"Unique paragraph {i} " + "y" * 60 for i in range(12)]
+    chunk_page(_record("\n\n".join(paras)), chunk_size=50, overlap_tokens=30)
+
+    assert set(calls) == set(paras)
+    assert max(calls.values()) == 1
+
+
+def test_tokenizer_file_counter(tmp_path):
+    tokenizers = pytest.importorskip("tokenizers")
+    from tokenizers.models import WordLevel
+    from tokenizers.pre_tokenizers import Whitespace
+
+    tok = tokenizers.Tokenizer(WordLevel({"[UNK]": 0, "scope": 1}, unk_token="[UNK]"))
+    tok.pre_tokenizer = Whitespace()
+    path = tmp_path / "tok.json"
+    tok.save(str(path))
+
+    counter = chunking.load_tokenizer_counter(path)
+    set_token_counter(counter, "tokenizer:tok.json")
+    assert count_tokens("Scope 1 emissions were 25 Mt") == 6   # estimate would say 7
+    assert chunking.token_counter_name() == "tokenizer:tok.json"
+
+
+def test_document_chunks_span_pages_and_keep_section():
+    from src.chunking import chunk_document
+
+    pages = [
+        _record("2 Climate Strategy\n\n" + "A" * 100, page=1),
+        _record("B" * 100, page=2),
+        _record("C" * 400, page=3),
+    ]
+    chunks = list(chunk_document(pages, chunk_size=60, overlap_tokens=0))
+
+    assert (chunks[0]["page_start"], chunks[0]["page_end"]) == (1, 2)
+    assert chunks[0]["page"] == 1
+    assert all(ch["section_path"] == "2 Climate Strategy" for ch in chunks)
+    assert chunks[-1]["page_start"] == 3
+
+
+def test_paragraph_broken_by_page_is_rejoined():
+    from src.chunking import chunk_document
+
+    pages = [
+        _record("Scope 1 emissions fell because the fleet", page=4),
+        _record("used less fuel in 2023.\n\nNext paragraph.", page=5),
+    ]
+    chunks = list(chunk_document(pages, chunk_size=1000, overlap_tokens=0))
+
+    assert len(chunks) == 1
+    assert "the fleet used less fuel in 2023." in chunks[0]["text"]
+    assert (chunks[0]["page_start"], chunks[0]["page_end"]) == (4, 5)
+
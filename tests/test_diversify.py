@@ -0,0 +1,43 @@
+from src.chunking import chunk_page
+from src.diversify import diversify
+
+
+def _record(text, page=1):
+    return {"text": text, "page": page, "file_name": "r.pdf", "source_uri": "/r.pdf"}
+
+
+def test_overlapping_chunks_are_suppressed_without_losing_paragraphs():
+    paras = [f"Paragraph {i} " + "x" * 80 for i in range(10)]
+    chunks = chunk_page(_record("\n\n".join(paras)), chunk_size=60, overlap_tokens=25)
+    docs = [ch["text"] for ch in chunks]
+
+    kept = diversify(docs, None, None, target=0)
+
+    assert len(kept) < len(docs)
+    assert {p for k in kept for p in docs[k].split("\n\n")} == set(paras)
+
+
+def test_mostly_covered_chunk_with_a_unique_paragraph_is_kept():
+    a, b, c = ("A" * 100, "B" * 100, "C" * 60)
+    docs = [f"{a}\n\n{b}", f"{a}\n\n{b}\n\n{c}"]   # second: 77% already picked, but C is only there
+
+    assert diversify(docs, None, None, target=0) == [0, 1]
+    assert diversify(docs, None, None, target=1) == [0]
+
+
+def test_mmr_prefers_a_novel_chunk_over_a_near_copy():
+    docs = ["Scope 1 emissions 2023", "Scope 1 emissions 2023 (restated)", "Scope 2 market-based"]
+    embeddings = [[1.0, 0.0, 0.0], [0.99, 0.14, 0.0], [0.7, 0.0, 0.71]]
+    query = [[1.0, 0.05, 0.3]]
+
+    assert diversify(docs, embeddings, query, target=2, diversity=0.0) == [0, 1]
+    assert diversify(docs, embeddings, query, target=2, diversity=0.5) == [0, 2]
+
+
+def test_relevance_scores_replace_query_similarity():
+    docs = ["first", "second", "third"]
+    embeddings = [[1.0, 0.0], [0.0, 1.0], [0.7, 0.7]]
+
+    kept = diversify(docs, embeddings, [[1.0, 0.0]], target=1, relevance=[0.1, 5.0, 2.0])
+
+    assert kept == [1]
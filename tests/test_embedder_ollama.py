@@ -0,0 +1,129 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import requests
+
+from src import embedder_ollama
+from src.embedder_ollama import EmbeddingCache, text_hash
+
+
+def _clock(monkeypatch, start: float = 1000.0, sleeps: list | None = None):
+    """
+    Patch the module clock; returns a one-element list to move time with.
+    Backoff sleeps return at once and are recorded in `sleeps`.
+    """
+    now = [start]
+    record = sleeps.append if sleeps is not None else (lambda s: None)
+    monkeypatch.setattr(embedder_ollama, "time", SimpleNamespace(time=lambda: now[0], sleep=record))
+    return now
+
+
+# ---------------------------------------------------------
+# Embedding cache
+# ---------------------------------------------------------
+def test_cache_keeps_the_most_recently_used_vectors(tmp_path, monkeypatch):
+    now = _clock(monkeypatch)
+    cache = EmbeddingCache(str(tmp_path / "emb.sqlite"), max_entries=2)
+    for key in ("a", "b"):
+        cache.put_many("m", {key: [1.0, 0.0]})
+        now[0] += 1
+
+    assert set(cache.get_many("m", ["a"])) == {"a"}   # "b" is now the least recently used
+    now[0] += 1
+    cache.put_many("m", {"c": [0.0, 1.0]})
+
+    assert set(cache.get_many("m", ["a", "b", "c"])) == {"a", "c"}
+    assert cache.get_many("other-model", ["a"]) == {}
+    assert cache.stats() == {"hits": 3, "misses": 2}
+    cache.close()
+
+
+def test_embed_texts_sends_only_misses_and_counts_them(tmp_path, monkeypatch):
+    cache = EmbeddingCache(str(tmp_path / "emb.sqlite"), max_entries=10)
+    monkeypatch.setattr(embedder_ollama, "_cache", cache)
+    sent = []
+
+    def fake_uncached(texts, model, batch_size, concurrency):
+        sent.append(list(texts))
+        return [[float(len(t)), 0.0] for t in texts]
+
+    monkeypatch.setattr(embedder_ollama, "_embed_uncached", fake_uncached)
+
+    assert embedder_ollama.embed_texts(["aa", "b", "aa"], model="m") == [[2.0, 0.0], [1.0, 0.0], [2.0, 0.0]]
+    assert embedder_ollama.embed_texts(["b", "ccc"], model="m") == [[1.0, 0.0], [3.0, 0.0]]
+
+    assert sent == [["aa", "b"], ["ccc"]]
+    assert cache.stats() == {"hits": 1, "misses": 3}
+    assert set(cache.get_many("m", [text_hash(t) for t in ("aa", "b", "ccc")])) == {
+        text_hash(t) for t in ("aa", "b", "ccc")
+    }
+    cache.close()
+
+
+# ---------------------------------------------------------
+# Batched /api/embed client
+# ---------------------------------------------------------
+class _Response:
+    def __init__(self, status: int, body=None):
+        self.status_code = status
+        self.ok = status < 400
+        self.text = str(body)
+        self._body = body
+
+    def json(self):
+        return self._body
+
+
+class _FlakyServer:
+    """
+    Fake /api/embed: answers 503 on the first call and times out on the
+    second, then embeds each text "tN" as [N]. Tracks requests in flight.
+    """
+
+    def __init__(self):
+        self.batches = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def post(self, url, json, timeout):
+        with self._lock:
+            self.batches.append(list(json["input"]))
+            call = len(self.batches)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(0.02)   # keep requests overlapping
+            if call == 1:
+                return _Response(503, "busy")
+            if call == 2:
+                raise requests.Timeout("read timed out")
+            return _Response(200, {"embeddings": [[float(t[1:])] for t in json["input"]]})
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+def test_batches_are_retried_with_backoff_and_returned_in_order(monkeypatch):
+    server, sleeps = _FlakyServer(), []
+    _clock(monkeypatch, sleeps=sleeps)
+    monkeypatch.setattr(embedder_ollama, "_session", server)
+    texts = [f"t{k}" for k in range(10)]
+
+    embs = embedder_ollama.embed_texts(texts, model="m", batch_size=3, concurrency=2, use_cache=False)
+
+    assert embs == [[float(k)] for k in range(10)]
+    # 4 batches of at most 3 texts, 2 of those sent twice
+    assert sorted(map(len, server.batches)) == [1, 3, 3, 3, 3, 3]
+    assert server.max_in_flight <= 2
+    # one jittered sleep per failed attempt, within the exponential cap
+    assert len(sleeps) == 2
+    assert all(0 <= s <= 0.5 * 2 ** 1 for s in sleeps)
+
+
+def test_backoff_is_jittered_and_capped():
+    for attempt in range(8):
+        delays = {embedder_ollama._backoff(attempt) for _ in range(20)}
+        assert len(delays) > 1
+        assert all(0 <= d <= min(8.0, 0.5 * 2 ** attempt) for d in delays)
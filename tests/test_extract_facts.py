@@ -0,0 +1,143 @@
+import json
+import re
+import time
+
+from src import extract_facts
+from src.config import LLM_OUTPUT_PER_CHUNK, LLM_OUTPUT_RESERVE
+from src.extract_facts import DEFAULT_COMPANY_LABEL, DEFAULT_YEAR_LABEL, _extract_pack, _file_filter, _labels
+from src.manifest import IngestManifest
+from src.packing import Evidence
+
+
+def _catalog(tmp_path):
+    manifest = IngestManifest(str(tmp_path))
+    for name in ["maersk-crp-2025.pdf", "APM-Maersk_SIZ-2023-Report-Card.pdf"]:
+        manifest.record(name, name, name, 1, 0.0, "v", ["id"], collection="reports")
+    manifest.close()
+    return str(tmp_path)
+
+
+def test_company_and_year_select_reports(tmp_path):
+    where, shards, names = _file_filter(_catalog(tmp_path), None, "Maersk", 2023)
+
+    assert names == ["APM-Maersk_SIZ-2023-Report-Card.pdf"]
+    assert where is not None and shards == ["reports"]
+
+
+def test_unmatched_labels_search_all_reports(tmp_path):
+    assert _file_filter(_catalog(tmp_path), None, "Unknown Co.", 2024) == (None, ["reports"], [])
+
+
+def test_no_labels_search_all_reports(tmp_path):
+    assert _file_filter(_catalog(tmp_path), None, None, None) == (None, ["reports"], [])
+
+
+
+def test_omitted_labels_come_from_the_selected_reports(tmp_path):
+    db = _catalog(tmp_path)
+    assert _labels(db, [], None, None) == ("maersk", DEFAULT_YEAR_LABEL)   # the two reports' years differ
+    assert _labels(db, ["maersk-crp-2025.pdf"], None, None) == ("maersk", 2025)
+    assert _labels(db, ["maersk-crp-2025.pdf"], "A.P. Moller - Maersk", None) == ("A.P. Moller - Maersk", 2025)
+    assert _labels(db, [], "Acme", 2023) == ("Acme", 2023)
+    assert _labels(str(tmp_path / "no-db"), [], None, None) == (DEFAULT_COMPANY_LABEL, DEFAULT_YEAR_LABEL)
+
+def _answer_budget(monkeypatch, n_chunks: int, num_ctx: int) -> int:
+    """max_tokens that _extract_pack asks for on a pack of n_chunks."""
+    calls = []
+    monkeypatch.setattr(extract_facts, "generate_json", lambda **kw: calls.append(kw) or {"facts": []})
+    pack = [Evidence(k, f"Scope {k} emissions: {k}0 t", {"page": k, "file_name": "a.pdf"}) for k in range(1, n_chunks + 1)]
+    _extract_pack(1, 1, pack, "system", "Acme", 2023, structured=False, num_ctx=num_ctx)
+    return calls[0]["max_tokens"]
+
+
+def test_answer_budget_grows_with_the_pack(monkeypatch):
+    assert _answer_budget(monkeypatch, 1, 32768) == LLM_OUTPUT_RESERVE
+    assert _answer_budget(monkeypatch, 4, 32768) == 4 * LLM_OUTPUT_PER_CHUNK
+    assert _answer_budget(monkeypatch, 8, 32768) == 8 * LLM_OUTPUT_PER_CHUNK
+
+
+def test_answer_budget_is_capped_by_the_context_window(monkeypatch):
+    assert 0 < _answer_budget(monkeypatch, 8, 4096) < 4096
+
+
+def _pack():
+    return [Evidence(k, f"Scope {k} emissions: {k}0 kt", {"page": 10 + k, "file_name": "a.pdf"}) for k in (1, 2)]
+
+
+def _fact(text: str, **fields):
+    return {"text": text, "confidence": "high", "fact_type": "claim", **fields}
+
+
+def test_only_invalid_facts_are_sent_for_repair(monkeypatch):
+    answers = [
+        {"facts": [
+            _fact("Scope 1 emissions: 10 kt", chunk=1),
+            {"text": "Scope 2 emissions: 20 kt", "chunk": 2, "fact_type": "claim"},   # no confidence
+            _fact("Scope 2 base year 2019", chunk="two", confidence="certain"),        # bad chunk and confidence
+        ]},
+        {"facts": [
+            _fact("Scope 2 emissions: 20 kt", chunk=2, confidence="medium"),
+            _fact("Scope 2 base year 2019", chunk="two"),                               # still invalid
+        ]},
+    ]
+    calls = []
+    monkeypatch.setattr(extract_facts, "generate_json", lambda **kw: calls.append(kw) or answers[len(calls) - 1])
+
+    facts = _extract_pack(1, 1, _pack(), "system", "Acme", 2023, structured=True, num_ctx=8192)
+
+    assert [(f["text"], f["page"], f["confidence"]) for f in facts] == [
+        ("Scope 1 emissions: 10 kt", 11, "high"),
+        ("Scope 2 emissions: 20 kt", 12, "medium"),
+    ]
+    assert len(calls) == 2
+    repair_prompt = calls[1]["user_prompt"]
+    assert "Scope 1 emissions" not in repair_prompt
+    assert "Scope 2 emissions: 20 kt" in repair_prompt and "Scope 2 base year 2019" in repair_prompt
+    assert calls[1]["system_prompt"] == extract_facts.REPAIR_SYSTEM_PROMPT
+
+
+def test_failed_repair_keeps_the_valid_facts(monkeypatch):
+    def generate(**kw):
+        if kw["system_prompt"] == extract_facts.REPAIR_SYSTEM_PROMPT:
+            raise ValueError("Model returned invalid JSON.")
+        return {"facts": [_fact("Scope 1 emissions: 10 kt", chunk=1), {"text": "Scope 2", "chunk": 2}]}
+
+    monkeypatch.setattr(extract_facts, "generate_json", generate)
+
+    facts = _extract_pack(1, 1, _pack(), "system", "Acme", 2023, structured=True, num_ctx=8192)
+    assert [f["text"] for f in facts] == ["Scope 1 emissions: 10 kt"]
+
+
+def _run_extraction(tmp_path, monkeypatch, concurrency: int):
+    """extract_facts over 8 stubbed chunks; later packs answer first. Returns the saved facts."""
+    docs = [f"Site {k} emitted {k}0 kt CO2e" for k in range(8)]
+    metas = [{"page": k, "file_name": "a.pdf"} for k in range(8)]
+    monkeypatch.setattr(extract_facts, "_file_filter", lambda *a: (None, ["reports"], []))
+    monkeypatch.setattr(extract_facts, "open_shards", lambda *a: [])
+    monkeypatch.setattr(extract_facts, "_retrieve", lambda *a, **kw: ([f"a::{k}" for k in range(8)], docs, metas))
+    monkeypatch.setattr(extract_facts, "_diversify", lambda col, q, ids, *a, **kw: list(range(len(ids))))
+
+    def generate(user_prompt, **kw):
+        numbers = [int(n) for n in re.findall(r"\[chunk: (\d+)", user_prompt)]
+        time.sleep(0.05 / numbers[0])   # the first pack is the slowest
+        return {"facts": [
+            _fact(f"fact {n}.{j}", chunk=n, confidence=("high", "low")[j]) for n in numbers for j in (0, 1)
+        ]}
+
+    monkeypatch.setattr(extract_facts, "generate_json", generate)
+    prompt, out = tmp_path / "prompt.md", tmp_path / f"facts-{concurrency}.json"
+    prompt.write_text("Extract facts.")
+    extract_facts.extract_facts(
+        str(tmp_path), "emissions", str(prompt), str(out), "Acme", 2023,
+        concurrency=concurrency, context_tokens=3000, retrieval="vector", quant_only=False,
+    )
+    return json.loads(out.read_text())["facts"]
+
+
+def test_concurrent_extraction_keeps_pack_order(tmp_path, monkeypatch):
+    parallel = _run_extraction(tmp_path, monkeypatch, concurrency=4)
+    serial = _run_extraction(tmp_path, monkeypatch, concurrency=1)
+
+    assert [f["text"] for f in parallel] == [f"fact {n}.{j}" for n in range(1, 9) for j in (0, 1)]
+    assert [f["page"] for f in parallel] == [k for k in range(8) for _ in (0, 1)]
+    assert parallel == serial
@@ -0,0 +1,357 @@
+import os
+import queue
+import sqlite3
+import threading
+from functools import partial
+from pathlib import Path
+
+import fitz
+import pytest
+
+from src import ingest, shards
+from src.lexical import INDEX_NAME as LEXICAL_NAME, LexicalIndex
+from src.manifest import IngestManifest
+from src.neardup import INDEX_NAME, NearDupIndex, file_where, minhash
+from src.vectordb import get_client, get_collection
+
+
+def _page(seed: int) -> str:
+    # ~600 tokens: one chunk per page with the default chunk size
+    return " ".join(f"Plant {seed} reported item{j} value {seed}{j} units." for j in range(60))
+
+
+def _pdf(path: Path, seeds, title: str = ""):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    doc = fitz.open()
+    for seed in seeds:
+        doc.new_page().insert_textbox(fitz.Rect(40, 40, 560, 800), _page(seed), fontsize=7)
+    doc.set_metadata({"title": title or path.name})
+    doc.save(path)
+
+
+def _stored(db: Path, backend, name: str = "reports"):
+    """{chunk_id: metadata} of one collection."""
+    got = get_collection(get_client(str(db)), name, backend=backend).get(include=["metadatas"])
+    return dict(zip(got["ids"], got["metadatas"]))
+
+
+def _index_rows(db: Path, table: str) -> int:
+    with sqlite3.connect(db / INDEX_NAME) as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def _ingest(reports: Path, db: Path):
+    ingest.ingest_reports(str(reports), str(db), workers=1)
+
+
+def _lexical_ids(db: Path) -> set:
+    with sqlite3.connect(db / LEXICAL_NAME) as conn:
+        return {r[0] for r in conn.execute("SELECT chunk_id FROM docs")}
+
+
+# ---------------------------------------------------------
+# Diff writes on re-ingest
+# ---------------------------------------------------------
+def test_reingest_embeds_only_new_chunks_and_deletes_vanished_ones(tmp_path, backend):
+    reports, db = tmp_path / "reports", tmp_path / "db"
+    _pdf(reports / "acme-2023.pdf", [1, 2, 3])
+    _ingest(reports, db)
+    before = set(_stored(db, backend))
+    assert len(before) == 3
+    assert _lexical_ids(db) == before
+
+    _pdf(reports / "acme-2023.pdf", [1, 4, 3], title="edited")
+    backend.embedded.clear()
+    _ingest(reports, db)
+
+    after = set(_stored(db, backend))
+    assert len(backend.embedded) == 1
+    assert "Plant 4 " in backend.embedded[0]
+    assert len(after - before) == 1
+    assert len(before - after) == 1
+    assert _lexical_ids(db) == after
+
+
+class _Interleaved(ingest._Parsers):
+    """Posts the PDFs' messages round-robin, like pool workers running side by side."""
+
+    def __init__(self, pdfs, out_q, workers):
+        self._stop = threading.Event()
+        self._futures = []
+
+        def run():
+            streams = []
+            for pdf, key in pdfs:
+                q = queue.Queue()
+                ingest.parse_to_queue(str(pdf), q, message_size=1, source_path=key)
+                streams.append([q.get() for _ in range(q.qsize())])
+            for k in range(max(map(len, streams))):
+                for msgs in streams:
+                    if k < len(msgs):
+                        out_q.put(msgs[k])
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+
+
+def test_same_named_file_in_flight_keeps_its_chunks(tmp_path, backend, monkeypatch):
+    reports, db = tmp_path / "reports", tmp_path / "db"
+    _pdf(reports / "a" / "acme-2023.pdf", [1, 2, 3])
+    _pdf(reports / "b" / "acme-2023.pdf", [4, 5, 6])
+    monkeypatch.setattr(ingest, "_Parsers", _Interleaved)
+
+    ingest.ingest_reports(str(reports), str(db), workers=1, write_batch=1)
+
+    stored = _stored(db, backend)
+    manifest = IngestManifest(str(db))
+    for key in ("a/acme-2023.pdf", "b/acme-2023.pdf"):
+        ids = {cid for cid, m in stored.items() if m["source_path"] == key}
+        assert len(ids) == 3
+        assert set(manifest.get(key)["chunk_ids"]) == ids
+    manifest.close()
+
+
+# ---------------------------------------------------------
+# Shard routing
+# ---------------------------------------------------------
+@pytest.mark.parametrize("shard_by, expected", [
+    ("company", {"acme-2022.pdf": "reports-acme", "acme-2023.pdf": "reports-acme", "zeta-2023.pdf": "reports-zeta"}),
+    ("year", {"acme-2022.pdf": "reports-2022", "acme-2023.pdf": "reports-2023", "zeta-2023.pdf": "reports-2023"}),
+])
+def test_chunks_land_in_their_shard(tmp_path, backend, monkeypatch, shard_by, expected):
+    reports, db = tmp_path / "reports", tmp_path / "db"
+    for k, name in enumerate(expected):
+        _pdf(reports / name, [k + 1])
+    monkeypatch.setattr(ingest, "SHARD_BY", shard_by)
+    monkeypatch.setattr(ingest, "ShardRouter", partial(shards.ShardRouter, shard_by=shard_by))
+
+    _ingest(reports, db)
+
+    names = set(expected.values())
+    assert set(shards.ShardRouter(get_client(str(db)), shard_by=shard_by).names()) == names
+    assert set(shards.registered_shards(str(db))) == names
+    for name in names:
+        files = {m["file_name"] for m in _stored(db, backend, name).values()}
+        assert files == {f for f, shard in expected.items() if shard == name}
+
+
+# ---------------------------------------------------------
+# Near-duplicate collapsing
+# ---------------------------------------------------------
+def test_near_duplicate_becomes_an_alias(tmp_path, backend):
+    reports, db = tmp_path / "reports", tmp_path / "db"
+    _pdf(reports / "acme-2023.pdf", [1, 2])
+    _pdf(reports / "acme-copy-2023.pdf", [1, 3])
+
+    _ingest(reports, db)
+
+    stored = _stored(db, backend)
+    assert len(stored) == 3
+    assert len(backend.embedded) == 3
+    assert _index_rows(db, "aliases") == 1
+    canonical = [m for m in stored.values() if m.get("dup_count")]
+    assert len(canonical) == 1
+    assert canonical[0]["source_files"] == ["acme-2023.pdf", "acme-copy-2023.pdf"]
+    assert canonical[0]["dup_sources"] == ["acme-2023.pdf#1-1", "acme-copy-2023.pdf#1-1"]
+
+
+def test_alias_is_promoted_when_its_canonical_file_is_removed(tmp_path, backend):
+    reports, db = tmp_path / "reports", tmp_path / "db"
+    _pdf(reports / "acme-2023.pdf", [1, 2])
+    _pdf(reports / "acme-copy-2023.pdf", [1, 3])
+    _ingest(reports, db)
+
+    (reports / "acme-2023.pdf").unlink()
+    _ingest(reports, db)
+
+    stored = _stored(db, backend)
+    assert {m["source_path"] for m in stored.values()} == {"acme-copy-2023.pdf"}
+    assert len(stored) == 2
+    assert _index_rows(db, "aliases") == 0
+    assert not any(m.get("dup_count") for m in stored.values())
+
+
+def test_dup_keys_are_cleared_when_the_copy_changes(tmp_path, backend):
+    reports, db = tmp_path / "reports", tmp_path / "db"
+    _pdf(reports / "acme-2023.pdf", [1, 2])
+    _pdf(reports / "acme-copy-2023.pdf", [1, 3])
+    _ingest(reports, db)
+
+    _pdf(reports / "acme-copy-2023.pdf", [4, 3], title="edited")
+    _ingest(reports, db)
+
+    stored = _stored(db, backend)
+    assert len(stored) == 4
+    assert _index_rows(db, "aliases") == 0
+    assert all(m.get(k) is None for m in stored.values() for k in ("source_files", "dup_sources", "dup_count"))
+
+
+def test_decorate_lists_every_copy(tmp_path):
+    index = NearDupIndex(str(tmp_path))
+    text = _page(1)
+    index.add_canonical("reports", "a::1", minhash(text))
+    meta = {"file_name": "a.pdf", "page": 1, "page_start": 1, "page_end": 1}
+
+    assert index.decorate("a::1", meta) == meta
+    assert index.decorate("a::1", meta, clear=True)["dup_count"] is None
+
+    index.add_alias("b::1", "a::1", "reports", text, dict(meta, file_name="b.pdf", page_start=4, page_end=5))
+    decorated = index.decorate("a::1", meta)
+    assert decorated["source_files"] == ["a.pdf", "b.pdf"]
+    assert decorated["dup_sources"] == ["a.pdf#1-1", "b.pdf#4-5"]
+    assert decorated["dup_count"] == 2
+
+    touched, orphans = index.remove(["a::1"])
+    assert [o[0] for o in orphans] == ["b::1"]
+    index.close()
+
+
+def test_reshard_keeps_near_dup_signatures(tmp_path, backend, monkeypatch):
+    reports, db = tmp_path / "reports", tmp_path / "db"
+    _pdf(reports / "acme-2023.pdf", [1, 2])
+    _ingest(reports, db)
+
+    # SHARD_BY none → company: the file moves to reports-acme
+    monkeypatch.setattr(ingest, "SHARD_BY", "company")
+    monkeypatch.setattr(ingest, "ShardRouter", partial(shards.ShardRouter, shard_by="company"))
+    _ingest(reports, db)
+    assert _index_rows(db, "sigs") == 2
+
+    _pdf(reports / "acme-copy-2023.pdf", [1, 3])
+    _ingest(reports, db)
+
+    assert _index_rows(db, "aliases") == 1
+    assert len(_stored(db, backend, "reports-acme")) == 3
+
+
+# ---------------------------------------------------------
+# Failures in the parse stage end the run instead of hanging it
+# ---------------------------------------------------------
+_parse_to_queue = ingest.parse_to_queue
+
+
+def _raise_for_bad(pdf_path, out_q, **kwargs):
+    # module level: the process pool pickles it by name
+    if "bad" in pdf_path:
+        raise RuntimeError("parser crashed")
+    _parse_to_queue(pdf_path, out_q, **kwargs)
+
+
+def _exit_for_bad(pdf_path, out_q, **kwargs):
+    if "bad" in pdf_path:
+        os._exit(1)
+    _parse_to_queue(pdf_path, out_q, **kwargs)
+
+
+def _post_nothing(pdf_path, out_q, **kwargs):
+    pass
+
+
+def _finishes(fn, timeout: float = 60):
+    """Run fn in a thread; fail instead of blocking the test run if it hangs."""
+    outcome = {}
+
+    def run():
+        try:
+            outcome["result"] = fn()
+        except BaseException as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "ingest did not return"
+    return outcome
+
+
+def _manifest_paths(db: Path) -> set:
+    manifest = IngestManifest(str(db))
+    try:
+        return {row["path"] for row in manifest.all()}
+    finally:
+        manifest.close()
+
+
+def test_pool_worker_exception_is_reported(tmp_path, backend, monkeypatch, capsys):
+    reports, db = tmp_path / "reports", tmp_path / "db"
+    _pdf(reports / "acme-2023.pdf", [1, 2])
+    _pdf(reports / "bad-2023.pdf", [3])
+    monkeypatch.setattr(ingest, "parse_to_queue", _raise_for_bad)
+
+    outcome = _finishes(lambda: ingest.ingest_reports(str(reports), str(db), workers=2))
+
+    assert "error" not in outcome
+    assert "Failed to parse bad-2023.pdf: RuntimeError('parser crashed')" in capsys.readouterr().out
+    assert _manifest_paths(db) == {"acme-2023.pdf"}
+    assert len(_stored(db, backend)) == 2
+
+
+def test_dead_pool_worker_is_reported(tmp_path, backend, monkeypatch, capsys):
+    reports, db = tmp_path / "reports", tmp_path / "db"
+    _pdf(reports / "acme-2023.pdf", [1, 2])
+    _pdf(reports / "bad-2023.pdf", [3])
+    monkeypatch.setattr(ingest, "parse_to_queue", _exit_for_bad)
+
+    outcome = _finishes(lambda: ingest.ingest_reports(str(reports), str(db), workers=2))
+
+    assert "error" not in outcome
+    assert "Failed to parse bad-2023.pdf: BrokenProcessPool" in capsys.readouterr().out
+    assert "bad-2023.pdf" not in _manifest_paths(db)
+
+
+def test_parsers_exiting_without_reporting_is_fatal(tmp_path, backend, monkeypatch):
+    reports, db = tmp_path / "reports", tmp_path / "db"
+    _pdf(reports / "acme-2023.pdf", [1])
+    monkeypatch.setattr(ingest, "parse_to_queue", _post_nothing)
+
+    outcome = _finishes(lambda: ingest.ingest_reports(str(reports), str(db), workers=1))
+
+    assert isinstance(outcome.get("error"), RuntimeError)
+    assert "PDF parsers exited after reporting 0 of 1 files" in str(outcome["error"])
+
+
+def test_writer_failure_cancels_the_parsers(tmp_path, backend, monkeypatch):
+    reports, db = tmp_path / "reports", tmp_path / "db"
+    for k in range(4):
+        _pdf(reports / f"acme-{2020 + k}.pdf", [k, k + 10])
+
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(ingest, "write_chunks", fail)
+
+    outcome = _finishes(lambda: ingest.ingest_reports(
+        str(reports), str(db), workers=2, write_batch=1, queue_size=1,
+    ))
+
+    assert isinstance(outcome.get("error"), OSError)
+    assert _manifest_paths(db) == set()
+
+
+def test_lexical_index_tracks_filter_metadata(tmp_path, backend):
+    reports, db = tmp_path / "reports", tmp_path / "db"
+    _pdf(reports / "acme-2023.pdf", [1, 2])
+    _pdf(reports / "acme-copy-2023.pdf", [1, 3])
+    _ingest(reports, db)
+
+    def search(where):
+        index = LexicalIndex(str(db))
+        try:
+            assert index.supports(where)
+            return {cid for cid, _ in index.search("plant reported value units", k=10, where=where)}
+        finally:
+            index.close()
+
+    stored = _stored(db, backend)
+    copy = search(file_where(["acme-copy-2023.pdf"]))
+    # the copy's own chunk plus the canonical chunk standing in for its collapsed one
+    assert copy == {cid for cid, m in stored.items()
+                    if "acme-copy-2023.pdf" in (m.get("source_files") or [m["file_name"]])}
+    assert len(copy) == 2
+
+    # an index from before the filter columns is filled in by the next ingest
+    with sqlite3.connect(db / LEXICAL_NAME) as conn:
+        conn.execute("UPDATE docs SET file_name = NULL, has_quant = NULL")
+        conn.execute("DELETE FROM doc_files")
+    _ingest(reports, db)
+    assert search(file_where(["acme-copy-2023.pdf"])) == copy
@@ -0,0 +1,71 @@
+import pytest
+
+from src.lexical import LexicalIndex
+
+
+def test_search_ranks_only_allowed_chunks(tmp_path):
+    index = LexicalIndex(str(tmp_path))
+    # the other file's chunks outrank the allowed one on the query terms
+    ids = [f"other.pdf::{i}" for i in range(50)] + ["mine.pdf::1"]
+    texts = ["scope 1 emissions scope 1 emissions"] * 50 + ["scope 1 emissions were 25 mt"]
+    index.add(ids, texts)
+
+    assert "mine.pdf::1" not in [cid for cid, _ in index.search("scope 1 emissions", k=4)]
+    assert [cid for cid, _ in index.search("scope 1 emissions", k=4, allowed={"mine.pdf::1"})] == ["mine.pdf::1"]
+    assert index.search("scope 1 emissions", allowed=set()) == []
+    index.close()
+
+
+def _quant_index(tmp_path):
+    index = LexicalIndex(str(tmp_path))
+    index.add(
+        ["a::1", "a::2", "b::1", "c::1"],
+        ["scope 1 emissions were 25 mt", "scope 1 emissions narrative", "scope 1 emissions 30 mt",
+         "scope 1 emissions 25 mt"],
+        [{"file_name": "a.pdf", "source_path": "x/a.pdf", "has_quant": True},
+         {"file_name": "a.pdf", "source_path": "x/a.pdf", "has_quant": False},
+         {"file_name": "b.pdf", "source_path": "b.pdf", "has_quant": True},
+         {"file_name": "c.pdf", "source_path": "c.pdf", "has_quant": True, "source_files": ["c.pdf", "a.pdf"]}],
+    )
+    return index
+
+
+def _ids(index, where):
+    return {cid for cid, _ in index.search("scope 1 emissions", k=10, where=where)}
+
+
+def test_search_applies_metadata_filters_in_sql(tmp_path):
+    index = _quant_index(tmp_path)
+    quant = {"has_quant": {"$eq": True}}
+    own_or_copy = {"$or": [{"file_name": {"$eq": "a.pdf"}}, {"source_files": {"$contains": "a.pdf"}}]}
+
+    assert _ids(index, quant) == {"a::1", "b::1", "c::1"}
+    assert _ids(index, own_or_copy) == {"a::1", "a::2", "c::1"}
+    assert _ids(index, {"$and": [quant, own_or_copy]}) == {"a::1", "c::1"}
+    assert _ids(index, {"file_name": {"$in": ["b.pdf", "c.pdf"]}}) == {"b::1", "c::1"}
+    assert _ids(index, {"source_path": "x/a.pdf"}) == {"a::1", "a::2"}
+    # scores use whole-index statistics, filtered or not
+    assert dict(index.search("scope 1 emissions 25", where=quant))["a::1"] == \
+        dict(index.search("scope 1 emissions 25"))["a::1"]
+
+    # dup keys cleared (None) drop the copy; other keys are kept
+    index.update_metadata(["c::1"], [{"source_files": None}])
+    assert _ids(index, own_or_copy) == {"a::1", "a::2"}
+    assert _ids(index, quant) == {"a::1", "b::1", "c::1"}
+    index.close()
+
+
+def test_unsupported_filters_and_unrecorded_metadata_are_refused(tmp_path):
+    index = _quant_index(tmp_path)
+    assert index.supports({"has_quant": True})
+    assert not index.supports({"page": {"$gte": 3}})
+    assert not index.supports({"has_quant": {"$ne": True}})
+    with pytest.raises(ValueError):
+        index.search("scope", where={"page": {"$gte": 3}})
+
+    index.add(["old::1"], ["scope 1 emissions"])   # indexed without metadata
+    assert index.missing_metadata()
+    assert not index.supports({"has_quant": True})
+    index.update_metadata(["old::1"], [{"file_name": "old.pdf", "has_quant": False}])
+    assert index.supports({"has_quant": True})
+    index.close()
@@ -0,0 +1,146 @@
+import json
+import sys
+from types import SimpleNamespace
+
+from src import cli, llm_ollama
+from src.llm_ollama import ResponseCache, _JsonObjectScanner, _escape_controls_in_strings, _repair_json
+
+
+def _scan(tokens):
+    """Feed tokens like the stream does → text up to the end of the first object."""
+    scanner, parts = _JsonObjectScanner(), []
+    for token in tokens:
+        end = scanner.feed(token)
+        if end != -1:
+            parts.append(token[:end - scanner.consumed])
+            return "".join(parts)
+        parts.append(token)
+    return None
+
+
+def test_scanner_ignores_braces_and_escaped_quotes_inside_strings():
+    obj = '{"facts": [{"text": "a {b} \\"c}\\" d\\\\", "page": 1}]}'
+    assert _scan([obj + " trailing"]) == obj
+    assert json.loads(_scan([obj]))["facts"][0]["text"] == 'a {b} "c}" d\\'
+
+
+def test_scanner_closes_an_object_split_across_tokens():
+    obj = '{"facts": [{"text": "x \\"y\\" {z}", "page": 2}]}'
+    tokens = [obj[k:k + 3] for k in range(0, len(obj), 3)]
+    assert _scan(tokens) == obj
+    # split right inside an escape sequence
+    assert _scan(['{"a": "\\', '"}', '"}']) == '{"a": "\\"}"}'
+
+
+def test_scanner_skips_a_fence_and_stops_before_trailing_text():
+    assert _scan(['```json\n{"a"', ': 1}\n```', "\nHope this helps!"]) == '```json\n{"a": 1}'
+    assert _scan(['{"a": {"b": 1}', "}} extra"]) == '{"a": {"b": 1}}'
+    assert _scan(['{"a": 1']) is None
+
+
+def test_stream_stops_at_the_end_of_the_object(monkeypatch):
+    lines = [json.dumps({"response": t}) for t in ['{"facts"', ': []}', " and more", "!"]]
+    lines.append(json.dumps({"response": "", "done": True}))
+    consumed = []
+
+    class _Response:
+        ok = True
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def iter_lines(self):
+            for line in lines:
+                consumed.append(line)
+                yield line.encode()
+
+    monkeypatch.setattr(llm_ollama.requests, "post", lambda *a, **kw: _Response())
+    assert llm_ollama._ollama_generate_stream("sys", "prompt") == '{"facts": []}'
+    assert len(consumed) == 2
+
+
+def test_escape_controls_only_inside_strings():
+    raw = '{\n\t"text": "line 1\nline\t2 \\"q\\"\r",\n "page": 3\n}'
+    fixed = _escape_controls_in_strings(raw)
+    assert fixed == '{\n\t"text": "line 1\\nline\\t2 \\"q\\"\\r",\n "page": 3\n}'
+    assert json.loads(fixed) == {"text": 'line 1\nline\t2 "q"\r', "page": 3}
+
+
+def test_repair_json_escapes_controls_and_drops_trailing_commas():
+    raw = '```json\n{"facts": [{"text": "a\nb", "page": 1},],}\n```'
+    assert _repair_json(raw) == {"facts": [{"text": "a\nb", "page": 1}]}
+
+
+# ---------------------------------------------------------
+# Response cache
+# ---------------------------------------------------------
+def _clock(monkeypatch, start: float = 1000.0):
+    """Patch the module clock; returns a one-element list to move time with."""
+    now = [start]
+    monkeypatch.setattr(llm_ollama, "time", SimpleNamespace(time=lambda: now[0], sleep=lambda s: None))
+    return now
+
+
+def _keys(cache: ResponseCache) -> set:
+    return {k for (k,) in cache._conn.execute("SELECT key FROM responses")}
+
+
+def test_cache_entry_expires_after_the_ttl(tmp_path, monkeypatch):
+    now = _clock(monkeypatch)
+    cache = ResponseCache(str(tmp_path / "llm.sqlite"), ttl=60, max_bytes=1 << 20)
+    cache.put("k", "v")
+
+    now[0] += 59
+    assert cache.get("k") == "v"
+    now[0] += 2
+    assert cache.get("k") is None
+    assert _keys(cache) == set()
+    assert cache.stats() == {"hits": 1, "misses": 1}
+
+
+def test_cache_evicts_least_recently_used_entries_over_the_size_limit(tmp_path, monkeypatch):
+    now = _clock(monkeypatch)
+    cache = ResponseCache(str(tmp_path / "llm.sqlite"), ttl=0, max_bytes=10)
+    for key in ("a", "b", "c"):
+        cache.put(key, "xxxx")   # 4 bytes each
+        now[0] += 1
+    # two 4-byte entries fit in 10 bytes: the oldest one went
+    assert _keys(cache) == {"b", "c"}
+
+    assert cache.get("b") == "xxxx"   # "c" is now the least recently used
+    now[0] += 1
+    cache.put("d", "xxxx")
+    assert _keys(cache) == {"b", "d"}
+
+
+def test_no_cache_never_reads_or_writes_the_cache(tmp_path, monkeypatch):
+    cache = ResponseCache(str(tmp_path / "llm.sqlite"))
+    monkeypatch.setattr(llm_ollama, "_cache", cache)
+    key = ResponseCache.make_key("json", llm_ollama.LLM_MODEL, "sys", "prompt", 0.1)
+    cache.put(key, json.dumps({"facts": ["cached"]}))
+    calls = []
+    monkeypatch.setattr(llm_ollama, "_ollama_generate", lambda **kw: calls.append(kw) or '{"facts": []}')
+
+    assert llm_ollama.generate_json("sys", "prompt", use_cache=False, stream=False) == {"facts": []}
+    assert llm_ollama.generate_text("sys", "prompt", use_cache=False) == '{"facts": []}'
+
+    assert len(calls) == 2
+    assert _keys(cache) == {key}
+    assert cache.stats() == {"hits": 0, "misses": 0}
+
+
+def test_no_cache_flag_reaches_extraction(monkeypatch):
+    seen = {}
+    monkeypatch.setattr(cli, "extract_facts", lambda *a, **kw: seen.update(kw))
+    argv = ["cli", "extract-facts", "--db", "db", "--out", "facts.json"]
+
+    monkeypatch.setattr(sys, "argv", argv + ["--no-cache"])
+    cli.main()
+    assert seen["use_cache"] is False
+
+    monkeypatch.setattr(sys, "argv", argv)
+    cli.main()
+    assert seen["use_cache"] is True
@@ -0,0 +1,152 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from src import ingest
+from src.manifest import IngestManifest, file_sha256, infer_company_year
+
+REPORTS = Path(__file__).resolve().parents[1] / "reports"
+
+# the report files shipped in reports/
+REAL_NAMES = {
+    "APM-Maersk_SIZ-2023-Report-Card.pdf": ("maersk", 2023),
+    "apmm-esg-data-table_2020.pdf": ("maersk", 2020),
+    "apmm-sustainability-report-2020-a4-210210.pdf": ("maersk", 2020),
+    "maersk-crp-2025-1.pdf": ("maersk", 2025),
+    "maersk-crp-2025.pdf": ("maersk", 2025),
+    "maersk-esg-data-table_2021.pdf": ("maersk", 2021),
+    "maersk-sustainability-report_2021.pdf": ("maersk", 2021),
+}
+
+
+@pytest.mark.parametrize("name, expected", sorted(REAL_NAMES.items()))
+def test_real_report_names(name, expected):
+    assert infer_company_year(name) == expected
+
+
+def test_every_shipped_report_is_covered():
+    shipped = {p.name for p in REPORTS.glob("*.pdf")}
+    assert shipped <= set(REAL_NAMES)
+
+
+def test_catalog_finds_multi_word_prefix(tmp_path):
+    manifest = IngestManifest(str(tmp_path))
+    for name in REAL_NAMES:
+        manifest.record(name, name, name, 1, 0.0, "v", ["id"])
+
+    found = manifest.find(company="Maersk", year=2023)
+
+    assert [r["file_name"] for r in found] == ["APM-Maersk_SIZ-2023-Report-Card.pdf"]
+
+
+def test_company_match_is_exact(tmp_path):
+    manifest = IngestManifest(str(tmp_path))
+    manifest.record("bp-2023.pdf", "bp-2023.pdf", "a", 1, 0.0, "v", ["id"])
+    manifest.record("maersk-2023.pdf", "maersk-2023.pdf", "b", 1, 0.0, "v", ["id"])
+
+    assert manifest.find(company="BP", year=2023)[0]["file_name"] == "bp-2023.pdf"
+    assert manifest.find(company="BP Maersk", year=2023) == []
+    assert [r["file_name"] for r in manifest.find(company="A.P. Moller - Maersk")] == ["maersk-2023.pdf"]
+
+
+def test_company_year_lookup_uses_the_index(tmp_path):
+    manifest = IngestManifest(str(tmp_path))
+    plan = " ".join(r[-1] for r in manifest.conn.execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM files WHERE duplicate_of IS NULL AND company_key = ? AND report_year = ?",
+        ("maersk", 2023),
+    ))
+    assert "files_company_key_year" in plan
+
+
+def test_migration_fills_company_key(tmp_path):
+    manifest = IngestManifest(str(tmp_path))
+    manifest.record("APM-Maersk_SIZ-2023-Report-Card.pdf", "APM-Maersk_SIZ-2023-Report-Card.pdf", "a", 1, 0.0, "v", [])
+    manifest.conn.execute("UPDATE files SET company = 'apm', company_key = NULL")
+    manifest.conn.commit()
+    manifest.close()
+
+    reopened = IngestManifest(str(tmp_path))
+    assert [r["file_name"] for r in reopened.find(company="Maersk", year=2023)] == ["APM-Maersk_SIZ-2023-Report-Card.pdf"]
+
+
+# ---------------------------------------------------------
+# Skip-unchanged planning (ingest._plan against the manifest)
+# ---------------------------------------------------------
+def _write(path: Path, data: bytes, mtime: float = 1_700_000_000.0):
+    path.write_bytes(data)
+    os.utime(path, (mtime, mtime))
+
+
+def _record_all(manifest: IngestManifest, reports: Path, version: str = "v1"):
+    for pdf in sorted(reports.glob("*.pdf")):
+        st = pdf.stat()
+        manifest.record(pdf.name, pdf.name, file_sha256(pdf), st.st_size, st.st_mtime, version, [f"{pdf.name}::1"])
+
+
+def _plan(reports: Path, manifest: IngestManifest, version: str = "v1"):
+    return ingest._plan(sorted(reports.glob("*.pdf")), reports, manifest, version)
+
+
+@pytest.fixture
+def planned(tmp_path):
+    reports = tmp_path / "reports"
+    reports.mkdir()
+    _write(reports / "acme-2023.pdf", b"acme 2023")
+    _write(reports / "beta-2022.pdf", b"beta 2022")
+    manifest = IngestManifest(str(tmp_path / "db"))
+    _record_all(manifest, reports)
+    yield reports, manifest
+    manifest.close()
+
+
+def test_plan_skips_unchanged_files(planned):
+    reports, manifest = planned
+    assert _plan(reports, manifest) == ([], [], [], 2)
+
+
+def test_plan_touches_a_file_whose_mtime_moved_but_not_its_content(planned, monkeypatch):
+    reports, manifest = planned
+    _write(reports / "acme-2023.pdf", b"acme 2023", mtime=1_800_000_000.0)
+
+    assert _plan(reports, manifest) == ([], [], [], 2)
+    assert manifest.get("acme-2023.pdf")["mtime"] == 1_800_000_000.0
+    # the recorded hash is trusted again on the next run
+    monkeypatch.setattr(ingest, "file_sha256", lambda path: pytest.fail(f"re-hashed {path}"))
+    assert _plan(reports, manifest) == ([], [], [], 2)
+
+
+def test_plan_reparses_changed_content_and_version_bumps(planned):
+    reports, manifest = planned
+    _write(reports / "beta-2022.pdf", b"beta 2022 v2", mtime=1_800_000_000.0)
+
+    to_parse, _, _, unchanged = _plan(reports, manifest)
+    assert [key for key, *_ in to_parse] == ["beta-2022.pdf"]
+    assert unchanged == 1
+
+    to_parse, _, _, unchanged = _plan(reports, manifest, version="v2")
+    assert [key for key, *_ in to_parse] == ["acme-2023.pdf", "beta-2022.pdf"]
+    assert unchanged == 0
+
+
+def test_plan_links_a_byte_identical_copy_to_the_ingested_file(planned):
+    reports, manifest = planned
+    _write(reports / "0-copy-of-acme.pdf", b"acme 2023")
+
+    to_parse, duplicates, removed, unchanged = _plan(reports, manifest)
+    # the already-ingested file stays canonical, though the copy sorts first
+    assert [(key, canon) for key, *_, canon in duplicates] == [("0-copy-of-acme.pdf", "acme-2023.pdf")]
+    assert (to_parse, removed, unchanged) == ([], [], 2)
+
+    key, pdf, sha, st, canon = duplicates[0]
+    manifest.record(key, pdf.name, sha, st.st_size, st.st_mtime, "v1", [], duplicate_of=canon)
+    assert _plan(reports, manifest) == ([], [], [], 3)
+
+
+def test_plan_reports_removed_files(planned):
+    reports, manifest = planned
+    (reports / "beta-2022.pdf").unlink()
+
+    to_parse, duplicates, removed, unchanged = _plan(reports, manifest)
+    assert [row["path"] for row in removed] == ["beta-2022.pdf"]
+    assert (to_parse, duplicates, unchanged) == ([], [], 1)
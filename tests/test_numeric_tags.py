@@ -0,0 +1,22 @@
+import pytest
+
+from src.numeric_tags import tag_quantities
+
+
+@pytest.mark.parametrize("text", [
+    "In 2023 we launched a new fleet strategy.",
+    "Our 2030 ambition builds on the 2019 baseline.",
+])
+def test_bare_years_are_not_quantitative(text):
+    tags = tag_quantities(text)
+    assert tags["has_year"]
+    assert not tags["has_quant"]
+
+
+@pytest.mark.parametrize("text", [
+    "Emissions fell 12% in 2023.",
+    "Scope 1 emissions were 25 Mt CO2e.",
+    "Fuel use was 1,234,000 litres.",
+])
+def test_figures_are_quantitative(text):
+    assert tag_quantities(text)["has_quant"]
@@ -0,0 +1,57 @@
+import pytest
+
+from src import chunking, packing
+from src.packing import HEADER_OVERHEAD, count_tokens, output_budget, pack_chunks, set_token_counter
+
+
+@pytest.fixture(autouse=True)
+def _reset_counters():
+    yield
+    set_token_counter(None)
+    chunking.set_token_counter(None)
+
+
+def test_packing_counts_with_the_llm_tokenizer(tmp_path, monkeypatch):
+    tokenizers = pytest.importorskip("tokenizers")
+    from tokenizers.models import WordLevel
+    from tokenizers.pre_tokenizers import Split
+
+    # one token per character: the LLM's vocabulary, unlike the embedder's
+    tok = tokenizers.Tokenizer(WordLevel({"[UNK]": 0}, unk_token="[UNK]"))
+    tok.pre_tokenizer = Split("", "isolated")
+    tok.save(str(tmp_path / "llm_7b.json"))
+    monkeypatch.setattr(chunking, "TOKENIZER_DIR", str(tmp_path))
+    monkeypatch.setattr(packing, "LLM_MODEL", "llm:7b")
+    monkeypatch.setattr(packing, "LLM_TOKENIZER_PATH", "")
+    set_token_counter(None)
+    chunking.set_token_counter(chunking.estimate_tokens, "estimate")
+
+    text = "Scope 1: 25"
+    assert count_tokens(text) == len(text)
+    assert chunking.count_tokens(text) == 2
+
+
+def test_estimated_counts_are_padded_and_packs_fit_the_budget(monkeypatch):
+    monkeypatch.setattr(packing, "LLM_TOKENIZER_PATH", "")
+    monkeypatch.setattr(packing, "LLM_MODEL", "no-such-model")
+    set_token_counter(None)
+    assert count_tokens("a" * 400) == 130
+
+    docs = [f"{k} " * 150 for k in range(6)]
+    packs = pack_chunks(docs, [{"page": k} for k in range(6)], 400)
+    assert len(packs) > 1
+    for pack in packs:
+        assert sum(count_tokens(e.text) + HEADER_OVERHEAD for e in pack) <= 400
+
+
+def test_packs_leave_room_for_an_answer_per_piece(monkeypatch):
+    monkeypatch.setattr(packing, "LLM_TOKENIZER_PATH", "")
+    monkeypatch.setattr(packing, "LLM_MODEL", "no-such-model")
+    set_token_counter(None)
+
+    docs = [f"{k} " * 150 for k in range(6)]
+    packs = pack_chunks(docs, [{"page": k} for k in range(6)], 1200, output_per_piece=100, output_floor=150)
+    assert len(packs) > 1
+    for pack in packs:
+        evidence = sum(count_tokens(e.text) + HEADER_OVERHEAD for e in pack)
+        assert evidence + output_budget(len(pack), 100, 150) <= 1200
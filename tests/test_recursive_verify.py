@@ -0,0 +1,44 @@
+from src.recursive_verify import VerificationEngine
+
+
+class _Engine(VerificationEngine):
+    """Engine over a fixed source graph instead of a collection."""
+
+    def __init__(self, graph, **kw):
+        super().__init__(None, **kw)
+        self.graph = graph
+
+    def prefetch(self, statements):
+        with self._lock:
+            for s in statements:
+                self._sources.setdefault(s, [{"quote": q, "meta": {}} for q in self.graph.get(s, [])])
+
+
+# "according to" makes a statement sourced; the axiom ends a chain
+GRAPH = {
+    "A according to B": ["B according to C"],
+    "B according to C": ["1 liter of diesel emits 2.6 kg"],
+    "D according to A": ["A according to B"],
+    "E according to F": ["F according to E"],
+    "F according to E": ["E according to F"],
+}
+
+
+def test_cutoff_results_are_not_reused_at_shallower_depth():
+    deep_first = _Engine(GRAPH, max_depth=2)
+    deep_first.verify("D according to A")             # A is cut off below D
+    fresh = _Engine(GRAPH, max_depth=2)
+
+    assert deep_first.verify("A according to B") == fresh.verify("A according to B")
+    assert fresh.verify("A according to B")["proof"][0]["proof"][0]["credibility"] == "axiom"
+
+
+def test_cycle_results_do_not_depend_on_visiting_order():
+    one = _Engine(GRAPH, max_depth=6)
+    first_e = one.verify("E according to F")
+    first_f = one.verify("F according to E")
+    two = _Engine(GRAPH, max_depth=6)
+    second_f = two.verify("F according to E")
+    second_e = two.verify("E according to F")
+
+    assert (first_e, first_f) == (second_e, second_f)
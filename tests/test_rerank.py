@@ -0,0 +1,34 @@
+from src.rerank import Reranker, get_reranker, rerank
+
+
+class _Counting(Reranker):
+    kind = "test"
+
+    def __init__(self, joint):
+        super().__init__("m")
+        self.joint_queries = joint
+        self.calls = []
+
+    def score(self, query, docs):
+        self.calls.append(query)
+        return [float(len(d)) + query.count("\n") for d in docs]
+
+
+def test_joint_reranker_scores_each_chunk_once():
+    scorer = _Counting(joint=True)
+    ranked = rerank(scorer, ["scope 1", "scope 2", "scope 3"], ["a", "b"], ["x", "yyy"], use_cache=False)
+
+    assert scorer.calls == ["scope 1\nscope 2\nscope 3"]
+    assert [k for k, _ in ranked] == [1, 0]
+
+
+def test_per_query_reranker_keeps_best_score():
+    scorer = _Counting(joint=False)
+    rerank(scorer, ["scope 1", "scope 2"], ["a"], ["x"], use_cache=False)
+
+    assert scorer.calls == ["scope 1", "scope 2"]
+
+
+def test_ollama_reranker_needs_an_explicit_model():
+    assert get_reranker("ollama", "") is None
+    assert get_reranker("ollama", "qwen2.5:0.5b").model == "qwen2.5:0.5b"
@@ -0,0 +1,41 @@
+import pytest
+
+from src.schemas import check_facts_envelope, split_valid_facts
+
+
+def _fact(text: str, **fields):
+    return {"text": text, "confidence": "high", "fact_type": "claim", **fields}
+
+
+def test_valid_facts_are_kept_and_invalid_ones_set_aside():
+    payload = {"facts": [
+        _fact("Scope 1: 25 kt", page=3, chunk=1),
+        {"text": "Scope 2: 40 kt", "fact_type": "claim"},          # missing confidence
+        _fact("Scope 3: 90 kt", page="three"),                       # page is not an int
+        _fact("Target: -50% by 2030", confidence=" Medium ", fact_type="CLAIM", citations=None),
+        "not a fact",
+        _fact(""),                                                   # empty text
+    ]}
+
+    valid, invalid = split_valid_facts(payload)
+
+    assert [f["text"] for f in valid] == ["Scope 1: 25 kt", "Target: -50% by 2030"]
+    assert valid[0] == {"text": "Scope 1: 25 kt", "page": 3, "chunk": 1, "confidence": "high",
+                        "fact_type": "claim", "citations": [], "components": []}
+    assert valid[1]["confidence"] == "medium" and valid[1]["fact_type"] == "claim"
+    assert "esrs_target" not in valid[0] and "id" not in valid[0]
+
+    assert [item for item, _ in invalid] == [payload["facts"][k] for k in (1, 2, 4, 5)]
+    errors = dict(zip((1, 2, 4, 5), (err for _, err in invalid)))
+    assert "confidence" in errors[1]
+    assert "page" in errors[2]
+    assert "text" in errors[5]
+
+
+def test_a_non_facts_answer_is_rejected_whole():
+    for payload in (["facts"], {"facts": {"text": "x"}}, None):
+        with pytest.raises(ValueError):
+            check_facts_envelope(payload)
+        with pytest.raises(ValueError):
+            split_valid_facts(payload)
+    assert split_valid_facts({}) == ([], [])
@@ -0,0 +1,154 @@
+import types
+
+import pytest
+
+from src import utils_pdf
+from src.utils_pdf import NUMERIC_LINE_RE, _extract_page, match_table
+
+
+@pytest.mark.parametrize("line", ["1,234", "12.5%", "(3)", "-", "—", "n/a", "N/A", "NA"])
+def test_numeric_lines(line):
+    assert NUMERIC_LINE_RE.match(line)
+
+
+@pytest.mark.parametrize("line", ["a", "nana", "aaa/n", "Scope", "n/a/n"])
+def test_words_are_not_numeric_lines(line):
+    assert not NUMERIC_LINE_RE.match(line)
+
+
+# ---------------------------------------------------------
+# Fake PyMuPDF pages
+# ---------------------------------------------------------
+class _Table:
+    def __init__(self, bbox, rows):
+        self.bbox = bbox
+        self._rows = rows
+
+    def extract(self):
+        return self._rows
+
+
+class _Page:
+    """get_text("dict") / find_tables() stand-in that counts find_tables calls."""
+
+    def __init__(self, lines, tables=(), number=0):
+        # lines: [(text, bbox)], one block per line
+        self.number = number
+        self.find_tables_calls = 0
+        self.get_text_calls = 0
+        self._tables = list(tables)
+        self._blocks = [
+            {"bbox": bbox, "lines": [{"bbox": bbox, "spans": [
+                {"text": text, "size": 9.0, "flags": 0, "font": "Helvetica", "color": 0, "origin": bbox[:2]},
+            ]}]}
+            for text, bbox in lines
+        ]
+
+    def get_text(self, kind):
+        assert kind == "dict"
+        self.get_text_calls += 1
+        return {"blocks": self._blocks}
+
+    def find_tables(self):
+        self.find_tables_calls += 1
+        return self._tables
+
+
+TABLE = _Table((100, 100, 300, 200), [["Scope", "2023"], ["1", "25"]])
+
+
+def _table_page(number=0):
+    # 9 numeric lines: "auto" mode treats the page as tabular
+    lines = [(f"{k},000", (110, 100 + 10 * k, 190, 108 + 10 * k)) for k in range(9)]
+    return _Page(lines, [TABLE], number)
+
+
+def _prose_page(number=0):
+    return _Page([("Our climate strategy.", (50, 50, 550, 80)), ("Governance text.", (50, 90, 550, 120))],
+                 [TABLE], number)
+
+
+@pytest.mark.parametrize("mode, table_page_calls, prose_page_calls", [
+    ("off", 0, 0),
+    ("auto", 1, 0),
+    ("all", 1, 1),
+])
+def test_find_tables_runs_at_most_once_per_page(mode, table_page_calls, prose_page_calls):
+    table_page, prose_page = _table_page(), _prose_page()
+    table_rec = _extract_page(table_page, 0, mode, "a.pdf", "/a.pdf")
+    _extract_page(prose_page, 1, mode, "a.pdf", "/a.pdf")
+
+    assert table_page.find_tables_calls == table_page_calls
+    assert prose_page.find_tables_calls == prose_page_calls
+    if table_page_calls:
+        # every block sits in the table: its text is emitted once, in place of the blocks
+        assert {b.table_id for b in table_rec.blocks} == {0}
+        assert table_rec.text == "Scope | 2023\n1 | 25"
+    else:
+        assert all(b.table_id is None for b in table_rec.blocks)
+
+
+def test_blocks_belong_to_a_table_from_half_their_area():
+    table = TABLE.bbox
+    # 100 wide: 50 inside → 0.5; 49 inside → 0.49
+    assert match_table((250, 120, 350, 130), [(table, "")]) == 0
+    assert match_table((251, 120, 351, 130), [(table, "")]) is None
+    assert match_table((400, 120, 500, 130), [(table, "")]) is None
+    # the table holding most of the block wins
+    other = ((280, 100, 500, 200), "")
+    assert match_table((250, 120, 350, 130), [(table, ""), other]) == 1
+
+    page = _Page(
+        [("Scope 1 total", (250, 120, 350, 130)), ("footnote", (251, 150, 351, 160)), ("Intro", (10, 10, 90, 20))],
+        [TABLE],
+    )
+    rec = _extract_page(page, 0, "all", "a.pdf", "/a.pdf")
+    assert [b.table_id for b in rec.blocks] == [0, None, None]
+    assert [b.block_type for b in rec.blocks] == ["table", "text", "text"]
+    assert rec.text == "Scope | 2023\n1 | 25\n\nfootnote\n\nIntro"
+
+
+# ---------------------------------------------------------
+# Lean, streamed page records
+# ---------------------------------------------------------
+class _Doc:
+    def __init__(self, pages):
+        self.pages = pages
+        self.closed = False
+
+    def __iter__(self):
+        return iter(self.pages)
+
+    def close(self):
+        self.closed = True
+
+
+def test_extract_pages_parses_one_page_at_a_time(tmp_path, monkeypatch):
+    doc = _Doc([_prose_page(k) for k in range(3)])
+    monkeypatch.setattr(utils_pdf.fitz, "open", lambda path: doc)
+
+    pages = utils_pdf.extract_pages(tmp_path / "a.pdf", table_mode="off")
+    assert isinstance(pages, types.GeneratorType)
+    assert [p.get_text_calls for p in doc.pages] == [0, 0, 0]
+
+    first = next(pages)
+    assert first.page == 1
+    assert [p.get_text_calls for p in doc.pages] == [1, 0, 0]
+
+    assert [rec.page for rec in pages] == [2, 3]
+    assert doc.closed
+
+
+def test_records_keep_only_text_bbox_and_page_fields():
+    rec = _extract_page(_prose_page(), 0, "off", "a.pdf", "/a.pdf")
+
+    assert set(rec.keys()) == {"page", "text", "blocks", "file_name", "source_uri"}
+    assert not hasattr(rec, "__dict__")
+    for block in rec.blocks:
+        assert set(block.keys()) == {"text", "block_type", "bbox", "table_id", "table_text"}
+        assert not hasattr(block, "__dict__")
+        with pytest.raises(AttributeError):
+            block.spans = []
+        assert block.get("spans") is None and block.get("font") is None
+        assert isinstance(block.bbox, tuple)
+    assert rec["blocks"][0]["text"] == "Our climate strategy."
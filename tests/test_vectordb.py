@@ -0,0 +1,124 @@
+import math
+
+import pytest
+
+from src import vectordb
+from src.lexical import LexicalIndex
+from src.numeric_tags import QUANT_WHERE
+from src.vectordb import (
+    get_client, get_collection, hybrid_query_batch, matching_ids, query_batch, update_metadata, write_chunks,
+)
+
+
+def test_matching_ids_are_cached_until_the_collection_is_written(tmp_path, backend, monkeypatch):
+    col = get_collection(get_client(str(tmp_path)), "reports", backend=backend)
+    ids, docs = ["a::1", "a::2"], ["scope 1 emissions 25 mt", "about us"]
+    write_chunks(col, ids, docs, [{"has_quant": True}, {"has_quant": False}], backend.embed_documents(docs))
+    where = {"has_quant": True}
+    assert matching_ids(col, where) == {"a::1"}
+
+    scans = []
+    get = type(col).get
+    monkeypatch.setattr(type(col), "get", lambda self, *a, **kw: scans.append(kw) or get(self, *a, **kw))
+    assert matching_ids(col, where) == {"a::1"}
+    assert scans == []
+
+    update_metadata(col, ["a::2"], [{"has_quant": True}])
+    assert matching_ids(col, where) == {"a::1", "a::2"}
+    assert len(scans) == 1
+    assert all(key[0] == str(col.id) for key in vectordb._matching_cache)
+
+
+def _write_at_angles(col, rows):
+    """Store (id, angle in degrees) rows as 2-d unit vectors: cosine distance grows with the angle."""
+    ids = [cid for cid, _ in rows]
+    embeddings = [[math.cos(math.radians(a)), math.sin(math.radians(a))] for _, a in rows]
+    write_chunks(col, ids, [f"doc {cid}" for cid in ids], [{"angle": a} for _, a in rows], embeddings)
+
+
+def test_fanout_keeps_the_global_top_n_across_shards(tmp_path, backend):
+    client = get_client(str(tmp_path))
+    acme = get_collection(client, "reports-acme", backend=backend)
+    zeta = get_collection(client, "reports-zeta", backend=backend)
+    _write_at_angles(acme, [("acme::1", 5), ("acme::2", 40), ("acme::3", 80)])
+    _write_at_angles(zeta, [("zeta::1", 10), ("zeta::2", 20), ("zeta::3", 85)])
+
+    hits = query_batch([acme, zeta], embeddings=[[1.0, 0.0], [0.0, 1.0]], n=3)
+
+    assert len(hits) == 2
+    assert hits[0]["ids"] == ["acme::1", "zeta::1", "zeta::2"]
+    assert hits[1]["ids"] == ["zeta::3", "acme::3", "acme::2"]
+    assert hits[0]["distances"] == sorted(hits[0]["distances"])
+    assert [m["angle"] for m in hits[0]["metadatas"]] == [5, 10, 20]
+    assert hits[0]["documents"] == ["doc acme::1", "doc zeta::1", "doc zeta::2"]
+
+
+def test_query_batch_embeds_once_and_keeps_query_order(tmp_path, backend, monkeypatch):
+    col = get_collection(get_client(str(tmp_path)), "reports", backend=backend)
+    docs = [f"batch query doc {k}" for k in range(4)]
+    ids = [f"a::{k}" for k in range(4)]
+    write_chunks(col, ids, docs, [{"year": 2022 + k % 2} for k in range(4)], backend.embed_documents(docs))
+
+    calls = []
+    embed = backend.embed_documents
+    monkeypatch.setattr(backend, "embed_documents", lambda texts: calls.append(list(texts)) or embed(texts))
+    monkeypatch.setattr(vectordb, "QUERY_BATCH_SIZE", 2)   # 3 queries → 2 Chroma round trips
+    queries = [docs[3], docs[0], docs[2]]
+
+    hits = query_batch(col, queries, n=1)
+    assert calls == [queries]
+    assert [h["ids"] for h in hits] == [["a::3"], ["a::0"], ["a::2"]]
+    assert [h["documents"] for h in hits] == [[docs[3]], [docs[0]], [docs[2]]]
+
+    # only a::1 and a::3 are from 2023: the exact matches a::0 / a::2 are filtered out
+    hits = query_batch(col, queries, n=2, where={"year": 2023})
+    assert len(calls) == 1   # query embeddings are reused
+    assert [set(h["ids"]) for h in hits] == [{"a::1", "a::3"}] * 3
+    assert hits[0]["ids"][0] == "a::3"
+    assert all(m["year"] == 2023 for h in hits for m in h["metadatas"])
+
+
+def test_hybrid_filters_in_the_lexical_index_without_a_collection_scan(tmp_path, backend, monkeypatch):
+    col = get_collection(get_client(str(tmp_path)), "reports", backend=backend)
+    ids = ["a::1", "a::2", "a::3"]
+    docs = ["hybrid scope 1 emissions 25 mt", "hybrid scope 1 emissions narrative", "hybrid water use"]
+    metas = [{"file_name": "a.pdf", "has_quant": q, "page": k} for k, q in enumerate([True, False, True])]
+    write_chunks(col, ids, docs, metas, backend.embed_documents(docs))
+    lexical = LexicalIndex(str(tmp_path))
+    lexical.add(ids, docs, metas)
+
+    scans = []
+    real_matching = vectordb.matching_ids
+    monkeypatch.setattr(vectordb, "matching_ids", lambda *a: scans.append(a) or real_matching(*a))
+
+    hits = hybrid_query_batch(col, lexical, ["hybrid scope 1 emissions"], n=3, where=QUANT_WHERE)[0]
+    assert set(hits["ids"]) == {"a::1", "a::3"}
+    assert scans == []
+
+    # a filter the lexical index does not keep falls back to the matching IDs
+    hits = hybrid_query_batch(col, lexical, ["hybrid scope 1 emissions"], n=3, where={"page": {"$gte": 1}})[0]
+    assert set(hits["ids"]) == {"a::2", "a::3"}
+    assert len(scans) == 1
+    lexical.close()
+
+
+def test_collection_refuses_another_embedding_model(tmp_path, backend):
+    client = get_client(str(tmp_path))
+    col = get_collection(client, "reports", backend=backend)
+    write_chunks(col, ["a::1"], ["scope 1"], [{"page": 1}], backend.embed_documents(["scope 1"]))
+
+    other = type(backend)()
+    other.model = "other-model"
+    with pytest.raises(ValueError, match="fake:hash"):
+        get_collection(client, "reports", backend=other)
+    # same model again is fine
+    assert get_collection(client, "reports", backend=type(backend)()).count() == 1
+
+
+def test_write_refuses_another_embedding_dimension(tmp_path, backend):
+    col = get_collection(get_client(str(tmp_path)), "reports", backend=backend)
+    write_chunks(col, ["a::1"], ["scope 1"], [{"page": 1}], [[0.1] * 16])
+
+    with pytest.raises(ValueError, match="dimension"):
+        write_chunks(col, ["a::2"], ["scope 2"], [{"page": 2}], [[0.1] * 8])
+    assert col.count() == 1